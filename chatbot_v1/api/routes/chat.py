@@ -1,8 +1,10 @@
 from typing import Optional, List
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
 from pydantic import BaseModel, Field
 from app.core.chatbot.service import ChatService
+from app.core.chatbot.turns import TurnBusyError, idempotency_key, idempotent_requests
+from app.core.chatbot.utils.metrics import snapshot_all
 
 # Create router with prefix and tags
 router = APIRouter(
@@ -18,14 +20,27 @@ class ChatMessageRequest(BaseModel):
 chat_service = ChatService()
 
 @router.post("/message")
-async def send_message(request: ChatMessageRequest) -> str:
+async def send_message(
+    request: ChatMessageRequest,
+    idempotency_key_header: Optional[str] = Header(None, alias="Idempotency-Key")
+) -> str:
     """
     Send a message to the chat service and get a response.
     The message can be either a regular text message or a form submission in JSON format.
+    A retry with the same `Idempotency-Key` header returns the first submission's result.
     """
-    try:
+    async def run_turn():
         conversation = await chat_service.process_message(request.content, request.conversation_id)
-        return conversation
+        return list(conversation) if isinstance(conversation, tuple) else conversation
+
+    try:
+        key = idempotency_key("chat_message", idempotency_key_header, request.conversation_id)
+        if key is None:
+            return await run_turn()
+        # Only replies are replayed; errors are retried
+        return await idempotent_requests.run(key, run_turn, store_if=lambda result: isinstance(result, list))
+    except TurnBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -36,5 +51,10 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@router.get("/metrics")
+async def metrics():
+    """In-process chatbot metrics (language detection, caches, ...)"""
+    return snapshot_all()
+
 # Then later, during application startup:
 # await chat_service.initialize_graph() 
\ No newline at end of file
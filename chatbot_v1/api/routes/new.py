@@ -1,8 +1,11 @@
+import json
 from typing import Optional
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from uuid import uuid4
 from app.core.chatbot.service import ChatService, LocationRequest
+from app.core.chatbot.turns import TurnBusyError, idempotency_key, idempotent_requests
 
 # Initialize router
 router = APIRouter(
@@ -28,6 +31,13 @@ class ChatResponse(BaseModel):
     response: str
     conversation_id: str
 
+class StreamChatRequest(BaseModel):
+    message: str
+    conversation_id: Optional[str] = Field(None, description="Omit to start a new conversation")
+    language: Optional[str] = Field("en-US", description="Language preference for a new conversation")
+    location: Optional[LocationRequest] = Field(None, description="User's location information")
+    timezone: Optional[str] = Field(None, description="User's timezone")
+
 chat_service = ChatService()
 
 @router.post("/start", response_model=StartResponse)
@@ -61,11 +71,15 @@ async def start_conversation(request: StartRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(
+    request: ChatRequest,
+    idempotency_key_header: Optional[str] = Header(None, alias="Idempotency-Key")
+):
     """
     Process a message in an existing conversation
+    - A retry with the same `Idempotency-Key` header waits for and returns the first submission's result
     """
-    try:
+    async def run_turn():
         (response, conversation_id) = await chat_service.process_message(
             message=request.message,
             conversation_id=request.conversation_id
@@ -76,6 +90,62 @@ async def chat(request: ChatRequest):
         return ChatResponse(
             response=response,
             conversation_id=request.conversation_id
-        )
+        ).model_dump()
+
+    try:
+        key = idempotency_key("new_chat", idempotency_key_header, request.conversation_id)
+        result = await idempotent_requests.run(key, run_turn) if key else await run_turn()
+        return ChatResponse(**result)
+    except TurnBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/chat/stream")
+async def chat_stream(request: StreamChatRequest):
+    """
+    Process a message and stream the reply as Server-Sent Events
+    - `token` events carry text deltas
+    - the final `end` event carries the conversation_id and the full response
+    """
+    async def event_stream():
+        async for event in chat_service.stream_message(
+            message=request.message,
+            conversation_id=request.conversation_id,
+            language=request.language,
+            location=request.location.model_dump() if request.location else None,
+            timezone=request.timezone
+        ):
+            yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/chat/ws")
+async def chat_websocket(websocket: WebSocket):
+    """
+    Stream replies over a WebSocket
+    - Each client frame is a StreamChatRequest JSON object
+    - The server answers with `token` frames followed by an `end` frame
+    """
+    await websocket.accept()
+    try:
+        while True:
+            try:
+                request = StreamChatRequest(**await websocket.receive_json())
+            except (ValueError, TypeError) as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            async for event in chat_service.stream_message(
+                message=request.message,
+                conversation_id=request.conversation_id,
+                language=request.language,
+                location=request.location.model_dump() if request.location else None,
+                timezone=request.timezone
+            ):
+                await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
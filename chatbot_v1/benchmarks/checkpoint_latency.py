@@ -0,0 +1,127 @@
+"""Per-turn checkpoint persistence latency of the checkpointer backends.
+
+A small graph shaped like a chat turn (router, agent, check step, with a
+growing message list) runs against each store, both per-superstep and with
+end-of-turn coalescing as the runtime configures it. Nodes do no work, so
+the time per turn (``ainvoke`` plus the flush) is what the checkpointer
+costs. Concurrent conversations show how the store behaves under load.
+
+Backends: ``memory``, ``sqlite`` (``SqliteWalSaver`` on a temporary file) and
+``redis`` (``CompactAsyncRedisSaver``, skipped when
+``REDIS_URL`` is not set).
+
+    python -m app.benchmarks.checkpoint_latency [conversations] [turns]
+"""
+
+import os
+import sys
+import time
+import uuid
+import asyncio
+import tempfile
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Annotated, AsyncIterator, Dict, List, TypedDict
+
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+
+from app.core.chatbot.checkpointers import CoalescingSaver, CompactAsyncRedisSaver
+
+
+class TurnState(TypedDict):
+    messages: Annotated[list, add_messages]
+    route: str
+
+
+def build_turn_graph(checkpointer: BaseCheckpointSaver):
+    builder = StateGraph(TurnState)
+    builder.add_node("router", lambda state: {"route": "agent"})
+    builder.add_node("agent", lambda state: {"messages": [AIMessage(content="Your flight XY123 is on time. " * 4)]})
+    builder.add_node("check_step", lambda state: {})
+    builder.add_edge(START, "router")
+    builder.add_edge("router", "agent")
+    builder.add_edge("agent", "check_step")
+    builder.add_edge("check_step", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+@asynccontextmanager
+async def open_backend(name: str, stack: AsyncExitStack) -> AsyncIterator[BaseCheckpointSaver]:
+    if name == "memory":
+        yield InMemorySaver()
+    elif name == "sqlite":
+        from app.core.chatbot.checkpointers.sqlite import SqliteWalSaver
+
+        directory = stack.enter_context(tempfile.TemporaryDirectory())
+        async with SqliteWalSaver.from_path(os.path.join(directory, "checkpoints.sqlite")) as saver:
+            yield saver
+    else:
+        from app.core.chatbot.utils.redis_client import get_async_redis_client
+
+        saver = CompactAsyncRedisSaver(redis_client=get_async_redis_client())
+        await saver.asetup()
+        yield saver
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def measure(checkpointer: BaseCheckpointSaver, conversations: int, turns: int) -> Dict[str, float]:
+    graph = build_turn_graph(checkpointer)
+    flush = getattr(checkpointer, "flush", None)
+    latencies: List[float] = []
+
+    async def conversation() -> None:
+        thread_id = str(uuid.uuid4())
+        config = {"configurable": {"thread_id": thread_id}}
+        for turn in range(turns):
+            started = time.perf_counter()
+            await graph.ainvoke({"messages": [HumanMessage(content=f"Status of my flight, turn {turn}?")]}, config)
+            if flush is not None:
+                await flush(thread_id)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(conversation() for _ in range(conversations)))
+    elapsed = time.perf_counter() - started
+    return {
+        "p50_ms": _percentile(latencies, 0.5),
+        "p95_ms": _percentile(latencies, 0.95),
+        "p99_ms": _percentile(latencies, 0.99),
+        "turns_per_s": len(latencies) / elapsed,
+    }
+
+
+async def main_async(conversations: int, turns: int) -> None:
+    backends = ["memory", "sqlite"] + (["redis"] if os.getenv("REDIS_URL") else [])
+    print(f"{'backend':<8} {'mode':<5} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'turns/s':>9}")
+    for name in backends:
+        for mode in ("step", "turn"):
+            async with AsyncExitStack() as stack:
+                checkpointer = await stack.enter_async_context(open_backend(name, stack))
+                if mode == "turn":
+                    checkpointer = CoalescingSaver(checkpointer)
+                report = await measure(checkpointer, conversations, turns)
+            print(f"{name:<8} {mode:<5} {report['p50_ms']:>8.2f} {report['p95_ms']:>8.2f} "
+                  f"{report['p99_ms']:>8.2f} {report['turns_per_s']:>9.1f}")
+
+    if "redis" in backends:
+        from app.core.chatbot.utils.redis_client import close_async_redis_client
+        await close_async_redis_client()
+
+
+def main():
+    load_dotenv()
+    conversations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    turns = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    asyncio.run(main_async(conversations, turns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Size and speed of the conversation state encodings.
+
+For conversations of 10, 100 and 1000 messages (with flight API payloads in
+tool messages and ``workflow_data``) this reports the stored bytes and the
+encode / decode time of:
+
+* ``legacy``: the previous ``json.dumps`` of ChatMemory's dicts
+* the codec as JSON, msgpack, msgpack + zstd and msgpack + zstd with a
+  dictionary trained on other conversations
+* the checkpointer's messages channel with the default Redis serializer and
+  ``CompactRedisSerializer``
+
+    python -m app.benchmarks.codec_size [repeats]
+"""
+
+import sys
+import json
+import time
+import random
+from typing import Any, Callable, Dict, List
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.redis.jsonplus_redis import JsonPlusRedisSerializer
+
+from app.core.chatbot.checkpointers.serde import CompactRedisSerializer
+from app.core.chatbot.memory import ChatMemory
+from app.core.chatbot.utils.codec import Codec, train_dictionary
+
+SIZES = (10, 100, 1000)
+AIRPORTS = ["RUH", "JED", "DMM", "DXB", "CAI", "IST", "KWI", "AMM"]
+
+
+def _flight_payload(rng: random.Random) -> Dict[str, Any]:
+    origin, destination = rng.sample(AIRPORTS, 2)
+    return {
+        "flightNumber": f"XY{rng.randint(100, 999)}",
+        "origin": {"code": origin, "terminal": str(rng.randint(1, 5))},
+        "destination": {"code": destination, "terminal": str(rng.randint(1, 5))},
+        "scheduledDeparture": f"2025-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}T{rng.randint(10, 23)}:00:00Z",
+        "status": rng.choice(["ON_TIME", "DELAYED", "BOARDING", "LANDED"]),
+        "aircraft": {"type": "A320neo", "registration": f"HZ-NS{rng.randint(10, 99)}"},
+        "fares": [{"class": c, "price": rng.randint(199, 2999), "currency": "SAR"} for c in ("economy", "premium")],
+    }
+
+
+def make_conversation(size: int, seed: int = 0) -> List[Any]:
+    rng = random.Random(seed)
+    messages = []
+    while len(messages) < size:
+        turn = len(messages)
+        messages.append(HumanMessage(content=f"What is the status of flight XY{rng.randint(100, 999)} tomorrow?", id=f"h{turn}"))
+        if turn % 4 == 0:
+            messages.append(ToolMessage(content=json.dumps(_flight_payload(rng)), tool_call_id=f"call_{turn}", id=f"t{turn}"))
+        messages.append(AIMessage(content="Your flight is scheduled on time. Boarding starts 45 minutes before departure.", id=f"a{turn}"))
+    return messages[:size]
+
+
+def make_state(size: int, seed: int = 0) -> Dict[str, Any]:
+    """ChatMemory's serialized form of a conversation"""
+    memory = ChatMemory()
+    rng = random.Random(seed)
+    return {
+        "messages": [memory._serialize_message(m) for m in make_conversation(size, seed)],
+        "workflow_data": {"flight_status": {"collected_data": {"flight": _flight_payload(rng)}}},
+        "language": "en-US",
+    }
+
+
+def _time(fn: Callable[[], Any], repeats: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - started) / repeats * 1e6
+
+
+def _row(name: str, size: int, encoded: bytes, encode_us: float, decode_us: float) -> str:
+    return f"{size:>5} {name:<22} {len(encoded):>10} {encode_us:>12.1f} {decode_us:>12.1f}"
+
+
+def run(repeats: int) -> None:
+    training = [Codec(compression="none").serialize(make_state(20, seed)) for seed in range(100, 400)]
+    dictionary = train_dictionary(training)
+
+    codecs = {
+        "codec json": Codec(format="json", compression="none"),
+        "codec msgpack": Codec(format="msgpack", compression="none"),
+        "codec msgpack+zstd": Codec(format="msgpack", compression="zstd"),
+        "codec msgpack+zstd+dict": Codec(format="msgpack", compression="zstd", dictionary=dictionary),
+    }
+    serializers = {
+        "checkpoint json": JsonPlusRedisSerializer(),
+        "checkpoint compact": CompactRedisSerializer(codec=codecs["codec msgpack+zstd"]),
+    }
+
+    print(f"{'msgs':>5} {'encoding':<22} {'bytes':>10} {'encode_us':>12} {'decode_us':>12}")
+    for size in SIZES:
+        state = make_state(size)
+        legacy = json.dumps(state).encode("utf-8")
+        print(_row("legacy json", size, legacy,
+                   _time(lambda: json.dumps(state), repeats),
+                   _time(lambda: json.loads(legacy), repeats)))
+
+        for name, codec in codecs.items():
+            encoded = codec.encode(state)
+            print(_row(name, size, encoded,
+                       _time(lambda: codec.encode(state), repeats),
+                       _time(lambda: codec.decode(encoded), repeats)))
+
+        messages = make_conversation(size)
+        for name, serde in serializers.items():
+            typed = serde.dumps_typed(messages)
+            print(_row(name, size, typed[1],
+                       _time(lambda: serde.dumps_typed(messages), repeats),
+                       _time(lambda: serde.loads_typed(typed), repeats)))
+        print()
+
+
+def main():
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
+
+
+if __name__ == "__main__":
+    main()
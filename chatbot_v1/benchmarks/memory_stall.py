@@ -0,0 +1,123 @@
+"""Event-loop stall caused by ChatMemory's Redis access.
+
+Runs concurrent save / load / TTL-extension cycles against the configured
+Redis, once through the old synchronous client (one blocking round trip per
+command) and once through ``ChatMemory`` on the pooled asyncio client. A
+ticker task sleeps 1 ms at a time and records how late it wakes up; that
+lateness is the time the loop was blocked and unable to serve other requests.
+
+    python -m app.benchmarks.memory_stall [conversations] [rounds]
+"""
+
+import sys
+import json
+import time
+import asyncio
+from typing import Dict, List
+
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.core.chatbot.memory import ChatMemory, CONVERSATION_TTL
+from app.core.chatbot.utils.redis_client import get_redis_client, close_async_redis_client
+
+TICK = 0.001
+
+
+class SyncChatMemory(ChatMemory):
+    """The previous implementation: sync client calls inside async methods"""
+
+    async def load_conversation_state(self, conversation_id: str):
+        client = get_redis_client()
+        conv_data = client.get(self._get_conversation_key(conversation_id))
+        if not conv_data:
+            return None
+        conv_state = json.loads(conv_data)
+        conv_state["messages"] = [self._deserialize_message(m) for m in conv_state["messages"]]
+        entity_data = client.get(self._get_entity_key(conversation_id))
+        if entity_data:
+            conv_state["entities"] = json.loads(entity_data)
+        return conv_state
+
+    async def save_conversation_state(self, conversation_id: str, state: Dict) -> None:
+        client = get_redis_client()
+        serialized_state = state.copy()
+        serialized_state["messages"] = [self._serialize_message(m) for m in serialized_state["messages"]]
+        entities = serialized_state.pop("entities", None)
+        client.set(self._get_conversation_key(conversation_id), json.dumps(serialized_state), ex=CONVERSATION_TTL)
+        if entities:
+            client.setex(self._get_entity_key(conversation_id), CONVERSATION_TTL, json.dumps(entities))
+
+    async def extend_conversation_ttl(self, conversation_id: str) -> None:
+        client = get_redis_client()
+        client.expire(self._get_conversation_key(conversation_id), CONVERSATION_TTL)
+        client.expire(self._get_entity_key(conversation_id), CONVERSATION_TTL)
+
+
+def _sample_state(turns: int = 10) -> Dict:
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"Where is my bag? claim ABC12345{i}"))
+        messages.append(AIMessage(content="Your bag is on its way to Riyadh and should arrive tomorrow."))
+    return {"messages": messages, "entities": {"claim_number": "ABC123456", "city": "Riyadh"}}
+
+
+async def _ticker(lags: List[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(max(0.0, time.perf_counter() - started - TICK))
+
+
+async def _conversation(memory: ChatMemory, conversation_id: str, rounds: int) -> None:
+    state = _sample_state()
+    for _ in range(rounds):
+        await memory.save_conversation_state(conversation_id, state)
+        await memory.load_conversation_state(conversation_id)
+        await memory.extend_conversation_ttl(conversation_id)
+
+
+async def measure(memory: ChatMemory, conversations: int, rounds: int) -> Dict[str, float]:
+    lags: List[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_ticker(lags, stop))
+
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        _conversation(memory, f"bench-{i}", rounds) for i in range(conversations)
+    ])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+
+    for i in range(conversations):
+        await memory.clear_conversation_state(f"bench-{i}")
+
+    lags.sort()
+    return {
+        "wall_s": elapsed,
+        "stall_total_ms": sum(lags) * 1000,
+        "stall_p99_ms": lags[int(len(lags) * 0.99)] * 1000 if lags else 0.0,
+        "stall_max_ms": lags[-1] * 1000 if lags else 0.0,
+        "ticks": len(lags),
+    }
+
+
+async def main_async(conversations: int, rounds: int) -> None:
+    for name, memory in (("sync", SyncChatMemory()), ("async", ChatMemory())):
+        report = await measure(memory, conversations, rounds)
+        print(f"{name:>5}: " + ", ".join(
+            f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in report.items()
+        ))
+    await close_async_redis_client()
+
+
+def main():
+    load_dotenv()
+    conversations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    asyncio.run(main_async(conversations, rounds))
+
+
+if __name__ == "__main__":
+    main()
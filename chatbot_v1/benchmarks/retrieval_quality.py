@@ -0,0 +1,107 @@
+"""Recall and latency of the retrieval modes over the knowledge base index.
+
+Each labelled query names a text its answer chunk contains (a bundle code, a
+weight, a policy term). For ``similarity`` (plain vector search), ``hybrid``
+(BM25 + vector, reciprocal rank fusion) and ``lexical`` (BM25 only) this
+reports recall@k (the expected text is in one of the top k chunks) and the
+per-query latency. The embedding client is not cached, so every vector
+query pays the embedding round trip as a first-time question would.
+
+The vector search gets no timeout and the fallback backoff is reset before
+each mode, so ``hybrid`` is measured with its vector half. Any query that
+still fell back to lexical results is counted in the ``fallbacks`` column,
+and the run exits with status 1 when there were any.
+
+Labelled queries are JSON lines ``{"query": ..., "expected": ...}``; the
+default set is ``retrieval_queries.jsonl`` next to this file. Build the index
+first with ``python -m app.core.chatbot.build_vectordb``.
+
+    python -m app.benchmarks.retrieval_quality [queries.jsonl] [k]
+"""
+
+import sys
+import json
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from dotenv import load_dotenv
+from langchain_core.retrievers import BaseRetriever
+
+from app.core.chatbot.configuration import IndexConfiguration
+from app.core.chatbot.lexical import BM25Index
+from app.core.chatbot.retrieval import (
+    FAISS_INDEX_PATH,
+    HYBRID_CANDIDATES,
+    HybridRetriever,
+    index_version,
+    load_faiss,
+    make_text_encoder,
+    reset_vector_backoff,
+    version_dir,
+)
+from app.core.chatbot.utils.metrics import get_metrics
+
+DEFAULT_QUERIES = Path(__file__).with_name("retrieval_queries.jsonl")
+MODES = ("similarity", "hybrid", "lexical")
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def make_retrievers(k: int) -> Dict[str, BaseRetriever]:
+    folder = Path(FAISS_INDEX_PATH)
+    vstore = load_faiss(version_dir(folder, index_version(folder)), make_text_encoder(IndexConfiguration().embedding_model))
+    lexical = BM25Index.from_docstore(vstore)
+    candidates = max(k, HYBRID_CANDIDATES)
+    return {
+        "similarity": vstore.as_retriever(search_type="similarity", search_kwargs={"k": k}),
+        "hybrid": HybridRetriever(vstore=vstore, lexical=lexical, mode="hybrid", k=k, candidates=candidates, vector_timeout=None),
+        "lexical": HybridRetriever(vstore=vstore, lexical=lexical, mode="lexical", k=k, candidates=candidates),
+    }
+
+
+def measure(retriever: BaseRetriever, labelled: List[Dict[str, str]]) -> Dict[str, float]:
+    retrieval_metrics = get_metrics("retrieval")
+    fallbacks = retrieval_metrics.get("vector_fallbacks") + retrieval_metrics.get("vector_skipped")
+    reset_vector_backoff()
+    found, latencies = 0, []
+    for item in labelled:
+        started = time.perf_counter()
+        docs = retriever.invoke(item["query"])
+        latencies.append((time.perf_counter() - started) * 1000)
+        expected = item["expected"].casefold()
+        found += any(expected in doc.page_content.casefold() for doc in docs)
+    return {
+        "recall": found / len(labelled),
+        "p50_ms": _percentile(latencies, 0.5),
+        "p95_ms": _percentile(latencies, 0.95),
+        "fallbacks": retrieval_metrics.get("vector_fallbacks") + retrieval_metrics.get("vector_skipped") - fallbacks,
+    }
+
+
+def main():
+    load_dotenv()
+    path = sys.argv[1] if len(sys.argv) > 1 else str(DEFAULT_QUERIES)
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    with open(path, "r", encoding="utf-8") as f:
+        labelled = [json.loads(line) for line in f if line.strip()]
+
+    retrievers = make_retrievers(k)
+    print(f"{len(labelled)} queries, k={k}")
+    print(f"{'mode':<11} {'recall@k':>9} {'p50_ms':>8} {'p95_ms':>8} {'fallbacks':>9}")
+    fallbacks = 0
+    for mode in MODES:
+        report = measure(retrievers[mode], labelled)
+        fallbacks += report["fallbacks"]
+        print(f"{mode:<11} {report['recall']:>9.2f} {report['p50_ms']:>8.2f} {report['p95_ms']:>8.2f} "
+              f"{report['fallbacks']:>9.0f}")
+    if fallbacks:
+        print(f"{fallbacks:.0f} queries fell back to lexical results; the hybrid numbers are not valid")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Semantic cache of FAQ answers.
+
+The FAQ agent spends two LLM calls and a document search on every question,
+even one answered minutes earlier. Grounded answers (the agent searched the
+knowledge base) are cached with the embedding of the question, per user
+context: the language plus the city, country and timezone the FAQ system
+prompt shows the model, so an answer shaped by one user's location is never
+replayed to a user elsewhere. A new question whose embedding has cosine
+similarity of at least ``ANSWER_CACHE_THRESHOLD`` with a cached question in
+the same context gets the stored answer without any LLM call.
+
+Every lookup embeds the question first: unless the embedding cache already
+has it, each miss pays one embedding round trip on top of the usual turn.
+``answer_cache`` reports hits, misses and the hit rate; set
+``ANSWER_CACHE=false`` where the hit rate does not pay for the lookups.
+
+Entries expire after ``ANSWER_CACHE_TTL`` seconds and are all dropped when
+the knowledge base index version changes. The threshold is strict on
+purpose: paraphrases of a full question match, short follow-ups that lean on
+the conversation ("and for infants?") do not, and questions shorter than
+``ANSWER_CACHE_MIN_CHARS`` are never cached.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from app.core.chatbot.configuration import IndexConfiguration
+from app.core.chatbot.retrieval import get_text_encoder, retriever_registry
+from app.core.chatbot.state import State
+from app.core.chatbot.utils.langid import is_trivial_input
+from app.core.chatbot.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE = os.getenv("ANSWER_CACHE", "true") == "true"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MIN_CHARS = int(os.getenv("ANSWER_CACHE_MIN_CHARS", "12"))
+
+metrics = get_metrics("answer_cache")
+metrics.add_ratio("hit_rate", "hits", "lookups")
+
+
+def faq_question(state: State) -> str:
+    """The question of the turn: the router's English text, else the last user message"""
+    text = (state.get("route") or {}).get("text")
+    if text:
+        return text
+    for message in reversed(state.get("messages") or []):
+        if isinstance(message, HumanMessage):
+            return message.content if isinstance(message.content, str) else ""
+    return ""
+
+
+def faq_context(state: State) -> str:
+    """The state the FAQ system prompt shows the model: language, city, country and timezone"""
+    location = state.get("location") or {}
+    return "|".join([
+        state.get("language") or "",
+        str(location.get("city") or ""),
+        str(location.get("country") or ""),
+        state.get("timezone") or str(location.get("timezone") or ""),
+    ])
+
+
+def grounded_answer(messages: List[BaseMessage], previous: List[BaseMessage]) -> Optional[str]:
+    """The final answer of a turn that searched the knowledge base, or None"""
+    seen = {message.id for message in previous if message.id}
+    new = [message for message in messages if not message.id or message.id not in seen]
+    if not any(isinstance(m, ToolMessage) and m.name == "search_docs" for m in new):
+        return None
+    final = new[-1] if new else None
+    if not isinstance(final, AIMessage) or final.tool_calls or not isinstance(final.content, str):
+        return None
+    return final.content.strip() or None
+
+
+@dataclass
+class _ContextIndex:
+    """Cached questions of one user context, oldest first, with their unit vectors as rows"""
+    created_at: List[float] = field(default_factory=list)
+    answers: List[str] = field(default_factory=list)
+    vectors: Optional[np.ndarray] = None
+
+    def drop_oldest(self, count: int) -> None:
+        if count:
+            del self.created_at[:count]
+            del self.answers[:count]
+            self.vectors = self.vectors[count:]
+
+    def best_match(self, vector: np.ndarray) -> Tuple[float, int]:
+        if not self.answers:
+            return 0.0, -1
+        scores = self.vectors @ vector
+        best = int(np.argmax(scores))
+        return float(scores[best]), best
+
+    def append(self, vector: np.ndarray, answer: str) -> None:
+        self.created_at.append(time.monotonic())
+        self.answers.append(answer)
+        row = vector[np.newaxis, :]
+        self.vectors = row if self.vectors is None else np.vstack([self.vectors, row])
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array)) or 1.0
+    return array / norm
+
+
+class AnswerCache:
+    """Nearest-question cache of FAQ answers, per user context and index version"""
+
+    def __init__(
+        self,
+        maxsize: int = ANSWER_CACHE_SIZE,
+        ttl: int = ANSWER_CACHE_TTL,
+        threshold: float = ANSWER_CACHE_THRESHOLD
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._indexes: Dict[str, _ContextIndex] = {}
+        self._version: Optional[Tuple] = None
+        self._lock = threading.Lock()
+
+    def _index(self, context: str, version: Tuple) -> _ContextIndex:
+        # Answers quote the knowledge base: a new index version invalidates all of them
+        if version != self._version:
+            if self._version is not None:
+                logger.info("Knowledge base index changed, FAQ answer cache cleared")
+                metrics.incr("invalidations")
+            self._indexes.clear()
+            self._version = version
+        index = self._indexes.setdefault(context, _ContextIndex())
+        cutoff = time.monotonic() - self.ttl
+        expired = next((i for i, created in enumerate(index.created_at) if created >= cutoff), len(index.created_at))
+        index.drop_oldest(expired)
+        return index
+
+    def get(self, vector: List[float], context: str, version: Tuple) -> Optional[str]:
+        metrics.incr("lookups")
+        query = _unit(vector)
+        with self._lock:
+            index = self._index(context, version)
+            score, position = index.best_match(query)
+            answer = index.answers[position] if score >= self.threshold else None
+        metrics.observe("similarity", score)
+        if answer is None:
+            metrics.incr("misses")
+            return None
+        metrics.incr("hits")
+        return answer
+
+    def put(self, vector: List[float], context: str, version: Tuple, answer: str) -> None:
+        query = _unit(vector)
+        with self._lock:
+            index = self._index(context, version)
+            # A concurrent miss may already have stored the same question
+            if index.best_match(query)[0] >= self.threshold:
+                return
+            index.append(query, answer)
+            index.drop_oldest(max(0, len(index.answers) - self.maxsize))
+            metrics.set_gauge("entries", sum(len(i.answers) for i in self._indexes.values()))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._indexes.clear()
+
+
+class FaqAnswerCache:
+    """Embeds the FAQ question and reads/writes the answer cache for the FAQ node"""
+
+    def __init__(self, embeddings: Embeddings, embedding_model: str, cache: Optional[AnswerCache] = None):
+        self.embeddings = embeddings
+        self.embedding_model = embedding_model
+        self.cache = cache or AnswerCache()
+
+    async def _key(self, state: State) -> Optional[Tuple[List[float], str, Tuple]]:
+        question = faq_question(state)
+        if len(question.strip()) < ANSWER_CACHE_MIN_CHARS or is_trivial_input(question):
+            return None
+        vector = await self.embeddings.aembed_query(question)
+        # May reload the index; keep it off the event loop
+        version = await asyncio.to_thread(retriever_registry.current_version, self.embedding_model)
+        return vector, faq_context(state), version
+
+    async def lookup(self, state: State) -> Tuple[Optional[str], Optional[Tuple]]:
+        """
+        Find a cached answer for the turn.
+
+        Returns:
+            The answer (or None) and the key to store the fresh answer under (None when not cacheable).
+        """
+        try:
+            key = await self._key(state)
+        except Exception as e:
+            logger.warning(f"FAQ answer cache lookup failed: {e}")
+            metrics.incr("errors")
+            return None, None
+        if key is None:
+            metrics.incr("skipped")
+            return None, None
+        return self.cache.get(*key), key
+
+    def store(self, key: Optional[Tuple], messages: List[BaseMessage], previous: List[BaseMessage]) -> None:
+        if key is None:
+            return
+        answer = grounded_answer(messages, previous)
+        if answer is None:
+            metrics.incr("not_grounded")
+            return
+        vector, context, version = key
+        self.cache.put(vector, context, version, answer)
+
+
+def make_faq_answer_cache() -> Optional[FaqAnswerCache]:
+    """The FAQ answer cache, or None when it is disabled or no encoder is available"""
+    if not ANSWER_CACHE:
+        return None
+    try:
+        embedding_model = IndexConfiguration().embedding_model
+        return FaqAnswerCache(get_text_encoder(embedding_model), embedding_model)
+    except Exception as e:
+        logger.warning(f"FAQ answer cache disabled: {e}")
+        return None
@@ -42,6 +42,12 @@ class Workflow:
         self.steps: Dict[str, WorkflowStep] = {}
         self.initial_state: Dict[str, Any] = {}
         
+        # Optional hints for the local fast-path intent classifier:
+        # regexes (named groups become slots), trigger phrases and example utterances
+        self.intent_patterns: List[str] = []
+        self.intent_keywords: List[str] = []
+        self.intent_examples: List[str] = []
+        
        # Register this workflow instance (from each workflow.py file)
         self._workflows[name] = self
         
@@ -62,12 +68,20 @@ class Workflow:
         if not self.steps:
             raise ValueError(f"No steps defined for workflow {self.name}")
         
+        # Seed the collected data with values the router already spotted
+        collected_data = self.initial_state.copy()
+        slots = (state.get("route") or {}).get("slots") or {}
+        collected_data.update({
+            key: value for key, value in slots.items()
+            if key in self.initial_state
+        })
+        
         return {
             "current_workflow": self.name,
             "workflow_data": {
                 self.name: {
                     "current_step": next(iter(self.steps.values())).name,
-                    "collected_data": self.initial_state.copy()
+                    "collected_data": collected_data
                 }
             }
         }
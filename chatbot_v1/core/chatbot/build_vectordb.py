@@ -1,27 +1,78 @@
-"""Build and save FAISS vector store from FAQ markdown files."""
+"""Build and update the FAISS vector store from the knowledge base markdown files.
+
+The index is updated incrementally. Every chunk is identified by the hash of
+its source file name and text; a manifest next to the index lists the chunk
+ids it holds. A run embeds only the chunks that are not in the index yet
+(new or edited text), deletes the vectors of chunks that are gone, and keeps
+everything else, so a small edit to ``kbs/raw`` re-embeds a handful of chunks.
+A different embedding model or chunking setting rebuilds the index.
+
+Embeddings are requested in batches of ``KB_EMBED_BATCH_SIZE`` texts, at most
+``KB_EMBED_CONCURRENCY`` at a time and ``KB_EMBED_RPM`` per minute, with
+retries on failure.
+
+The index is written under ``FAISS_INDEX_PATH``, the directory the retriever
+loads. Each version goes to its own ``v{N}`` directory (built in a private
+temporary directory and renamed into place), and then the ``VERSION`` pointer
+is replaced atomically. A worker therefore always loads the vectors and the
+docstore of the same version, and running workers pick up the new index on
+their next version check. The previous ``KB_KEEP_VERSIONS`` versions stay on
+disk for workers still loading them. A lock file serializes indexer runs.
+
+    python -m app.core.chatbot.build_vectordb [--full]
+"""
 
 import os
+import sys
+import json
+import time
+import fcntl
+import shutil
+import asyncio
+import hashlib
+import logging
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterator, List, Optional
 from dotenv import load_dotenv
 
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_text_splitters import MarkdownTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_openai import AzureOpenAIEmbeddings
+
+from app.core.chatbot.configuration import IndexConfiguration
+from app.core.chatbot.retrieval import FAISS_INDEX_PATH, index_version, make_text_encoder, version_dir
 
 # Load environment variables
 load_dotenv()
 
-def load_markdown_files(faqs_dir: str = "faqs") -> List[Document]:
+logger = logging.getLogger(__name__)
+
+KB_RAW_DIR = os.getenv("KB_RAW_DIR", "app/core/chatbot/kbs/raw")
+KB_CHUNK_SIZE = int(os.getenv("KB_CHUNK_SIZE", "500"))
+KB_CHUNK_OVERLAP = int(os.getenv("KB_CHUNK_OVERLAP", "50"))
+KB_EMBED_BATCH_SIZE = int(os.getenv("KB_EMBED_BATCH_SIZE", "64"))
+KB_EMBED_CONCURRENCY = int(os.getenv("KB_EMBED_CONCURRENCY", "4"))
+KB_EMBED_RPM = int(os.getenv("KB_EMBED_RPM", "300"))
+KB_EMBED_RETRIES = int(os.getenv("KB_EMBED_RETRIES", "3"))
+KB_KEEP_VERSIONS = int(os.getenv("KB_KEEP_VERSIONS", "2"))
+
+MANIFEST_FILE = "manifest.json"
+VERSION_FILE = "VERSION"
+LOCK_FILE = ".lock"
+
+
+def load_markdown_files(faqs_dir: str = KB_RAW_DIR) -> List[Document]:
     """Load all markdown files from the faqs directory."""
     docs = []
     faqs_path = Path(faqs_dir).absolute()
-    
+
     if not faqs_path.exists():
         raise ValueError(f"FAQs directory not found: {faqs_dir}")
-    
-    for md_file in faqs_path.glob("*.md"):
+
+    for md_file in sorted(faqs_path.glob("*.md")):
         with open(md_file, "r", encoding="utf-8") as f:
             content = f.read()
             # Store filename in metadata for reference
@@ -29,39 +80,238 @@ def load_markdown_files(faqs_dir: str = "faqs") -> List[Document]:
                 page_content=content,
                 metadata={"source": md_file.name}
             ))
-    
+
     return docs
 
 def split_documents(docs: List[Document]) -> List[Document]:
     """Split markdown documents into smaller chunks."""
     splitter = MarkdownTextSplitter(
-        chunk_size=500,
-        chunk_overlap=50,
+        chunk_size=KB_CHUNK_SIZE,
+        chunk_overlap=KB_CHUNK_OVERLAP,
         keep_separator=False
     )
-    
+
     return splitter.split_documents(docs)
 
-def build_and_save_vectordb() -> None:
-    """Build and save FAISS vector store from documents."""
-    docs = load_markdown_files()
-    split_docs = split_documents(docs)
-    
-    embedding_model = AzureOpenAIEmbeddings(
-        model="text-embedding-3-small",
-        deployment=os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"]
+def chunk_id(doc: Document) -> str:
+    """Content address of a chunk: its source file and text"""
+    key = f"{doc.metadata.get('source', '')}\x1f{doc.page_content}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+def index_settings(embedding_model: str) -> Dict[str, object]:
+    """Settings that change every vector; an index built with others is rebuilt"""
+    return {
+        "embedding_model": embedding_model,
+        "chunk_size": KB_CHUNK_SIZE,
+        "chunk_overlap": KB_CHUNK_OVERLAP,
+    }
+
+
+class RateLimiter:
+    """Spaces calls at least 60 / rpm seconds apart"""
+
+    def __init__(self, rpm: int):
+        self.interval = 60.0 / rpm if rpm > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def embed_batched(
+    embeddings: Embeddings,
+    texts: List[str],
+    batch_size: int = KB_EMBED_BATCH_SIZE,
+    concurrency: int = KB_EMBED_CONCURRENCY,
+    rpm: int = KB_EMBED_RPM,
+    retries: int = KB_EMBED_RETRIES
+) -> List[List[float]]:
+    """Embed texts in concurrent, rate-limited batches, keeping their order"""
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rpm)
+
+    async def embed_batch(batch: List[str]) -> List[List[float]]:
+        async with semaphore:
+            for attempt in range(retries):
+                await limiter.wait()
+                try:
+                    return await embeddings.aembed_documents(batch)
+                except Exception as e:
+                    if attempt == retries - 1:
+                        raise
+                    logger.warning(f"Embedding batch failed (attempt {attempt + 1}/{retries}): {e}")
+                    await asyncio.sleep(2 ** attempt)
+
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    results = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+    return [vector for batch in results for vector in batch]
+
+
+@dataclass
+class IndexReport:
+    version: int
+    added: int
+    removed: int
+    kept: int
+    rebuilt: bool
+    seconds: float
+
+
+@contextmanager
+def index_lock(folder: Path) -> Iterator[None]:
+    """Hold the indexer lock of ``folder`` for a whole run"""
+    folder.mkdir(parents=True, exist_ok=True)
+    with open(folder / LOCK_FILE, "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise RuntimeError(f"Another indexer run holds {folder / LOCK_FILE}")
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def current_index_dir(folder: Path) -> Optional[Path]:
+    """Directory of the version the VERSION pointer names, or None"""
+    try:
+        version = index_version(folder)
+    except OSError:
+        return None
+    return version_dir(folder, version)
+
+def read_manifest(directory: Optional[Path]) -> Optional[dict]:
+    if directory is None:
+        return None
+    try:
+        with open(directory / MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def version_dirs(folder: Path) -> Dict[int, Path]:
+    """The ``v{N}`` directories of ``folder`` by version number"""
+    return {
+        int(path.name[1:]): path
+        for path in folder.glob("v*")
+        if path.is_dir() and path.name[1:].isdigit()
+    }
+
+def write_index(vstore, folder: Path, manifest: dict) -> None:
+    """Write the version to ``v{N}``, then point VERSION at it"""
+    version = manifest["version"]
+    target = folder / f"v{version}"
+    staging = Path(tempfile.mkdtemp(prefix=f".v{version}.", dir=folder))
+    try:
+        vstore.save_local(str(staging))
+        with open(staging / MANIFEST_FILE, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.rename(staging, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    pointer = folder / f".{VERSION_FILE}.tmp"
+    with open(pointer, "w", encoding="utf-8") as f:
+        f.write(str(version))
+    os.replace(pointer, folder / VERSION_FILE)
+
+    # Workers may still be loading the last few versions
+    for number, old in version_dirs(folder).items():
+        if number < version - KB_KEEP_VERSIONS:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+async def update_vectordb(
+    raw_dir: str = KB_RAW_DIR,
+    index_dir: str = FAISS_INDEX_PATH,
+    full: bool = False,
+    embeddings: Optional[Embeddings] = None
+) -> IndexReport:
+    """Bring the index in ``index_dir`` in line with the documents in ``raw_dir``"""
+    folder = Path(index_dir)
+    with index_lock(folder):
+        return await _update_vectordb(raw_dir, folder, full, embeddings)
+
+async def _update_vectordb(raw_dir: str, folder: Path, full: bool, embeddings: Optional[Embeddings]) -> IndexReport:
+    from langchain_community.vectorstores import FAISS
+
+    started = time.perf_counter()
+    embedding_model = IndexConfiguration().embedding_model
+    # The bulk client; the query cache does not apply to documents
+    embeddings = embeddings or make_text_encoder(embedding_model)
+    settings = index_settings(embedding_model)
+
+    chunks: Dict[str, Document] = {}
+    for doc in split_documents(load_markdown_files(raw_dir)):
+        chunks.setdefault(chunk_id(doc), doc)
+    if not chunks:
+        raise ValueError(f"No documents to index in {raw_dir}")
+
+    current = current_index_dir(folder)
+    manifest = read_manifest(current)
+    vstore = None
+    if not full and manifest is not None and manifest.get("settings") == settings:
+        try:
+            vstore = FAISS.load_local(
+                folder_path=str(current),
+                embeddings=embeddings,
+                allow_dangerous_deserialization=True
+            )
+        except Exception as e:
+            logger.warning(f"Existing index at {current} unreadable, rebuilding: {e}")
+    rebuilt = vstore is None
+    indexed = set() if rebuilt else set(vstore.index_to_docstore_id.values())
+
+    removed = sorted(indexed - chunks.keys())
+    new_ids = [cid for cid in chunks if cid not in indexed]
+    if vstore is not None and not removed and not new_ids:
+        return IndexReport(manifest["version"], 0, 0, len(indexed), False, time.perf_counter() - started)
+
+    if removed:
+        vstore.delete(removed)
+
+    if new_ids:
+        texts = [chunks[cid].page_content for cid in new_ids]
+        vectors = await embed_batched(embeddings, texts)
+        text_embeddings = list(zip(texts, vectors))
+        metadatas = [chunks[cid].metadata for cid in new_ids]
+        if vstore is None:
+            vstore = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=new_ids)
+        else:
+            vstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=new_ids)
+
+    # Never reuse a directory, even when the manifest was lost
+    version = max([(manifest or {}).get("version", 0), *version_dirs(folder)]) + 1
+    write_index(vstore, folder, {
+        "version": version,
+        "settings": settings,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "chunks": {cid: chunks[cid].metadata.get("source", "") for cid in sorted(chunks)},
+    })
+    return IndexReport(
+        version=version,
+        added=len(new_ids),
+        removed=len(removed),
+        kept=len(chunks) - len(new_ids),
+        rebuilt=rebuilt,
+        seconds=time.perf_counter() - started,
     )
-    
-    # Create and save FAISS index
-    vstore = FAISS.from_documents(split_docs, embedding_model)
-    vstore.save_local("storage/faiss")
+
+def build_and_save_vectordb(full: bool = False) -> IndexReport:
+    """Build or update the FAISS vector store from documents."""
+    return asyncio.run(update_vectordb(full=full))
 
 def main():
     """Main function to build and save the vectorstore."""
-    docs = load_markdown_files()
-    split_docs = split_documents(docs)
-    build_and_save_vectordb()
-    return
+    logging.basicConfig(level=logging.INFO)
+    report = build_and_save_vectordb(full="--full" in sys.argv[1:])
+    print(f"Index version {report.version}: {report.added} added, {report.removed} removed, "
+          f"{report.kept} kept{' (rebuilt)' if report.rebuilt else ''} in {report.seconds:.1f}s")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,18 @@
+"""Checkpointer wrappers used by the chat runtime.
+
+``SqliteWalSaver`` lives in ``.sqlite`` and is imported only when
+``CHECKPOINTER=sqlite``, so aiosqlite stays an optional dependency.
+"""
+
+from .base import DelegatingSaver
+from .caching import CachingSaver
+from .coalescing import CoalescingSaver
+from .serde import CompactAsyncRedisSaver, CompactRedisSerializer
+
+__all__ = [
+    "DelegatingSaver",
+    "CachingSaver",
+    "CoalescingSaver",
+    "CompactAsyncRedisSaver",
+    "CompactRedisSerializer",
+]
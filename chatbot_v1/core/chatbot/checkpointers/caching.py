@@ -0,0 +1,235 @@
+"""In-process cache of the latest checkpoints, invalidated across workers.
+
+Every turn starts by loading the thread's latest checkpoint. The worker that
+served the previous turn seconds earlier usually still has it, so
+``CachingSaver`` keeps the latest checkpoint tuple of each recently active
+thread in an LRU. Writes go through to the inner saver, then update the
+cache (write-through).
+
+Every new checkpoint is announced once: ``aput`` publishes ``{worker,
+thread_id, checkpoint_id, ts}`` on the ``CHECKPOINT_INVALIDATION_CHANNEL``
+pub/sub channel. Pending writes added to the checkpoint this worker last
+announced for the thread publish nothing more, so a turn-end flush costs one
+PUBLISH per namespace rather than one per write batch as well. Writes to any
+other checkpoint still publish. When another worker writes the thread, the
+entry is dropped here, so the next read goes to Redis.
+While the subscription is down (not yet started, or reconnecting after an
+error) the cache is cleared and bypassed, so a missed invalidation can never
+serve a stale checkpoint.
+
+The remaining window is the pub/sub delivery lag, usually sub-millisecond on
+the same Redis. Within it a turn on this worker could read a checkpoint that
+another worker has just replaced. Concurrent turns on one conversation are
+already a race without the cache. ``invalidation_lag_ms`` records the lag.
+For the same reason, a worker that reads a checkpoint between its ``aput``
+and the pending writes that follow within the same flush or superstep may
+keep it without those writes until the next checkpoint of the thread.
+"""
+
+import os
+import json
+import time
+import socket
+import asyncio
+import logging
+from typing import Any, Optional, Sequence, Tuple
+from uuid import uuid4
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    copy_checkpoint,
+)
+from redis.asyncio import Redis as AsyncRedis
+
+from app.core.chatbot.checkpointers.base import DelegatingSaver, thread_key
+from app.core.chatbot.utils.cache import LRUCache
+from app.core.chatbot.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_CACHE_SIZE = int(os.getenv("CHECKPOINT_CACHE_SIZE", "5000"))
+CHECKPOINT_CACHE_TTL = int(os.getenv("CHECKPOINT_CACHE_TTL", "1800"))
+CHECKPOINT_INVALIDATION_CHANNEL = os.getenv("CHECKPOINT_INVALIDATION_CHANNEL", "checkpoint:invalidate")
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+metrics = get_metrics("checkpoint_cache")
+metrics.add_ratio("hit_rate", "hits", "lookups")
+
+
+class CachingSaver(DelegatingSaver):
+    """Write-through LRU of each thread's latest checkpoints"""
+
+    def __init__(
+        self,
+        inner: BaseCheckpointSaver,
+        redis: AsyncRedis,
+        maxsize: int = CHECKPOINT_CACHE_SIZE,
+        ttl: int = CHECKPOINT_CACHE_TTL,
+        channel: str = CHECKPOINT_INVALIDATION_CHANNEL
+    ):
+        super().__init__(inner)
+        self.redis = redis
+        self.channel = channel
+        # thread_id -> {checkpoint_ns: (cached_at, CheckpointTuple)}
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        # thread_id -> id of the checkpoint this worker last announced
+        self._announced = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._listening = False
+
+    # Cache
+
+    def _get(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        if not self._listening:
+            metrics.incr("bypassed")
+            return None
+        thread_id, checkpoint_ns = thread_key(config)
+        metrics.incr("lookups")
+        entry = (self._cache.get(thread_id) or {}).get(checkpoint_ns)
+        checkpoint_id = config["configurable"].get("checkpoint_id")
+        if entry is None or checkpoint_id not in (None, entry[1].checkpoint["id"]):
+            metrics.incr("misses")
+            return None
+
+        cached_at, cached = entry
+        metrics.incr("hits")
+        metrics.observe("hit_age_ms", (time.monotonic() - cached_at) * 1000)
+        return CheckpointTuple(
+            config=cached.config,
+            # The Pregel loop updates the loaded checkpoint's versions in place
+            checkpoint=copy_checkpoint(cached.checkpoint),
+            metadata=cached.metadata,
+            parent_config=cached.parent_config,
+            pending_writes=list(cached.pending_writes or []),
+        )
+
+    def _set(self, checkpoint_tuple: CheckpointTuple) -> None:
+        if not self._listening:
+            return
+        thread_id, checkpoint_ns = thread_key(checkpoint_tuple.config)
+        namespaces = self._cache.get(thread_id) or {}
+        namespaces[checkpoint_ns] = (time.monotonic(), checkpoint_tuple)
+        self._cache.set(thread_id, namespaces)
+        metrics.set_gauge("cached_threads", len(self._cache))
+
+    async def _publish(self, thread_id: str, checkpoint_id: Optional[str]) -> None:
+        message = json.dumps({
+            "worker": WORKER_ID,
+            "thread_id": thread_id,
+            "checkpoint_id": checkpoint_id,
+            "ts": time.time(),
+        })
+        try:
+            await self.redis.publish(self.channel, message)
+            metrics.incr("invalidations_published")
+            if checkpoint_id is None:
+                self._announced.pop(thread_id)
+            else:
+                self._announced.set(thread_id, checkpoint_id)
+        except Exception as e:
+            # Other workers may now hold a stale entry; drop ours and stop caching until resubscribed
+            logger.warning(f"Checkpoint invalidation publish failed: {e}")
+            metrics.incr("publish_errors")
+            self._stop_caching()
+
+    def _stop_caching(self) -> None:
+        self._listening = False
+        self._cache.clear()
+        self._announced.clear()
+        metrics.set_gauge("cached_threads", 0)
+
+    # Checkpointer API
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        cached = self._get(config)
+        if cached is not None:
+            return cached
+        checkpoint_tuple = await self.inner.aget_tuple(config)
+        # Only the latest checkpoint is cached
+        if checkpoint_tuple is not None and not config["configurable"].get("checkpoint_id"):
+            self._set(checkpoint_tuple)
+        return checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        saved_config = await self.inner.aput(config, checkpoint, metadata, new_versions)
+        self._set(CheckpointTuple(
+            config=saved_config,
+            checkpoint=copy_checkpoint(checkpoint),
+            metadata=metadata,
+            parent_config=config if config["configurable"].get("checkpoint_id") else None,
+            pending_writes=[],
+        ))
+        await self._publish(thread_key(config)[0], checkpoint["id"])
+        return saved_config
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await self.inner.aput_writes(config, writes, task_id, task_path)
+        thread_id, checkpoint_ns = thread_key(config)
+        entry = (self._cache.get(thread_id) or {}).get(checkpoint_ns)
+        if entry is not None and entry[1].checkpoint["id"] == config["configurable"].get("checkpoint_id"):
+            # Keep the cached pending writes in step with the stored ones
+            entry[1].pending_writes.extend((task_id, channel, value) for channel, value in writes)
+        checkpoint_id = config["configurable"].get("checkpoint_id")
+        if checkpoint_id is None or self._announced.get(thread_id) != checkpoint_id:
+            await self._publish(thread_id, checkpoint_id)
+        else:
+            metrics.incr("invalidations_skipped")
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self.inner.adelete_thread(thread_id)
+        self._cache.pop(thread_id)
+        await self._publish(thread_id, None)
+
+    # Invalidation
+
+    def _handle_invalidation(self, data: Any) -> None:
+        message = json.loads(data)
+        if message["worker"] == WORKER_ID:
+            return
+        metrics.incr("invalidations_received")
+        metrics.observe("invalidation_lag_ms", max(0.0, time.time() - message["ts"]) * 1000)
+        # Another worker moved the thread on; our next write to it must be announced
+        self._announced.pop(message["thread_id"])
+        if self._cache.pop(message["thread_id"]) is not None:
+            metrics.incr("invalidated_entries")
+
+    async def run_invalidation_listener(self, retry_delay: float = 1.0) -> None:
+        """Background task: apply other workers' writes; the cache is only used while subscribed"""
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                self._listening = True
+                logger.info("Checkpoint cache invalidation listener subscribed")
+                async for message in pubsub.listen():
+                    if message and message.get("type") == "message":
+                        self._handle_invalidation(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Checkpoint cache invalidation listener failed: {e}")
+                metrics.incr("listener_errors")
+            finally:
+                self._stop_caching()
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(retry_delay)
@@ -0,0 +1,206 @@
+"""End-of-turn checkpoint coalescing.
+
+LangGraph checkpoints after every superstep: the turn input, the router, the
+workflow init, the agent and ``check_step``, plus every step of the ReAct
+agents and the FAQ subgraph, which checkpoint under their own namespaces.
+A single user message therefore costs roughly 8-12 checkpoint writes of the
+growing state, each with its pending writes.
+
+``CoalescingSaver`` keeps those checkpoints in memory while the turn runs and
+persists only the last checkpoint of each namespace, with its pending writes,
+when ``flush(thread_id)`` is called at the end of the turn. That is one
+checkpoint per namespace touched (usually 2-3 per turn). The persisted
+checkpoint's parent is the last checkpoint persisted before the turn, so the
+stored history has one entry per turn instead of one per superstep.
+
+Crash semantics:
+    * If the process dies mid-turn, the whole turn is lost. The conversation
+      resumes from the previous turn's checkpoint and the user message has to
+      be sent again. No half-finished turn is ever persisted.
+    * If the graph raises, the service still flushes. The last completed
+      superstep and its pending writes are persisted, the same state as the
+      per-step mode would have left behind.
+    * Until the flush, other workers reading the thread see the previous turn.
+      Reads in this process are served from the buffer.
+
+Node retries and interrupts behave as before. Retries happen in-process.
+An interrupt ends the turn, and the flush persists the interrupted checkpoint
+with its pending writes.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Optional, Sequence, Set, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    copy_checkpoint,
+)
+
+from app.core.chatbot.checkpointers.base import DelegatingSaver, checkpoint_config, pending_writes_list, thread_key
+from app.core.chatbot.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+metrics = get_metrics("checkpointer")
+metrics.add_ratio("persisted_checkpoint_ratio", "checkpoints_persisted", "checkpoints_received")
+metrics.add_ratio("persisted_write_ratio", "writes_persisted", "writes_received")
+
+
+@dataclass
+class _PendingCheckpoint:
+    """Latest in-memory checkpoint of one (thread, namespace)"""
+
+    parent_config: Optional[RunnableConfig]
+    config: RunnableConfig
+    checkpoint: Checkpoint
+    metadata: CheckpointMetadata
+    # Channels updated since the last persisted checkpoint
+    channels: Set[str] = field(default_factory=set)
+    # (task_id, write index) -> (task_id, channel, value, task_path)
+    writes: Dict[Tuple[str, int], Tuple[str, str, Any, str]] = field(default_factory=dict)
+
+
+class CoalescingSaver(DelegatingSaver):
+    """Buffers checkpoints during a turn and persists one per namespace at turn end"""
+
+    def __init__(self, inner: BaseCheckpointSaver):
+        super().__init__(inner)
+        self._pending: Dict[Tuple[str, str], _PendingCheckpoint] = {}
+
+    def _to_tuple(self, pending: _PendingCheckpoint) -> CheckpointTuple:
+        return CheckpointTuple(
+            config=pending.config,
+            # The Pregel loop updates the loaded checkpoint's versions in place
+            checkpoint=copy_checkpoint(pending.checkpoint),
+            metadata=pending.metadata,
+            parent_config=pending.parent_config,
+            pending_writes=pending_writes_list(pending.writes),
+        )
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        pending = self._pending.get(thread_key(config))
+        checkpoint_id = config["configurable"].get("checkpoint_id")
+        if pending is not None and checkpoint_id in (None, pending.checkpoint["id"]):
+            return self._to_tuple(pending)
+        return await self.inner.aget_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        # The in-flight checkpoint is the newest one of its namespace
+        if config is not None and before is None and not filter:
+            thread_id = config["configurable"]["thread_id"]
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            for (pending_thread, pending_ns), pending in list(self._pending.items()):
+                if pending_thread == thread_id and checkpoint_ns in (None, pending_ns):
+                    yield self._to_tuple(pending)
+                    if limit is not None:
+                        limit -= 1
+                        if limit <= 0:
+                            return
+        async for item in self.inner.alist(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        key = thread_key(config)
+        metrics.incr("checkpoints_received")
+
+        pending = self._pending.get(key)
+        if pending is None:
+            # First checkpoint of the turn; config points at the last persisted one
+            parent_config = config if config["configurable"].get("checkpoint_id") else None
+            pending = _PendingCheckpoint(parent_config, config, checkpoint, metadata)
+            self._pending[key] = pending
+        else:
+            # Writes of the superseded checkpoint are already applied to this one
+            pending.writes.clear()
+
+        pending.config = checkpoint_config(key[0], key[1], checkpoint["id"])
+        pending.checkpoint = checkpoint
+        pending.metadata = metadata
+        pending.channels.update(new_versions)
+        metrics.set_gauge("buffered_namespaces", len(self._pending))
+        return pending.config
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        metrics.incr("writes_received", len(writes))
+        pending = self._pending.get(thread_key(config))
+        if pending is None or config["configurable"].get("checkpoint_id") != pending.checkpoint["id"]:
+            # Not part of a buffered turn
+            metrics.incr("writes_persisted", len(writes))
+            await self.inner.aput_writes(config, writes, task_id, task_path)
+            return
+
+        for index, (channel, value) in enumerate(writes):
+            write_index = WRITES_IDX_MAP.get(channel, index)
+            if write_index < 0 or (task_id, write_index) not in pending.writes:
+                pending.writes[(task_id, write_index)] = (task_id, channel, value, task_path)
+
+    async def _persist(self, key: Tuple[str, str], pending: _PendingCheckpoint) -> None:
+        thread_id, checkpoint_ns = key
+        parent_config = pending.parent_config or {
+            "configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+        }
+        channel_versions = pending.checkpoint["channel_versions"]
+        new_versions = {
+            channel: channel_versions[channel]
+            for channel in pending.channels
+            if channel in channel_versions
+        }
+        saved_config = await self.inner.aput(parent_config, pending.checkpoint, pending.metadata, new_versions)
+        metrics.incr("checkpoints_persisted")
+
+        by_task: Dict[Tuple[str, str], list] = {}
+        for task_id, channel, value, task_path in pending.writes.values():
+            by_task.setdefault((task_id, task_path), []).append((channel, value))
+        for (task_id, task_path), writes in by_task.items():
+            await self.inner.aput_writes(saved_config, writes, task_id, task_path)
+            metrics.incr("writes_persisted", len(writes))
+
+    async def flush(self, thread_id: str) -> None:
+        """Persist the buffered checkpoints of a thread"""
+        keys = [key for key in self._pending if key[0] == thread_id]
+        # Parent namespace first, so readers never see a subgraph ahead of it
+        for key in sorted(keys, key=lambda k: k[1]):
+            pending = self._pending.pop(key)
+            try:
+                await self._persist(key, pending)
+            except Exception as e:
+                logger.error(f"Checkpoint flush failed for {thread_id} ({key[1] or 'root'}): {e}")
+                metrics.incr("flush_errors")
+        metrics.incr("flushes")
+        metrics.set_gauge("buffered_namespaces", len(self._pending))
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        for key in [key for key in self._pending if key[0] == thread_id]:
+            del self._pending[key]
+        await self.inner.adelete_thread(thread_id)
+
+    async def flush_all(self) -> None:
+        """Persist every buffered thread (used at shutdown)"""
+        for thread_id in {key[0] for key in self._pending}:
+            await self.flush(thread_id)
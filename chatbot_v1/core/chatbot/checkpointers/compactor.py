@@ -0,0 +1,365 @@
+"""Retention policy and compaction for the Redis checkpointer.
+
+The Redis saver keeps every checkpoint, pending write and (in versions that
+store them separately) channel blob it has ever written. The compactor
+enforces, per thread:
+
+* ``CHECKPOINT_IDLE_TTL``: threads with no new checkpoint for this many
+  seconds are deleted entirely. The time is read from the uuid6 checkpoint
+  id, so no document has to be fetched.
+* ``CHECKPOINT_KEEP_LAST``: only the newest N root checkpoints are kept.
+  Subgraph namespaces (ReAct agents, FAQ) older than the oldest kept root
+  checkpoint are dropped as well.
+* Pending writes are only kept for the latest checkpoint of each namespace.
+  Writes of earlier checkpoints have already been applied to their successor.
+  SCAN is not atomic: a turn running during the scan can have its writes
+  collected but not its new checkpoint (or new subgraph namespace). So a
+  write is only dropped when its checkpoint id is older than the namespace's
+  latest kept checkpoint and than the scan start, and writes of a namespace
+  without any scanned checkpoint are only dropped after ``CHECKPOINT_IDLE_TTL``.
+* Channel blobs that no kept checkpoint references are deleted when a kept
+  checkpoint references a newer version of the channel, or their namespace is
+  dropped.
+
+Keys are collected with SCAN and deleted with UNLINK in pipelined batches, so
+Redis is never blocked. One pass holds the checkpoint key names in memory,
+grouped by thread. Thread, checkpoint and task ids are uuids, so the key
+parts around the namespace (which may contain ``:``) parse unambiguously.
+
+The runtime runs ``run_compactor_loop``, guarded by a Redis lock so one
+worker compacts per interval. Operators can run it by hand::
+
+    python -m app.core.chatbot.checkpointers.compactor report [--top 20]
+    python -m app.core.chatbot.checkpointers.compactor compact [--dry-run]
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from redis.asyncio import Redis as AsyncRedis
+
+from app.core.chatbot.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "5"))
+CHECKPOINT_IDLE_TTL = int(os.getenv("CHECKPOINT_IDLE_TTL", str(60 * 60 * 24 * 7)))
+CHECKPOINT_COMPACT_INTERVAL = int(os.getenv("CHECKPOINT_COMPACT_INTERVAL", "3600"))
+SCAN_COUNT = 1000
+DELETE_BATCH_SIZE = 500
+LOCK_KEY = "checkpoint_compactor:lock"
+
+CHECKPOINT_PREFIX = "checkpoint"
+WRITE_PREFIX = "checkpoint_write"
+BLOB_PREFIX = "checkpoint_blob"
+LATEST_PREFIX = "checkpoint_latest"
+WRITE_ZSET_PREFIX = "write_keys_zset"
+EMPTY_SENTINEL = "__empty__"
+
+# 100 ns intervals between the UUID epoch (1582-10-15) and the Unix epoch
+_UUID_EPOCH_OFFSET = 0x01B21DD213814000
+
+metrics = get_metrics("checkpoint_compactor")
+
+
+def checkpoint_timestamp(checkpoint_id: str) -> float:
+    """Unix time encoded in a uuid6 checkpoint id"""
+    value = UUID(checkpoint_id).int
+    timestamp = ((value >> 80) << 12) | ((value >> 64) & 0x0FFF)
+    return (timestamp - _UUID_EPOCH_OFFSET) / 1e7
+
+
+@dataclass
+class ThreadKeys:
+    """Checkpointer keys of one thread, grouped by namespace"""
+
+    # namespace -> {checkpoint_id: key}
+    checkpoints: Dict[str, Dict[str, str]] = field(default_factory=lambda: defaultdict(dict))
+    # namespace -> {checkpoint_id: [keys]} (write documents and write-key zsets)
+    writes: Dict[str, Dict[str, List[str]]] = field(default_factory=lambda: defaultdict(lambda: defaultdict(list)))
+    blobs: List[str] = field(default_factory=list)
+    other: List[str] = field(default_factory=list)
+
+    def all_keys(self) -> List[str]:
+        keys = [key for ids in self.checkpoints.values() for key in ids.values()]
+        keys += [key for ids in self.writes.values() for group in ids.values() for key in group]
+        return keys + self.blobs + self.other
+
+    @property
+    def last_activity(self) -> float:
+        # Writes count too: their checkpoint may have been created after the scan passed it
+        ids = [cid for ids in self.checkpoints.values() for cid in ids]
+        ids += [cid for ids in self.writes.values() for cid in ids]
+        return max((checkpoint_timestamp(cid) for cid in ids), default=0.0)
+
+
+@dataclass
+class CompactionPlan:
+    delete: List[str] = field(default_factory=list)
+    threads_expired: int = 0
+    checkpoints_dropped: int = 0
+    writes_dropped: int = 0
+    blobs_dropped: int = 0
+
+
+def _parse(key: str, threads: Dict[str, ThreadKeys]) -> None:
+    prefix, _, rest = key.partition(":")
+    parts = rest.split(":")
+    known = (CHECKPOINT_PREFIX, WRITE_PREFIX, BLOB_PREFIX, LATEST_PREFIX, WRITE_ZSET_PREFIX)
+    if prefix not in known or len(parts) < 2:
+        return
+    thread = threads[parts[0]]
+
+    if prefix == CHECKPOINT_PREFIX and len(parts) >= 3:
+        thread.checkpoints[":".join(parts[1:-1])][parts[-1]] = key
+    elif prefix == WRITE_PREFIX and len(parts) >= 5:
+        # thread : ns... : checkpoint_id : task_id : idx
+        thread.writes[":".join(parts[1:-3])][parts[-3]].append(key)
+    elif prefix == WRITE_ZSET_PREFIX and len(parts) >= 3:
+        thread.writes[":".join(parts[1:-1])][parts[-1]].append(key)
+    elif prefix == BLOB_PREFIX:
+        thread.blobs.append(key)
+    elif prefix == LATEST_PREFIX:
+        thread.other.append(key)
+
+
+class CheckpointCompactor:
+    """Applies the retention policy to the Redis checkpointer's keys"""
+
+    def __init__(self, redis: AsyncRedis, keep_last: int = CHECKPOINT_KEEP_LAST, idle_ttl: int = CHECKPOINT_IDLE_TTL):
+        self.redis = redis
+        self.keep_last = keep_last
+        self.idle_ttl = idle_ttl
+
+    async def collect(self) -> Dict[str, ThreadKeys]:
+        """SCAN the checkpointer keys and group them by thread"""
+        threads: Dict[str, ThreadKeys] = defaultdict(ThreadKeys)
+        for pattern in (f"{CHECKPOINT_PREFIX}*", f"{WRITE_ZSET_PREFIX}:*"):
+            async for key in self.redis.scan_iter(match=pattern, count=SCAN_COUNT):
+                _parse(key.decode("utf-8") if isinstance(key, bytes) else key, threads)
+        return threads
+
+    async def _referenced_blobs(self, thread_id: str, kept: List[Tuple[str, str]]) -> Set[str]:
+        """Blob keys referenced by the kept checkpoints' channel versions"""
+        referenced = set()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for _, key in kept:
+                pipe.json().get(key, "$.checkpoint.channel_versions")
+            results = await pipe.execute()
+        for (namespace, _), versions in zip(kept, results):
+            # JSONPath results come back as a one-element list
+            versions = versions[0] if isinstance(versions, list) and versions else versions
+            if isinstance(versions, str):
+                versions = json.loads(versions)
+            for channel, version in (versions or {}).items():
+                referenced.add(f"{BLOB_PREFIX}:{thread_id}:{namespace}:{channel}:{version}")
+        return referenced
+
+    async def plan_thread(self, thread_id: str, thread: ThreadKeys, now: float, scan_started: Optional[float] = None) -> CompactionPlan:
+        """
+        Keys of one thread to delete.
+
+        Args:
+            now: Current Unix time, for the idle TTL.
+            scan_started: Unix time the SCAN began; writes of checkpoints created since are kept.
+        """
+        plan = CompactionPlan()
+        scan_started = now if scan_started is None else scan_started
+        if not thread.checkpoints and not thread.writes:
+            return plan
+
+        if now - thread.last_activity > self.idle_ttl:
+            plan.delete = thread.all_keys()
+            plan.threads_expired = 1
+            return plan
+
+        root_ids = sorted(thread.checkpoints.get(EMPTY_SENTINEL, {}), reverse=True)
+        cutoff = checkpoint_timestamp(root_ids[:self.keep_last][-1]) if root_ids else 0.0
+
+        kept: List[Tuple[str, str]] = []
+        dropped_namespaces: List[str] = []
+        for namespace, ids in thread.checkpoints.items():
+            ordered = sorted(ids, reverse=True)
+            if namespace == EMPTY_SENTINEL:
+                keep = set(ordered[:self.keep_last])
+            elif checkpoint_timestamp(ordered[0]) >= cutoff:
+                # Subgraph run within the kept turns: keep its latest checkpoint
+                keep = {ordered[0]}
+            else:
+                keep = set()
+
+            for checkpoint_id in ordered:
+                if checkpoint_id in keep:
+                    kept.append((namespace, ids[checkpoint_id]))
+                else:
+                    plan.delete.append(ids[checkpoint_id])
+                    plan.checkpoints_dropped += 1
+
+            if not keep:
+                dropped_namespaces.append(namespace)
+
+            # Pending writes are only needed for the latest checkpoint (none when the
+            # namespace is dropped). Writes newer than it may belong to a checkpoint
+            # the scan missed: keep them.
+            latest = checkpoint_timestamp(ordered[0])
+            for checkpoint_id, keys in thread.writes.get(namespace, {}).items():
+                written = checkpoint_timestamp(checkpoint_id)
+                obsolete = written < latest or (not keep and written == latest)
+                if obsolete and written < scan_started:
+                    plan.delete.extend(keys)
+                    plan.writes_dropped += len(keys)
+
+        # Writes of a namespace without scanned checkpoints: a subgraph that started
+        # during the scan, or leftovers of a deleted one. Only the latter are idle.
+        for namespace, by_checkpoint in thread.writes.items():
+            if namespace not in thread.checkpoints:
+                for checkpoint_id, keys in by_checkpoint.items():
+                    if now - checkpoint_timestamp(checkpoint_id) > self.idle_ttl:
+                        plan.delete.extend(keys)
+                        plan.writes_dropped += len(keys)
+
+        if thread.blobs:
+            referenced = await self._referenced_blobs(thread_id, kept)
+            # Newest referenced version per namespace and channel (versions sort as strings)
+            newest: Dict[str, str] = {}
+            for key in referenced:
+                channel_key, _, version = key.rpartition(":")
+                newest[channel_key] = max(newest.get(channel_key, version), version)
+            dropped_prefixes = tuple(f"{BLOB_PREFIX}:{thread_id}:{namespace}:" for namespace in dropped_namespaces)
+
+            for key in thread.blobs:
+                if key in referenced:
+                    continue
+                channel_key, _, version = key.rpartition(":")
+                # Superseded by a kept checkpoint, or in a dropped namespace. Anything else
+                # may be referenced by a checkpoint written during the scan.
+                if version < newest.get(channel_key, "") or key.startswith(dropped_prefixes):
+                    plan.delete.append(key)
+                    plan.blobs_dropped += 1
+        return plan
+
+    async def _unlink(self, keys: List[str]) -> None:
+        for start in range(0, len(keys), DELETE_BATCH_SIZE):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.unlink(*keys[start:start + DELETE_BATCH_SIZE])
+                await pipe.execute()
+
+    async def compact(self, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Apply the retention policy to every thread.
+
+        Returns:
+            Counts of threads scanned/expired and keys dropped by kind.
+        """
+        started = time.perf_counter()
+        scan_started = time.time()
+        threads = await self.collect()
+        now = time.time()
+        totals = defaultdict(int)
+        totals["threads"] = len(threads)
+        pending: List[str] = []
+
+        for thread_id, thread in threads.items():
+            plan = await self.plan_thread(thread_id, thread, now, scan_started)
+            totals["threads_expired"] += plan.threads_expired
+            totals["checkpoints_dropped"] += plan.checkpoints_dropped
+            totals["writes_dropped"] += plan.writes_dropped
+            totals["blobs_dropped"] += plan.blobs_dropped
+            totals["keys_deleted"] += len(plan.delete)
+            pending.extend(plan.delete)
+            if not dry_run and len(pending) >= DELETE_BATCH_SIZE:
+                await self._unlink(pending)
+                pending = []
+
+        if not dry_run and pending:
+            await self._unlink(pending)
+
+        if not dry_run:
+            for key, value in totals.items():
+                metrics.incr(key, value)
+            metrics.observe("run_seconds", time.perf_counter() - started)
+        return dict(totals)
+
+    async def report(self, top: int = 20) -> List[Dict[str, float]]:
+        """Per-thread key counts and memory usage, largest threads first"""
+        threads = await self.collect()
+        rows = []
+        for thread_id, thread in threads.items():
+            keys = thread.all_keys()
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.memory_usage(key)
+                sizes = await pipe.execute()
+            rows.append({
+                "thread_id": thread_id,
+                "checkpoints": sum(len(ids) for ids in thread.checkpoints.values()),
+                "namespaces": len(thread.checkpoints),
+                "writes": sum(len(k) for ids in thread.writes.values() for k in ids.values()),
+                "blobs": len(thread.blobs),
+                "bytes": sum(size or 0 for size in sizes),
+                "idle_seconds": time.time() - thread.last_activity if thread.checkpoints else 0.0,
+            })
+        rows.sort(key=lambda row: row["bytes"], reverse=True)
+        return rows[:top] if top else rows
+
+
+async def run_compactor_loop(redis: AsyncRedis, interval: int = CHECKPOINT_COMPACT_INTERVAL) -> None:
+    """Background task: compact every interval, on one worker at a time"""
+    compactor = CheckpointCompactor(redis)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            # The lock expires with the interval, so a crashed worker never blocks the others
+            if not await redis.set(LOCK_KEY, os.getpid(), nx=True, ex=max(1, interval - 1)):
+                continue
+            totals = await compactor.compact()
+            logger.info(f"Checkpoint compaction: {totals}")
+        except Exception as e:
+            logger.warning(f"Checkpoint compaction failed: {e}")
+            metrics.incr("errors")
+
+
+async def main_async(args) -> None:
+    from app.core.chatbot.utils.redis_client import get_async_redis_client, close_async_redis_client
+
+    compactor = CheckpointCompactor(get_async_redis_client())
+    try:
+        if args.command == "report":
+            rows = await compactor.report(top=args.top)
+            print(f"{'thread_id':<38} {'ckpts':>6} {'ns':>4} {'writes':>7} {'blobs':>6} {'bytes':>12} {'idle_h':>8}")
+            for row in rows:
+                print(
+                    f"{row['thread_id']:<38} {row['checkpoints']:>6} {row['namespaces']:>4} {row['writes']:>7} "
+                    f"{row['blobs']:>6} {row['bytes']:>12} {row['idle_seconds'] / 3600:>8.1f}"
+                )
+            print(f"total bytes (top {len(rows)}): {sum(row['bytes'] for row in rows)}")
+        else:
+            totals = await compactor.compact(dry_run=args.dry_run)
+            print(("[dry run] " if args.dry_run else "") + ", ".join(f"{k}={v}" for k, v in totals.items()))
+    finally:
+        await close_async_redis_client()
+
+
+def main():
+    import argparse
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Checkpoint retention for the Redis checkpointer")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report = subparsers.add_parser("report", help="Per-thread checkpoint storage")
+    report.add_argument("--top", type=int, default=20, help="Number of threads to show (0 for all)")
+    compact = subparsers.add_parser("compact", help="Apply the retention policy")
+    compact.add_argument("--dry-run", action="store_true", help="Only count what would be deleted")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
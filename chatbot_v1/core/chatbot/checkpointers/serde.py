@@ -0,0 +1,89 @@
+"""Compact serializer for the Redis checkpointer.
+
+``AsyncRedisSaver`` stores checkpoint and metadata documents as RedisJSON, so
+those must stay JSON. Everything else it serializes goes through
+``dumps_typed`` with the type tag stored next to the bytes: pending writes,
+and in savers that keep them outside the document, channel value blobs.
+``CompactRedisSerializer`` encodes those values as msgpack with LangGraph's
+own serializer and then compresses them with the shared codec (zstd,
+optionally with a trained dictionary; see ``utils.codec``).
+
+The choice is made by call site, never by the shape of the value:
+``CompactAsyncRedisSaver`` runs its checkpoint and metadata document methods
+with the parent JSON serializer, and every other ``serde`` call (writes and
+blobs) gets the compact one.
+
+Data written before this serializer was enabled keeps its original type tag
+and is decoded by the parent class, so it can be switched on for existing
+threads.
+"""
+
+from typing import Any, Optional, Tuple
+
+from langgraph.checkpoint.redis.aio import AsyncRedisSaver
+from langgraph.checkpoint.redis.jsonplus_redis import JsonPlusRedisSerializer
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from app.core.chatbot.utils.codec import FORMAT_MSGPACK, Codec, get_codec
+from app.core.chatbot.utils.metrics import get_metrics
+
+COMPACT_TYPE = "compact:msgpack"
+
+metrics = get_metrics("checkpoint_serde")
+metrics.add_ratio("compression_ratio", "compact_bytes", "msgpack_bytes")
+
+
+class CompactRedisSerializer(JsonPlusRedisSerializer):
+    """Compressed msgpack for pending writes and channel blobs"""
+
+    def __init__(self, codec: Optional[Codec] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.codec = codec or get_codec()
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = JsonPlusSerializer.dumps_typed(self, obj)
+        if type_ != "msgpack":
+            return super().dumps_typed(obj)
+        compact = self.codec.compress(data, FORMAT_MSGPACK)
+        metrics.incr("msgpack_bytes", len(data))
+        metrics.incr("compact_bytes", len(compact))
+        return COMPACT_TYPE, compact
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_ == COMPACT_TYPE:
+            if isinstance(payload, str):
+                payload = payload.encode("latin-1")
+            _, raw = self.codec.decompress(payload)
+            return JsonPlusSerializer.loads_typed(self, ("msgpack", raw))
+        return super().loads_typed(data)
+
+
+class _DocumentView:
+    """The saver as seen by its document methods: same attributes, JSON serializer"""
+
+    def __init__(self, saver: AsyncRedisSaver, serde: JsonPlusRedisSerializer):
+        self._saver = saver
+        self.serde = serde
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._saver, name)
+
+
+class CompactAsyncRedisSaver(AsyncRedisSaver):
+    """``AsyncRedisSaver`` with compact writes and blobs; checkpoints and metadata stay RedisJSON"""
+
+    def __init__(self, *args, codec: Optional[Codec] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The saver hard-codes its serializer in __init__
+        self._documents = _DocumentView(self, JsonPlusRedisSerializer())
+        self.serde = CompactRedisSerializer(codec=codec)
+
+    def _dump_checkpoint(self, checkpoint):
+        return AsyncRedisSaver._dump_checkpoint(self._documents, checkpoint)
+
+    def _dump_metadata(self, metadata):
+        return AsyncRedisSaver._dump_metadata(self._documents, metadata)
+
+    def _load_metadata(self, metadata):
+        return AsyncRedisSaver._load_metadata(self._documents, metadata)
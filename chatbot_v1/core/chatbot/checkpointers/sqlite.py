@@ -0,0 +1,121 @@
+"""Embedded SQLite checkpointer for single-node and test deployments.
+
+``AsyncSqliteSaver`` runs every call, reads included, on one connection
+behind one lock, so a turn loading its checkpoint waits behind another
+turn's writes. In WAL mode SQLite serves readers concurrently with the single
+writer. ``SqliteWalSaver`` therefore keeps the wrapped saver's connection for
+writes and hands ``aget_tuple``/``alist`` to a pool of read-only connections.
+
+Connections are tuned for a local checkpoint store:
+
+* ``journal_mode=WAL``: readers never block the writer, or the other way round
+* ``synchronous=NORMAL``: commits skip the fsync (WAL is synced at
+  checkpoints). A power loss can drop the last few commits; an application
+  crash cannot.
+* ``busy_timeout``: wait instead of failing while another process writes
+
+Only one node can use the database file, but several workers on that node
+can share it.
+"""
+
+import os
+import asyncio
+import logging
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiosqlite
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import CheckpointTuple
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from app.core.chatbot.checkpointers.base import DelegatingSaver
+from app.core.chatbot.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+SQLITE_CHECKPOINT_PATH = os.getenv("SQLITE_CHECKPOINT_PATH", "data/checkpoints.sqlite")
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "4"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+metrics = get_metrics("sqlite_checkpointer")
+
+
+async def _connect(path: str, read_only: bool = False) -> aiosqlite.Connection:
+    conn = await aiosqlite.connect(path)
+    await conn.execute("PRAGMA journal_mode=WAL")
+    await conn.execute("PRAGMA synchronous=NORMAL")
+    await conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    if read_only:
+        await conn.execute("PRAGMA query_only=ON")
+    return conn
+
+
+class SqliteWalSaver(DelegatingSaver):
+    """One writer connection, a pool of concurrent reader connections"""
+
+    def __init__(self, writer: AsyncSqliteSaver, readers: List[AsyncSqliteSaver]):
+        super().__init__(writer)
+        self._readers: asyncio.Queue = asyncio.Queue()
+        self._pool_size = len(readers)
+        for reader in readers:
+            self._readers.put_nowait(reader)
+
+    @classmethod
+    @asynccontextmanager
+    async def from_path(
+        cls,
+        path: str = SQLITE_CHECKPOINT_PATH,
+        pool_size: int = SQLITE_READ_POOL_SIZE,
+        serde: Any = None
+    ) -> AsyncIterator["SqliteWalSaver"]:
+        """Open the database, create its tables and the reader pool"""
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        async with AsyncExitStack() as stack:
+            conn = await _connect(path)
+            stack.push_async_callback(conn.close)
+            writer = AsyncSqliteSaver(conn, serde=serde)
+            await writer.setup()
+
+            readers = []
+            # An in-memory database is private to its connection
+            for _ in range(pool_size if path != ":memory:" else 0):
+                reader_conn = await _connect(path, read_only=True)
+                stack.push_async_callback(reader_conn.close)
+                reader = AsyncSqliteSaver(reader_conn, serde=writer.serde)
+                # Tables were created by the writer
+                reader.is_setup = True
+                readers.append(reader)
+
+            logger.info(f"SQLite checkpointer at {path} ({len(readers)} reader connections)")
+            yield cls(writer, readers)
+
+    @asynccontextmanager
+    async def _reader(self) -> AsyncIterator[AsyncSqliteSaver]:
+        if not self._pool_size:
+            yield self.inner
+            return
+        started = asyncio.get_running_loop().time()
+        reader = await self._readers.get()
+        metrics.observe("reader_wait_ms", (asyncio.get_running_loop().time() - started) * 1000)
+        try:
+            yield reader
+        finally:
+            self._readers.put_nowait(reader)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        async with self._reader() as reader:
+            return await reader.aget_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        async with self._reader() as reader:
+            async for item in reader.alist(config, filter=filter, before=before, limit=limit):
+                yield item
@@ -37,6 +37,13 @@ class IndexConfiguration:
         },
     )
 
+    search_mode: Literal["hybrid", "similarity", "lexical"] = field(
+        default="hybrid",
+        metadata={
+            "description": "How the retriever ranks chunks: BM25 and vector search fused by reciprocal rank, vector search only, or BM25 only (no embedding call)."
+        },
+    )
+
     search_kwargs: dict[str, Any] = field(
         default_factory=dict,
         metadata={
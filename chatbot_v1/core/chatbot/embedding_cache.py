@@ -0,0 +1,166 @@
+"""Cache of query embeddings.
+
+FAQ questions repeat ("baggage allowance", "how to change my flight"), and
+each one costs an embedding round trip before the vector search. Query
+vectors are cached per embedding model and normalized query text in an
+in-process LRU, optionally backed by Redis so every worker shares them.
+Vectors are stored as packed float32 bytes (4 bytes per dimension).
+
+Only queries are cached; ``embed_documents`` (indexing, intent prototypes)
+goes straight to the wrapped encoder.
+"""
+
+import os
+import re
+import hashlib
+import logging
+import unicodedata
+from array import array
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from app.core.chatbot.utils.cache import LRUCache
+from app.core.chatbot.utils.metrics import get_metrics
+from app.core.chatbot.utils.redis_client import redis_manager
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE = os.getenv("EMBEDDING_CACHE", "true") == "true"
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "5000"))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
+EMBEDDING_CACHE_REDIS = os.getenv("EMBEDDING_CACHE_REDIS", "false") == "true"
+EMBEDDING_CACHE_PREFIX = "embedding:"
+
+metrics = get_metrics("embedding_cache")
+metrics.add_ratio("hit_rate", "hits", "lookups")
+
+_SPACES_RE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " ?!.,;:\"'`()[]{}؟،"
+
+
+def normalize_query(text: str) -> str:
+    """NFKC, casefold, collapse whitespace and drop surrounding punctuation"""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return _SPACES_RE.sub(" ", text).strip(_EDGE_PUNCTUATION)
+
+
+def pack_vector(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(data: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper serving repeated queries from an LRU with an optional Redis tier"""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        maxsize: int = EMBEDDING_CACHE_SIZE,
+        ttl: int = EMBEDDING_CACHE_TTL,
+        use_redis: bool = EMBEDDING_CACHE_REDIS
+    ):
+        self.embeddings = embeddings
+        self.model = model
+        self.ttl = ttl
+        self.use_redis = use_redis
+        # Packed float32, a quarter of the size of a list of floats
+        self._local = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def make_key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model}\x1f{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def _lookup_local(self, key: str) -> Optional[List[float]]:
+        metrics.incr("lookups")
+        data = self._local.get(key)
+        if data is None:
+            return None
+        metrics.incr("hits")
+        metrics.incr("hits_local")
+        return unpack_vector(data)
+
+    def _found_in_redis(self, key: str, data: Optional[bytes]) -> Optional[List[float]]:
+        if not data:
+            metrics.incr("misses")
+            return None
+        self._local.set(key, data)
+        metrics.incr("hits")
+        metrics.incr("hits_redis")
+        return unpack_vector(data)
+
+    def _stored(self, key: str, vector: List[float]) -> bytes:
+        data = pack_vector(vector)
+        self._local.set(key, data)
+        metrics.set_gauge("local_entries", len(self._local))
+        return data
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.make_key(text)
+        vector = self._lookup_local(key)
+        if vector is not None:
+            return vector
+
+        # Sync callers (tools run in a worker thread) use the breaker-guarded sync client
+        redis_key = EMBEDDING_CACHE_PREFIX + key
+        if self.use_redis and redis_manager.available:
+            try:
+                vector = self._found_in_redis(key, redis_manager.execute(lambda client: client.get(redis_key)))
+            except Exception as e:
+                logger.warning(f"Embedding cache Redis lookup failed: {e}")
+                metrics.incr("redis_errors")
+                metrics.incr("misses")
+            if vector is not None:
+                return vector
+        else:
+            metrics.incr("misses")
+
+        vector = self.embeddings.embed_query(text)
+        data = self._stored(key, vector)
+        if self.use_redis and redis_manager.available:
+            try:
+                redis_manager.execute(lambda client: client.set(redis_key, data, ex=self.ttl))
+            except Exception as e:
+                logger.warning(f"Embedding cache Redis write failed: {e}")
+                metrics.incr("redis_errors")
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self.make_key(text)
+        vector = self._lookup_local(key)
+        if vector is not None:
+            return vector
+
+        redis_key = EMBEDDING_CACHE_PREFIX + key
+        if self.use_redis and redis_manager.async_available:
+            try:
+                vector = self._found_in_redis(key, await redis_manager.aexecute(lambda client: client.get(redis_key)))
+            except Exception as e:
+                logger.warning(f"Embedding cache Redis lookup failed: {e}")
+                metrics.incr("redis_errors")
+                metrics.incr("misses")
+            if vector is not None:
+                return vector
+        else:
+            metrics.incr("misses")
+
+        vector = await self.embeddings.aembed_query(text)
+        data = self._stored(key, vector)
+        if self.use_redis and redis_manager.async_available:
+            try:
+                await redis_manager.aexecute(lambda client: client.set(redis_key, data, ex=self.ttl))
+            except Exception as e:
+                logger.warning(f"Embedding cache Redis write failed: {e}")
+                metrics.incr("redis_errors")
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
@@ -0,0 +1,294 @@
+"""Local fast-path intent classification ahead of the LLM router.
+
+Tier 1 applies regexes and keyword rules generated from the workflow
+definitions (``intent_patterns`` / ``intent_keywords`` / the workflow name),
+plus a few global rules such as greetings. Single-word keywords and the
+workflow name are too weak to decide alone. Tier 2 compares the message
+embedding with per-route centroids of cached example embeddings; it is
+skipped while a workflow is active. Anything below the confidence thresholds
+returns ``None`` and is escalated to the LLM.
+
+Evaluate over a labelled file (one JSON object per line with ``text`` and
+``label``, optionally ``workflow``/``step`` for the active context; the
+default set is ``benchmarks/intent_utterances.jsonl``) with:
+
+    python -m app.core.chatbot.fast_intent [labelled.jsonl] [--with-llm]
+"""
+
+import os
+import re
+import json
+import math
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from app.core.chatbot.state import State
+from app.core.chatbot.utils.langid import is_trivial_input
+from app.core.chatbot.utils.metrics import get_metrics
+from app.core.chatbot.workflow_manager import workflow_manager
+
+logger = logging.getLogger(__name__)
+
+# Rule decisions below this confidence are escalated
+MIN_CONFIDENCE = float(os.getenv("FAST_INTENT_MIN_CONFIDENCE", "0.8"))
+# Embedding tier: minimum cosine similarity to the best centroid and margin over the runner-up
+MIN_SIMILARITY = float(os.getenv("FAST_INTENT_MIN_SIMILARITY", "0.6"))
+MIN_MARGIN = float(os.getenv("FAST_INTENT_MIN_MARGIN", "0.05"))
+USE_EMBEDDINGS = os.getenv("FAST_INTENT_EMBEDDINGS", "true") == "true"
+
+DEFAULT_LABELLED = Path(__file__).resolve().parents[2] / "benchmarks" / "intent_utterances.jsonl"
+
+metrics = get_metrics("fast_intent")
+metrics.add_ratio("llm_call_savings", "decided", "total")
+
+_GREETING_RE = re.compile(
+    r"^\s*(hi|hello|hey|hiya|good (morning|afternoon|evening)|salam|salaam|marhaba|ahlan|"
+    r"bonjour|hallo|hola|merhaba|thanks|thank you|thx)[\s!.,]*$",
+    re.IGNORECASE,
+)
+
+# Examples for the routes that are not workflows
+ROUTE_EXAMPLES: Dict[str, List[str]] = {
+    "faq": [
+        "what is the baggage allowance",
+        "how much does extra luggage cost",
+        "can I change my flight date",
+        "what is the refund policy",
+        "what is included in the premium bundle",
+        "when does check-in close",
+        "can I bring my pet on board",
+    ],
+    "agent": [
+        "hi there",
+        "who are you",
+        "thank you for your help",
+        "can I talk to someone",
+        "what can you do",
+    ],
+}
+
+
+@dataclass
+class FastDecision:
+    target: str
+    confidence: float
+    tier: str
+    slots: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class _Rule:
+    target: str
+    pattern: Pattern
+    confidence: float
+
+
+def build_rules() -> List[_Rule]:
+    """Generate regex and keyword rules from the registered workflows"""
+    rules = []
+    for wf in workflow_manager.workflows.values():
+        for pattern in wf.intent_patterns:
+            rules.append(_Rule(wf.name, re.compile(pattern, re.IGNORECASE), 0.95))
+        # Only explicit multi-word phrases decide on their own. A single word or the
+        # workflow name ("how does baggage tracking work?") also shows up in FAQ
+        # questions, so it stays below MIN_CONFIDENCE and escalates.
+        for keyword in wf.intent_keywords:
+            confidence = 0.85 if len(keyword.split()) > 1 else 0.6
+            rules.append(_Rule(wf.name, re.compile(rf"\b{re.escape(keyword)}\b", re.IGNORECASE), confidence))
+        name = wf.name.replace("_", " ")
+        rules.append(_Rule(wf.name, re.compile(rf"\b{re.escape(name)}\b", re.IGNORECASE), 0.6))
+    return rules
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _dot(a: List[float], b: List[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+class FastIntentClassifier:
+    """Tiered rule / nearest-centroid classifier in front of the LLM router"""
+
+    def __init__(self, embeddings: Optional[Embeddings] = None):
+        self.rules = build_rules()
+        self.embeddings = embeddings
+        self._centroids: Optional[Dict[str, List[float]]] = None
+
+    def classify_rules(self, text: str, state: State) -> Optional[FastDecision]:
+        """Tier 1: regexes and keywords"""
+        if state.get("current_workflow") and is_trivial_input(text):
+            # Dates, numbers and codes mid-workflow answer the current step
+            return FastDecision("agent", 0.9, "rules")
+        if _GREETING_RE.match(text):
+            return FastDecision("agent", 0.95, "rules")
+
+        best: Optional[FastDecision] = None
+        for rule in self.rules:
+            match = rule.pattern.search(text)
+            if match and (best is None or rule.confidence > best.confidence):
+                slots = {k: v for k, v in match.groupdict().items() if v}
+                best = FastDecision(rule.target, rule.confidence, "rules", slots)
+        return best
+
+    async def _get_centroids(self) -> Dict[str, List[float]]:
+        """Embed the example utterances once and average them per route"""
+        if self._centroids is None:
+            examples: Dict[str, List[str]] = dict(ROUTE_EXAMPLES)
+            for wf in workflow_manager.workflows.values():
+                if wf.intent_examples:
+                    examples[wf.name] = list(wf.intent_examples)
+
+            texts = [text for route_examples in examples.values() for text in route_examples]
+            vectors = await self.embeddings.aembed_documents(texts)
+
+            centroids, offset = {}, 0
+            for target, route_examples in examples.items():
+                route_vectors = [_normalize(v) for v in vectors[offset:offset + len(route_examples)]]
+                offset += len(route_examples)
+                centroids[target] = _normalize([sum(col) / len(route_vectors) for col in zip(*route_vectors)])
+            self._centroids = centroids
+            logger.info(f"Fast intent centroids cached for {len(centroids)} routes")
+        return self._centroids
+
+    async def classify_embedding(self, text: str) -> Optional[FastDecision]:
+        """Tier 2: nearest centroid over example embeddings"""
+        if self.embeddings is None:
+            return None
+        centroids = await self._get_centroids()
+        query = _normalize(await self.embeddings.aembed_query(text))
+        scored: List[Tuple[float, str]] = sorted(
+            ((_dot(query, centroid), target) for target, centroid in centroids.items()),
+            reverse=True,
+        )
+        best_score, best_target = scored[0]
+        runner_up = scored[1][0] if len(scored) > 1 else 0.0
+        metrics.observe("embedding_similarity", best_score)
+        if best_score < MIN_SIMILARITY or best_score - runner_up < MIN_MARGIN:
+            return None
+        return FastDecision(best_target, best_score, "embedding")
+
+    async def classify(self, text: str, state: State) -> Optional[FastDecision]:
+        """
+        Classify a message locally.
+
+        Returns:
+            The decision, or None when the LLM router should decide.
+        """
+        metrics.incr("total")
+        decision = self.classify_rules(text, state)
+        if decision is None or decision.confidence < MIN_CONFIDENCE:
+            if state.get("current_workflow"):
+                # A step answer ("Riyadh to Jeddah tomorrow") can sit close to another
+                # route's examples; only the LLM router sees the workflow and step
+                metrics.incr("escalated_in_workflow")
+                decision = None
+            else:
+                try:
+                    decision = await self.classify_embedding(text)
+                except Exception as e:
+                    logger.warning(f"Fast intent embedding tier failed: {e}")
+                    metrics.incr("embedding_errors")
+                    decision = None
+
+        if decision is None:
+            metrics.incr("escalated")
+            return None
+
+        # A rule for the workflow already in progress means the user is continuing it
+        if decision.target == state.get("current_workflow"):
+            decision.target = "agent"
+
+        metrics.incr("decided")
+        metrics.incr(f"decided_{decision.tier}")
+        return decision
+
+
+def make_fast_classifier() -> FastIntentClassifier:
+    """Create the classifier with the embedding tier when it is available"""
+    embeddings = None
+    if USE_EMBEDDINGS:
+        try:
+            from app.core.chatbot.configuration import IndexConfiguration
+            from app.core.chatbot.retrieval import get_text_encoder
+
+            embeddings = get_text_encoder(IndexConfiguration().embedding_model)
+        except Exception as e:
+            logger.warning(f"Fast intent embedding tier disabled: {e}")
+    return FastIntentClassifier(embeddings)
+
+
+async def evaluate(path: str, with_llm: bool = False) -> Dict[str, float]:
+    """
+    Evaluate the fast path over a labelled utterance file.
+
+    Returns:
+        Coverage (share of LLM calls saved), fast-path accuracy on the decided
+        utterances and, with the LLM router, overall accuracy.
+    """
+    from langchain_core.messages import HumanMessage
+
+    with open(path, "r", encoding="utf-8") as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+
+    classifier = make_fast_classifier()
+    router = None
+    if with_llm:
+        from app.core.chatbot.llm_manager import LLMManager
+        from app.core.chatbot.router import IntentRouter
+
+        router = IntentRouter(LLMManager.from_settings({
+            "provider": os.environ["LLM_PROVIDER"],
+            "model": os.environ["LLM_MODEL"],
+            "config": {
+                "temperature": os.environ["LLM_TEMPERATURE"]
+            }
+        }))
+
+    decided = correct_fast = correct_total = 0
+    for sample in samples:
+        state = State(messages=[HumanMessage(content=sample["text"])], language="en-US")
+        if sample.get("workflow"):
+            state["current_workflow"] = sample["workflow"]
+            state["workflow_data"] = {sample["workflow"]: {"current_step": sample.get("step"), "collected_data": {}}}
+
+        decision = await classifier.classify(sample["text"], state)
+        if decision is not None:
+            decided += 1
+            correct_fast += decision.target == sample["label"]
+            correct_total += decision.target == sample["label"]
+        elif router is not None:
+            route = await router.fused_route(state, sample["text"]) if router.mode == "fused" \
+                else await router.legacy_route(state, sample["text"])
+            correct_total += route["target"] == sample["label"]
+
+    report = {
+        "samples": len(samples),
+        "llm_call_savings": decided / len(samples) if samples else 0.0,
+        "fast_path_accuracy": correct_fast / decided if decided else 0.0,
+    }
+    if with_llm:
+        report["overall_accuracy"] = correct_total / len(samples) if samples else 0.0
+    return report
+
+
+def main():
+    import sys
+    import asyncio
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    paths = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    report = asyncio.run(evaluate(paths[0] if paths else str(DEFAULT_LABELLED), with_llm="--with-llm" in sys.argv))
+    for key, value in report.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
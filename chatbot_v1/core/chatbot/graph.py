@@ -4,16 +4,14 @@ This module implements a simple graph with two structured tools using LangGraph.
 """
 
 import os
-import json
 import logging
 
 from langgraph.graph import START, END,  StateGraph
-from langchain_core.messages import ToolMessage, SystemMessage, AIMessage, HumanMessage
+from langchain_core.messages import ToolMessage, SystemMessage, AIMessage
 from langgraph.prebuilt import ToolNode, tools_condition, create_react_agent, InjectedState
 from langchain_core.messages.modifier import RemoveMessage # use to remove message from state
 from langgraph.pregel.retry import RetryPolicy
 from langchain_core.tools import Tool, tool
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.checkpoint.redis.aio import AsyncRedisSaver
 from langgraph.checkpoint.redis import RedisSaver
 from app.core.chatbot.utils.redis_client import get_redis_client
@@ -24,18 +22,20 @@ from langsmith import traceable
 
 from app.core.chatbot.prompts import FAQ_PROMPT, \
     CONFIRMATION_CLASSIFICATION_PROMPT, \
-    INTENT_CLASSIFICATION_PROMPT, \
     WELCOME_PROMPT, \
     LANGUAGE_RULES, \
-    SYSTEM_PROMPT, \
-    TRANSLATION_PROMPT
+    SYSTEM_PROMPT
 from app.core.chatbot.state import State
 from app.core.chatbot.tools import search_docs
-from app.core.chatbot.utils.prompt import get_formatted_prompt
+from app.core.chatbot.utils.prompt import get_formatted_prompt, make_dynamic_prompt
 from app.core.chatbot.workflow_manager import workflow_manager, WorkflowStep
 from app.core.chatbot.tools.flight_booking.tools import *
 from app.core.chatbot.llm_manager import LLMManager
 from app.core.chatbot.utils.messages import clean_messages, remove_thinking_tags
+from app.core.chatbot.router import IntentRouter, FAST_INTENT_ENABLED, ROUTE_CACHE_ENABLED
+from app.core.chatbot.route_cache import RouteCache
+from app.core.chatbot.fast_intent import make_fast_classifier
+from app.core.chatbot.history import make_history_hook, prune_summarized_messages
 from app.core.chatbot.tools.baggage_tracking.tools import register_tools as baggage_tracking_tools
 from app.core.chatbot.tools.flight_booking.tools import register_tools as flight_booking_tools
 from app.core.chatbot.tools.sample_wf.tools import register_tools as sample_wf_tools
@@ -65,91 +65,29 @@ async def graph(saver: BaseCheckpointSaver):
     }
 
     
-    async def classify_intention_condition(state: State):
-        """Classify user intention with workflow detection"""
-        
-        logger.info("condition: classify_intention_condition")
-        
-        # Get last user message with proper type checking
-        last_msg = next(
-            (msg for msg in reversed(state.get("messages", [])) 
-             if isinstance(msg, HumanMessage)),
-            None
-        )
-        
-        # Handle empty conversation state
-        if not state.get("messages"):
-            return "welcome"  
+    router = IntentRouter(
+        llm,
+        fast_classifier=make_fast_classifier() if FAST_INTENT_ENABLED else None,
+        cache=RouteCache() if ROUTE_CACHE_ENABLED else None
+    )
 
-        # Safely extract content with fallback
-        last_msg_content = getattr(last_msg, "content", str(last_msg))
-        
-        # Translate the message for classification purposes
-        translation_prompt = TRANSLATION_PROMPT.format(message=last_msg_content)
-        
-        translation_response = await llm.ainvoke([SystemMessage(content=translation_prompt)])
-        translated_content = translation_response.content.strip()
-        
-        workflow_name = state.get("current_workflow")
-        workflow_state = state.get("workflow_data", {}).get(workflow_name, {})
-        current_step = workflow_state.get("current_step")
-        collected_data = workflow_state.get("collected_data", {}).copy()  
+    async def router_node(state: State):
+        """Classify user intention with workflow detection"""
         
-        # Build context-aware prompt using translated content for classification
-        workflow_context = (
-            f"Current Workflow: {workflow_name}\n"
-            f"Current Step: {current_step}\n"
-            f"Collected Data: {json.dumps(collected_data, indent=2)}"
-        ) if current_step else "No active workflow"
+        logger.info("node: router_node")
         
-        workflow_descriptions = workflow_manager.workflow_descriptions
-        prompt = get_formatted_prompt(
-            state,
-            INTENT_CLASSIFICATION_PROMPT,
-            [],
-            {
-                "workflows": workflow_descriptions,
-                "last_msg": translated_content.replace("{", "{{").replace("}", "}}"),
-                "workflow_context": workflow_context,
-                "recent_messages": "\n".join([
-                    getattr(m, "content", str(m)) 
-                    for m in state.get("messages", [])[-3:]
-                ])
-            }
-        )
+        # Messages folded into the history summary last turn are dropped from the state
+        return {"route": await router.route(state), "messages": prune_summarized_messages(state)}
 
-        response = await llm.ainvoke([SystemMessage(content=prompt)])
-        intention = response.content.strip().lower()
-        logger.info(f"Classified intention: {intention}")
-        logger.debug(f"Original message: {last_msg_content}")
-        logger.debug(f"Translated message (for classification): {translated_content}")
-        
-        # Return routing decision without modifying state
-        if "start_workflow" in intention.lower():
-            workflow_name = intention.split("/")[-1]
-            if workflow_name in workflow_manager.workflows:
-                return workflow_name
-        # elif intention == "human":
-        #     return "human_help"
-        elif intention == "faq":
-            return "faq"
-        else:
-            return "agent"
+    def route_condition(state: State):
+        """Send the turn to the node picked by the router"""
+        return (state.get("route") or {}).get("target", "agent")
         
     async def welcome_node(state: State):
         """Handle initial welcome interaction"""
         
         logger.info("node: welcome_node")
         
-        llm = LLMManager.from_settings({
-            "provider": os.environ["LLM_PROVIDER"],
-            "model": os.environ["LLM_MODEL"],
-            "config": {
-                "temperature": os.environ["LLM_TEMPERATURE"]
-            }
-        })
-
-        
         if not state.get("messages"):
             response = await llm.ainvoke([
                 SystemMessage(content=get_formatted_prompt(state, WELCOME_PROMPT)),
@@ -193,6 +131,68 @@ async def graph(saver: BaseCheckpointSaver):
     #     }
 
 
+    def resolve_step_tools(workflow_name: str, step: WorkflowStep):
+        """Resolve a step's tool names against the registry, None if any is missing"""
+        agent_tools = []
+        tool_registry = workflow_manager.tool_registry
+        
+        for tool_name in step.tools:
+            # First try the tool name as is (should already be scoped)
+            if tool_name in tool_registry:
+                agent_tools.append(tool_registry[tool_name])
+                continue
+                
+            # If not found and not already prefixed, try with workflow prefix
+            if not tool_name.startswith(f"{workflow_name}."):
+                scoped_tool_name = f"{workflow_name}.{tool_name}"
+                if scoped_tool_name in tool_registry:
+                    agent_tools.append(tool_registry[scoped_tool_name])
+                    continue
+            
+            logger.warning(f"Tool '{tool_name}' not found in tool registry")
+            return None
+        return agent_tools
+
+    # Bound tool schemas are cached per tool set, so steps sharing tools share one binding
+    bound_llms = {}
+
+    def bind_tools_cached(agent_tools: list):
+        key = tuple(t.name for t in agent_tools)
+        if key not in bound_llms:
+            bound_llms[key] = llm.bind_tools(agent_tools) if agent_tools else llm
+        return bound_llms[key]
+
+    def step_prompt(workflow, step_name: str):
+        return make_dynamic_prompt(
+            lambda state: workflow.build_workflow_prompt(state, step_name, workflow.name)
+        )
+
+    # Compile every agent once; the per-turn system prompt is rendered by the prompt callable
+    # and the history hook limits the messages to a token-budgeted window plus a summary
+    history_hook = make_history_hook(llm)
+    default_agent = create_react_agent(
+        llm,
+        [],
+        prompt=make_dynamic_prompt(lambda state: get_formatted_prompt(state, SYSTEM_PROMPT)),
+        pre_model_hook=history_hook,
+        state_schema=State
+    )
+    
+    step_agents = {}
+    for wf in workflow_manager.workflows.values():
+        for step_name, step in wf.steps.items():
+            agent_tools = resolve_step_tools(wf.name, step)
+            if agent_tools is None:
+                continue
+            step_agents[(wf.name, step_name)] = create_react_agent(
+                bind_tools_cached(agent_tools),
+                agent_tools,
+                prompt=step_prompt(wf, step_name),
+                pre_model_hook=history_hook,
+                state_schema=State
+            )
+    logger.info(f"Compiled {len(step_agents)} workflow step agents")
+
     async def agent_node(state: State):                
         """
         Process user input using the appropriate agent based on workflow context.
@@ -210,50 +210,23 @@ async def graph(saver: BaseCheckpointSaver):
         
         # Handle user talking about anything else not related to a workflow
         if not workflow_name:
-            agent = create_react_agent(
-                llm,
-                [],
-                prompt=get_formatted_prompt(state, SYSTEM_PROMPT),
-                state_schema=State
-            )
-            response = await agent.ainvoke(state)
+            response = await default_agent.ainvoke(state)
             cleaned_messages = clean_messages(response["messages"])
             response["messages"] = cleaned_messages
             return response
 
         workflow_state = state.get("workflow_data", {}).get(workflow_name, {})
         current_step = workflow_state.get("current_step")
-        collected_data = workflow_state.get("collected_data", {}).copy()  
         workflow = workflow_manager.get_workflow(workflow_name)
         
         if current_step not in workflow.steps:
             logger.warning(f"Step {current_step} not found in workflow {workflow_name}")
             return state
-        else:
-            step = workflow.steps[current_step]
 
-        # Enforce step-specific tool restrictions
-        allowed_tools = step.tools
-        
-        # Build the list of tools based on allowed_tools
-        agent_tools = []
-        tool_registry = workflow_manager.tool_registry
-        
-        for tool_name in allowed_tools:
-            # First try the tool name as is (should already be scoped)
-            if tool_name in tool_registry:
-                agent_tools.append(tool_registry[tool_name])
-                continue
-                
-            # If not found and not already prefixed, try with workflow prefix
-            if not tool_name.startswith(f"{workflow_name}."):
-                scoped_tool_name = f"{workflow_name}.{tool_name}"
-                if scoped_tool_name in tool_registry:
-                    agent_tools.append(tool_registry[scoped_tool_name])
-                    continue
-            
-            # If we get here, the tool wasn't found
-            logger.warning(f"Tool '{tool_name}' not found in tool registry")
+        # Agent restricted to the step's tools, compiled at graph build time
+        agent = step_agents.get((workflow_name, current_step))
+        if agent is None:
+            logger.warning(f"No agent compiled for step {current_step} in workflow {workflow_name}")
             error_message = ToolMessage(
                 content="An error occurred while processing your request. Please try again later.",
                 tool_call_id=None,
@@ -261,18 +234,6 @@ async def graph(saver: BaseCheckpointSaver):
             )
             state["messages"].append(error_message)
             return state
-            
-        # Create and execute agent with restricted tools
-        prompt = workflow.build_workflow_prompt(state, current_step, workflow_name)
-        
-        has_tools = len(agent_tools) > 0
-        llm_with_tools = llm.bind_tools(agent_tools) if has_tools else llm
-        agent = create_react_agent(
-            llm_with_tools,
-            agent_tools if has_tools else [],
-            prompt=prompt,
-            state_schema=State
-        )
         
         response = await agent.ainvoke(state)
 
@@ -291,22 +252,24 @@ async def graph(saver: BaseCheckpointSaver):
     builder = StateGraph(State)
 
     # Add FAQ graph
-    faq_graph = await build_faq_graph(llm, saver)
+    faq_graph = await build_faq_graph(llm, saver, pre_model_hook=history_hook)
     builder.add_node("faq", faq_graph)
     
     # Add nodes
     builder.add_node("agent", agent_node, retry=RetryPolicy(max_attempts=3))
     builder.add_node("check_step", check_step_node)
     builder.add_node("welcome", welcome_node)
+    builder.add_node("router", router_node)
     for wf in workflow_manager.workflows.values():
         builder.add_node(wf.name, wf.init_workflow_node)
     
 
     workflows_keys = workflow_manager.workflow_names
     # Update initial edges
+    builder.add_edge(START, "router")
     builder.add_conditional_edges(
-        START,
-        classify_intention_condition,
+        "router",
+        route_condition,
         {
             **{wf: wf for wf in workflows_keys},
             # "human_help": "human_help",
@@ -332,11 +295,6 @@ async def graph(saver: BaseCheckpointSaver):
 
     logger.info(f"Graph built with {len(workflows_keys)} workflows")
     
-    # redis saver
+    # checkpointer is selected by the runtime (CHECKPOINTER=redis|sqlite|memory)
     graph = builder.compile(checkpointer=saver)    
-    return graph
-    
-    # memory saver
-    # checkpointer = MemorySaver()            
-    # graph = builder.compile(checkpointer=checkpointer)    
-    # return graph
\ No newline at end of file
+    return graph
\ No newline at end of file
@@ -0,0 +1,173 @@
+"""Token-budgeted history windowing with a rolling summary.
+
+``make_history_hook`` returns a ``pre_model_hook`` for ``create_react_agent``.
+The model sees only the most recent turns that fit the turn and token budget;
+older turns are folded into ``State.history_summary``. The summary is extended
+incrementally: ``history_summary_cursor`` records the last message already
+folded in, so only newly evicted messages are summarized. Folded messages are
+then pruned from the state by ``prune_summarized_messages`` on the next turn,
+which keeps prompts and checkpoints flat for long conversations.
+"""
+
+import os
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.messages.modifier import RemoveMessage
+from langgraph.constants import TAG_NOSTREAM
+
+from app.core.chatbot.prompts import HISTORY_SUMMARY_PROMPT
+from app.core.chatbot.state import State
+from app.core.chatbot.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "6"))
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "3000"))
+HISTORY_SUMMARY_ENABLED = os.getenv("HISTORY_SUMMARY_ENABLED", "true") == "true"
+HISTORY_PRUNE_STATE = os.getenv("HISTORY_PRUNE_STATE", "true") == "true"
+# Tool payloads from earlier turns are cut to this many characters
+TOOL_MESSAGE_MAX_CHARS = int(os.getenv("HISTORY_TOOL_MESSAGE_MAX_CHARS", "1500"))
+
+metrics = get_metrics("history")
+
+
+def approximate_tokens(message: BaseMessage) -> int:
+    """Rough token count (about 4 characters per token)"""
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+    size = len(content)
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        size += len(json.dumps(tool_call.get("args", {}))) + len(tool_call.get("name", ""))
+    return size // 4 + 4
+
+
+def split_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """Group messages into turns, each starting at a human message"""
+    turns: List[List[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _shrink_tool_message(message: BaseMessage) -> BaseMessage:
+    if isinstance(message, ToolMessage) and isinstance(message.content, str) \
+            and len(message.content) > TOOL_MESSAGE_MAX_CHARS:
+        return message.model_copy(update={"content": message.content[:TOOL_MESSAGE_MAX_CHARS] + " ...[truncated]"})
+    return message
+
+
+def select_window(
+    messages: List[BaseMessage],
+    max_turns: int = HISTORY_MAX_TURNS,
+    max_tokens: int = HISTORY_MAX_TOKENS
+) -> int:
+    """
+    Pick the start of the verbatim window.
+
+    The current (last) turn is always kept whole; earlier turns are added
+    newest first while they fit both budgets, so tool calls are never split
+    from their results.
+
+    Returns:
+        Index in messages where the window starts.
+    """
+    turns = split_turns(messages)
+    if not turns:
+        return 0
+
+    start = len(messages) - len(turns[-1])
+    tokens = sum(approximate_tokens(m) for m in turns[-1])
+    kept = 1
+    for turn in reversed(turns[:-1]):
+        turn_tokens = sum(approximate_tokens(_shrink_tool_message(m)) for m in turn)
+        if kept >= max_turns or tokens + turn_tokens > max_tokens:
+            break
+        tokens += turn_tokens
+        kept += 1
+        start -= len(turn)
+    return start
+
+
+def _format_for_summary(messages: List[BaseMessage]) -> str:
+    lines = []
+    for message in messages:
+        content = _shrink_tool_message(message).content
+        if not isinstance(content, str):
+            content = json.dumps(content)
+        if content.strip():
+            lines.append(f"{message.type}: {content}")
+    return "\n".join(lines)
+
+
+def _unsummarized_start(messages: List[BaseMessage], cursor: Optional[str]) -> int:
+    """Index of the first message not yet folded into the summary"""
+    if cursor is None:
+        return 0
+    for index, message in enumerate(messages):
+        if message.id == cursor:
+            return index + 1
+    # The cursor message was already pruned from the state
+    return 0
+
+
+def make_history_hook(llm: BaseChatModel):
+    """Create the pre_model_hook used by the ReAct agents"""
+    summary_llm = llm.with_config(tags=[TAG_NOSTREAM])
+
+    async def history_hook(state: State) -> Dict[str, Any]:
+        messages = list(state["messages"])
+        summary = state.get("history_summary")
+        cursor = state.get("history_summary_cursor")
+        window_start = select_window(messages)
+        update: Dict[str, Any] = {}
+
+        evicted = messages[_unsummarized_start(messages, cursor):window_start]
+        if evicted and HISTORY_SUMMARY_ENABLED:
+            prompt = HISTORY_SUMMARY_PROMPT.format(
+                summary=summary or "(none)",
+                messages=_format_for_summary(evicted)
+            )
+            try:
+                response = await summary_llm.ainvoke([SystemMessage(content=prompt)])
+                summary = response.content.strip()
+                update["history_summary"] = summary
+                update["history_summary_cursor"] = evicted[-1].id
+                metrics.incr("summaries")
+                metrics.incr("summarized_messages", len(evicted))
+            except Exception as e:
+                # Keep the previous summary; the evicted messages are retried next time
+                logger.warning(f"History summarization failed: {e}")
+                metrics.incr("summary_errors")
+
+        # Tool results of the current turn stay whole, earlier ones are shrunk
+        turns = split_turns(messages)
+        current_turn_start = len(messages) - len(turns[-1]) if turns else 0
+        window = [
+            m if index >= current_turn_start else _shrink_tool_message(m)
+            for index, m in enumerate(messages[window_start:], start=window_start)
+        ]
+        llm_input = ([SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")] if summary else []) + window
+
+        metrics.observe("window_tokens", sum(approximate_tokens(m) for m in window))
+        metrics.observe("dropped_messages", window_start)
+        update["llm_input_messages"] = llm_input
+        return update
+
+    return history_hook
+
+
+def prune_summarized_messages(state: State) -> List[RemoveMessage]:
+    """Remove messages already folded into the summary from the state"""
+    cursor = state.get("history_summary_cursor")
+    if not HISTORY_PRUNE_STATE or not cursor:
+        return []
+    messages = state.get("messages", [])
+    end = _unsummarized_start(messages, cursor)
+    if end:
+        metrics.incr("pruned_messages", end)
+    return [RemoveMessage(id=m.id) for m in messages[:end]]
@@ -1,7 +1,7 @@
 
 from app.core.chatbot.tools import search_docs
 from app.core.chatbot.state import State
-from app.core.chatbot.utils.prompt import get_formatted_prompt
+from app.core.chatbot.utils.prompt import get_formatted_prompt, make_dynamic_prompt
 from app.core.chatbot.llm_manager import LLMManager
 from app.core.chatbot.utils.messages import clean_messages
 from langgraph.prebuilt import create_react_agent, ToolNode, tools_condition
@@ -9,12 +9,24 @@ from langgraph.graph import END
 from langgraph.graph import StateGraph
 from langgraph.checkpoint.base import BaseCheckpointSaver
 from app.core.chatbot.prompts import FAQ_PROMPT
+from app.core.chatbot.answer_cache import make_faq_answer_cache
+from langchain_core.messages import AIMessage
 
 
-async def faq_graph(llm: LLMManager, checkpointer: BaseCheckpointSaver):
+async def faq_graph(llm: LLMManager, checkpointer: BaseCheckpointSaver, pre_model_hook=None):
   
   faq_tools = [search_docs]
   faq_llm = llm.bind_tools(faq_tools)
+  
+  # Compiled once; the system prompt is rendered from the state on each turn
+  faq_agent = create_react_agent(
+      faq_llm,
+      faq_tools,
+      prompt=make_dynamic_prompt(lambda state: get_formatted_prompt(state, FAQ_PROMPT, faq_tools)),
+      pre_model_hook=pre_model_hook,
+      state_schema=State
+  )
+  answer_cache = make_faq_answer_cache()
 
   async def faq_node(state: State):
       """
@@ -28,12 +40,12 @@ async def faq_graph(llm: LLMManager, checkpointer: BaseCheckpointSaver):
       """
       print("node: faq_node")
       
-      formatted_system_prompt = get_formatted_prompt(state, FAQ_PROMPT, faq_tools)        
-      faq_agent = create_react_agent(
-          faq_llm,
-          faq_tools,
-          prompt=formatted_system_prompt
-      )
+      cache_key = None
+      if answer_cache is not None:
+          # Same question answered recently from the same knowledge base: no LLM call
+          answer, cache_key = await answer_cache.lookup(state)
+          if answer is not None:
+              return {"messages": [AIMessage(content=answer)]}
       
       response = await faq_agent.ainvoke(state)
       
@@ -41,6 +53,9 @@ async def faq_graph(llm: LLMManager, checkpointer: BaseCheckpointSaver):
       cleaned_messages = clean_messages(response["messages"])
       response["messages"] = cleaned_messages
       
+      if answer_cache is not None:
+          answer_cache.store(cache_key, cleaned_messages, state["messages"])
+      
       return response
 
 
@@ -0,0 +1,96 @@
+"""BM25 lexical index over the knowledge base chunks.
+
+Bundle codes (LIT1, PCAI), product names and exact policy terms are matched
+poorly by embedding similarity alone, and lexical search costs no remote
+call. The index is built from the FAISS docstore when the retriever registry
+loads an index version, so both always describe the same chunks, and it is
+swapped together with the vectors.
+
+``reciprocal_rank_fusion`` merges ranked result lists (lexical and vector)
+by ``sum(1 / (RRF_K + rank))``, which needs no score calibration between them.
+"""
+
+import os
+import re
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Words in any script (Latin, Arabic), codes such as LIT1 and weights such as 1x20
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or "").casefold())
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed set of documents"""
+
+    def __init__(self, documents: Sequence[Tuple[str, Document]], k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.ids = [doc_id for doc_id, _ in documents]
+        self.documents = [doc for _, doc in documents]
+        self._term_freqs: List[Counter] = []
+        self._lengths: List[int] = []
+        # term -> documents containing it, so a query only scores candidate documents
+        self._postings: Dict[str, List[int]] = {}
+        for position, doc in enumerate(self.documents):
+            terms = Counter(tokenize(doc.page_content))
+            self._term_freqs.append(terms)
+            self._lengths.append(sum(terms.values()))
+            for term in terms:
+                self._postings.setdefault(term, []).append(position)
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        total = len(self.documents)
+        self._idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    @classmethod
+    def from_docstore(cls, vstore) -> "BM25Index":
+        """Index the chunks of a FAISS vector store, in FAISS order"""
+        documents = []
+        for doc_id in vstore.index_to_docstore_id.values():
+            doc = vstore.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                documents.append((doc_id, doc))
+        return cls(documents)
+
+    def search(self, query: str, k: int) -> List[Tuple[str, Document, float]]:
+        """Top ``k`` documents by BM25 score, best first; documents sharing no term are left out"""
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf[term]
+            for position in postings:
+                freq = self._term_freqs[position][term]
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[position] / self._avg_length)
+                scores[position] = scores.get(position, 0.0) + idf * freq * (self.k1 + 1) / (freq + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.ids[position], self.documents[position], score) for position, score in ranked]
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[Tuple[str, Document]]], k: int, rrf_k: int = RRF_K) -> List[Document]:
+    """Merge ranked (id, document) lists into the top ``k`` documents"""
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, (doc_id, doc) in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(doc_id, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[doc_id] for doc_id in ranked]
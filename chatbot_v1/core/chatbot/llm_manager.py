@@ -1,11 +1,24 @@
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Tuple
 from langchain_core.language_models import BaseChatModel
 from langchain_openai import AzureChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_ollama import ChatOllama
 from langchain_groq import ChatGroq
+import httpx
 
 import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Keep-alive pool shared by every HTTP based LLM client
+HTTP_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20")),
+    keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60")),
+)
+HTTP_TIMEOUT = httpx.Timeout(float(os.getenv("LLM_HTTP_TIMEOUT", "60")), connect=10.0)
 
 class LLMConfig:
     def __init__(self, provider: str, model: str, config: Dict[str, Any]):
@@ -13,17 +26,52 @@ class LLMConfig:
         self.model = model
         self.config = config
 
+    @property
+    def key(self) -> Tuple[str, str, Tuple[Tuple[str, Any], ...]]:
+        """Registry key: provider, model and the normalized config"""
+        return (self.provider, self.model, tuple(sorted(
+            (name, _normalize_value(value)) for name, value in self.config.items()
+        )))
+
+def _normalize_value(value: Any) -> Any:
+    """Normalize config values so "0.5" and 0.5 map to the same client"""
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return value.strip()
+    if isinstance(value, (dict, list)):
+        return repr(value)
+    return value
+
 class LLMManager:
+    _registry: Dict[Tuple, BaseChatModel] = {}
+    _registry_lock = threading.Lock()
+    _http_client: Optional[httpx.Client] = None
+    _http_async_client: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def _http_clients(cls) -> Tuple[httpx.Client, httpx.AsyncClient]:
+        """Shared keep-alive HTTP clients, created on first use"""
+        if cls._http_client is None:
+            cls._http_client = httpx.Client(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+        if cls._http_async_client is None:
+            cls._http_async_client = httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+        return cls._http_client, cls._http_async_client
+
     @staticmethod
     def get_llm(config: LLMConfig) -> BaseChatModel:
         """Factory method to create LLM instances"""
         if config.provider == "azure":
+            http_client, http_async_client = LLMManager._http_clients()
             return AzureChatOpenAI(
                 model_name=config.model,
                 azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
                 openai_api_key=os.getenv("AZURE_OPENAI_API_KEY"),
                 openai_api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
                 deployment_name=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
+                http_client=http_client,
+                http_async_client=http_async_client,
                 **config.config
             )
         elif config.provider == "google":
@@ -36,23 +84,53 @@ class LLMManager:
             return ChatOllama(
                 model=config.model,
                 base_url=os.getenv("OLLAMA_BASE_URL"),
+                client_kwargs={"limits": HTTP_LIMITS, "timeout": HTTP_TIMEOUT},
                 **config.config
             )
         elif config.provider == "groq":
+            http_client, http_async_client = LLMManager._http_clients()
             return ChatGroq(
                 model_name=config.model,
                 groq_api_key=os.getenv("GROQ_API_KEY"),
+                http_client=http_client,
+                http_async_client=http_async_client,
                 **config.config
             )
         else:
             raise ValueError(f"Unsupported LLM provider: {config.provider}")
 
+    @classmethod
+    def get_shared(cls, config: LLMConfig) -> BaseChatModel:
+        """Return the long-lived client for this config, creating it once"""
+        key = config.key
+        llm = cls._registry.get(key)
+        if llm is None:
+            with cls._registry_lock:
+                llm = cls._registry.get(key)
+                if llm is None:
+                    llm = cls.get_llm(config)
+                    cls._registry[key] = llm
+                    logger.info(f"Created LLM client: {config.provider}/{config.model}")
+        return llm
+
     @staticmethod
     def from_settings(settings: Dict[str, Any]) -> BaseChatModel:
-        """Create LLM instance from settings dictionary"""
+        """Get the shared LLM instance for a settings dictionary"""
         config = LLMConfig(
             provider=settings["provider"],
             model=settings["model"],
             config=settings["config"]
         )
-        return LLMManager.get_llm(config) 
\ No newline at end of file
+        return LLMManager.get_shared(config)
+
+    @classmethod
+    async def aclose(cls) -> None:
+        """Drop all registered clients and close the shared HTTP pools"""
+        with cls._registry_lock:
+            cls._registry.clear()
+            http_client, cls._http_client = cls._http_client, None
+            http_async_client, cls._http_async_client = cls._http_async_client, None
+        if http_client is not None:
+            http_client.close()
+        if http_async_client is not None:
+            await http_async_client.aclose()
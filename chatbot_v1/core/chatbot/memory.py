@@ -1,15 +1,24 @@
 import os
+import time
+import asyncio
 from typing import Dict, Any, Optional
 from datetime import datetime, timedelta
-import json
 import logging
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
-from app.core.chatbot.utils.redis_client import get_redis_client
+from app.core.chatbot.utils.codec import get_codec
+from app.core.chatbot.utils.redis_client import get_async_redis_client
 
 # Constants
 CONVERSATION_TTL = 60 * 60 * 24  # 24 hours in seconds
 CONVERSATION_PREFIX = "conv:"
 ENTITY_PREFIX = "entity:"
+# Sorted set of conversation IDs scored by last activity (unix time). Kept
+# outside the "conv:" prefix so it never matches conversation key patterns.
+CONVERSATION_INDEX_KEY = "conv_index:activity"
+CLEANUP_BATCH_SIZE = int(os.getenv("CONVERSATION_CLEANUP_BATCH_SIZE", "500"))
+CLEANUP_INTERVAL = int(os.getenv("CONVERSATION_CLEANUP_INTERVAL", "600"))
+
+logger = logging.getLogger(__name__)
 
 class ChatMemory:
     def __init__(self):
@@ -58,16 +67,18 @@ class ChatMemory:
 
     async def load_conversation_state(self, conversation_id: str) -> Optional[Dict[str, Any]]:
         """Load the conversation state for a given conversation ID."""
-        REDIS_CLIENT = get_redis_client()
+        redis_client = get_async_redis_client()
         conv_key = self._get_conversation_key(conversation_id)
         entity_key = self._get_entity_key(conversation_id)
         
-        # Get conversation history
-        conv_data = REDIS_CLIENT.get(conv_key)
+        # Conversation history and entity memory in one round trip
+        conv_data, entity_data = await redis_client.mget(conv_key, entity_key)
         if not conv_data:
             return None
         
-        conv_state = json.loads(conv_data)
+        # Versioned binary encoding; values saved as plain JSON still decode
+        codec = get_codec()
+        conv_state = codec.decode(conv_data)
         
         # Deserialize messages
         if "messages" in conv_state:
@@ -75,16 +86,14 @@ class ChatMemory:
                 self._deserialize_message(msg) for msg in conv_state["messages"]
             ]
         
-        # Get entity memory
-        entity_data = REDIS_CLIENT.get(entity_key)
         if entity_data:
-            conv_state["entities"] = json.loads(entity_data)
+            conv_state["entities"] = codec.decode(entity_data)
             
         return conv_state
 
     async def save_conversation_state(self, conversation_id: str, state: Dict[str, Any]) -> None:
         """Save the conversation state for a given conversation ID."""
-        REDIS_CLIENT = get_redis_client()
+        redis_client = get_async_redis_client()
         conv_key = self._get_conversation_key(conversation_id)
         entity_key = self._get_entity_key(conversation_id)
         
@@ -98,56 +107,126 @@ class ChatMemory:
         # Extract entities if present
         entities = serialized_state.pop("entities", None)
         
-        # Save conversation state
-        REDIS_CLIENT.set(
-            conv_key,
-            json.dumps(serialized_state),
-            ex=CONVERSATION_TTL
-        )
-        
-        # Save entities separately if present
-        if entities:
-            REDIS_CLIENT.setex(
-                entity_key,
-                CONVERSATION_TTL,
-                json.dumps(entities)
-            )
+        codec = get_codec()
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.set(conv_key, codec.encode(serialized_state), ex=CONVERSATION_TTL)
+            # Save entities separately if present
+            if entities:
+                pipe.set(entity_key, codec.encode(entities), ex=CONVERSATION_TTL)
+            pipe.zadd(CONVERSATION_INDEX_KEY, {conversation_id: time.time()})
+            await pipe.execute()
 
     async def clear_conversation_state(self, conversation_id: str) -> None:
         """Remove the conversation state for a given conversation ID."""
-        REDIS_CLIENT = get_redis_client()
-        conv_key = self._get_conversation_key(conversation_id)
-        entity_key = self._get_entity_key(conversation_id)
-        
-        REDIS_CLIENT.delete(conv_key)
-        REDIS_CLIENT.delete(entity_key)
+        redis_client = get_async_redis_client()
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.delete(
+                self._get_conversation_key(conversation_id),
+                self._get_entity_key(conversation_id)
+            )
+            pipe.zrem(CONVERSATION_INDEX_KEY, conversation_id)
+            await pipe.execute()
 
     async def extend_conversation_ttl(self, conversation_id: str) -> None:
         """Extend the TTL of a conversation, typically called after each interaction."""
-        REDIS_CLIENT = get_redis_client()
-        conv_key = self._get_conversation_key(conversation_id)
-        entity_key = self._get_entity_key(conversation_id)
-        
-        REDIS_CLIENT.expire(conv_key, CONVERSATION_TTL)
-        REDIS_CLIENT.expire(entity_key, CONVERSATION_TTL)
-
-    async def get_active_conversations(self) -> list[str]:
-        """Get a list of all active conversation IDs."""
-        REDIS_CLIENT = get_redis_client()
-        pattern = f"{CONVERSATION_PREFIX}*"
-        keys = REDIS_CLIENT.keys(pattern)
-        return [key.decode('utf-8').replace(CONVERSATION_PREFIX, '') for key in keys]
-
-    async def cleanup_expired_conversations(self) -> int:
-        """Clean up expired conversations. Returns number of conversations cleaned up."""
-        REDIS_CLIENT = get_redis_client()
-        active_convs = self.get_active_conversations()
+        redis_client = get_async_redis_client()
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.expire(self._get_conversation_key(conversation_id), CONVERSATION_TTL)
+            pipe.expire(self._get_entity_key(conversation_id), CONVERSATION_TTL)
+            pipe.zadd(CONVERSATION_INDEX_KEY, {conversation_id: time.time()})
+            await pipe.execute()
+
+    async def get_active_conversations(self, offset: int = 0, limit: int = 1000) -> list[str]:
+        """
+        Get a page of active conversation IDs, least recently active first.
+
+        Args:
+            offset: Number of active conversations to skip.
+            limit: Maximum number of IDs to return.
+        """
+        redis_client = get_async_redis_client()
+        ids = await redis_client.zrangebyscore(
+            CONVERSATION_INDEX_KEY,
+            time.time() - CONVERSATION_TTL,
+            "+inf",
+            start=offset,
+            num=limit
+        )
+        return [conv_id.decode("utf-8") for conv_id in ids]
+
+    async def count_active_conversations(self) -> int:
+        """Number of conversations active within the TTL."""
+        redis_client = get_async_redis_client()
+        return await redis_client.zcount(CONVERSATION_INDEX_KEY, time.time() - CONVERSATION_TTL, "+inf")
+
+    async def cleanup_expired_conversations(self, batch_size: int = CLEANUP_BATCH_SIZE) -> int:
+        """Clean up conversations inactive for longer than the TTL. Returns number of conversations cleaned up."""
+        redis_client = get_async_redis_client()
+        cutoff = time.time() - CONVERSATION_TTL
         cleaned = 0
         
-        for conv_id in active_convs:
-            conv_key = self._get_conversation_key(conv_id)
-            if not REDIS_CLIENT.ttl(conv_key):
-                self.clear_conversation_state(conv_id)
-                cleaned += 1
+        while True:
+            expired = await redis_client.zrangebyscore(CONVERSATION_INDEX_KEY, "-inf", cutoff, start=0, num=batch_size)
+            if not expired:
+                break
+            
+            conv_ids = [conv_id.decode("utf-8") for conv_id in expired]
+            async with redis_client.pipeline(transaction=False) as pipe:
+                # Keys normally expired on their own already; DEL is a no-op then
+                pipe.delete(*[
+                    key for conv_id in conv_ids
+                    for key in (self._get_conversation_key(conv_id), self._get_entity_key(conv_id))
+                ])
+                pipe.zrem(CONVERSATION_INDEX_KEY, *conv_ids)
+                await pipe.execute()
+            cleaned += len(conv_ids)
+            
+            if len(conv_ids) < batch_size:
+                break
                 
-        return cleaned 
\ No newline at end of file
+        return cleaned
+
+    async def backfill_index(self, batch_size: int = CLEANUP_BATCH_SIZE) -> int:
+        """One-off: index conversations saved before the activity index existed. Returns number indexed."""
+        redis_client = get_async_redis_client()
+        indexed = 0
+        batch = []
+        
+        async def index_batch(keys):
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.ttl(key)
+                ttls = await pipe.execute()
+            now = time.time()
+            # Last activity is when the TTL was last reset
+            scores = {
+                key.decode("utf-8")[len(CONVERSATION_PREFIX):]: now - (CONVERSATION_TTL - ttl)
+                for key, ttl in zip(keys, ttls) if ttl >= 0
+            }
+            if scores:
+                await redis_client.zadd(CONVERSATION_INDEX_KEY, scores)
+            return len(scores)
+        
+        async for key in redis_client.scan_iter(match=f"{CONVERSATION_PREFIX}*", count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                indexed += await index_batch(batch)
+                batch = []
+        if batch:
+            indexed += await index_batch(batch)
+        return indexed
+
+    async def run_cleanup_loop(self, interval: int = CLEANUP_INTERVAL) -> None:
+        """Background task: periodically drop expired conversations from the index."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                cleaned = await self.cleanup_expired_conversations()
+                if cleaned:
+                    logger.info(f"Cleaned up {cleaned} expired conversations")
+            except Exception as e:
+                logger.warning(f"Conversation cleanup failed: {e}")
+
+
+# Create singleton instance
+chat_memory = ChatMemory()
@@ -210,6 +210,64 @@ Respond with ONLY the translated text, nothing else.
 
 #================================================
 
+HISTORY_SUMMARY_PROMPT = """
+You maintain a running summary of a customer conversation with the flynas virtual assistant.
+
+Extend the existing summary with the new messages below. Keep every fact the assistant may need later:
+the user's requests, names, dates, airports, flight numbers, booking references, claim numbers,
+decisions taken and open questions. Drop greetings and small talk. Write in English, at most 200 words.
+
+Existing summary:
+{summary}
+
+New messages:
+{messages}
+
+Respond with ONLY the updated summary.
+"""
+
+#================================================
+
+ROUTING_PROMPT = """
+Route the user's message in a single step: translate it, classify its intent and pick the workflow.
+
+1. normalized_text - The message translated to English. Keep the same perspective, pronouns,
+   names, locations, codes and numbers. If it is already English, repeat it unchanged.
+
+2. intent - One of:
+   - faq: General questions about policies, services, or information.
+   - human: Requests to speak with a human agent.
+   - start_workflow: A new workflow should begin. Use only if:
+     - The user's message contains baggage claim numbers (e.g., ABC123456) OR
+     - Mentions terms like: baggage status, lost luggage, baggage claim, compensation OR
+     - Clearly asks for something one of the available workflows handles
+   - agent: You are not sure of the user's intent, OR the message appears to be a
+     continuation of the current workflow.
+
+3. workflow - Required when intent is start_workflow. Must be exactly one of the workflow
+   names listed below. Leave empty otherwise.
+
+4. slots - Values the user already gave that the workflow will need (e.g. claim_number,
+   flight_number, flight_date as YYYY-MM-DD, origin, destination as airport codes).
+   Only include values stated in the message.
+
+Available Workflows:
+{workflows}
+
+Current Context:
+{workflow_context}
+
+Recent Messages:
+{recent_messages}
+
+Current Time ({timezone}): {system_time}
+
+User Message:
+{last_msg}
+"""
+
+#================================================
+
 
 def get_formatted_prompt(state: State, base_prompt: str, tools: list = None, extra_context: dict = None) -> str:
     # Add safe workflow data formatting
@@ -1,23 +1,72 @@
 """Manage the configuration of various retrievers.
 
-This module provides functionality to create and manage retrievers for different
-vector store backends, specifically Elasticsearch, Pinecone, and MongoDB.
+This module provides the text encoders and the vector store retrievers used by
+the ``search_docs`` tool and the indexer.
 
-The retrievers support filtering results by user_id to ensure data isolation between users.
+Encoders and indexes are resident for the process lifetime. ``get_text_encoder``
+returns one embedding client per model on the shared keep-alive HTTP pool,
+with repeated queries served from the embedding cache (``embedding_cache``).
+``retriever_registry`` loads each FAISS index once and, when the index on disk
+changes, loads the new version and swaps it in atomically, so a search only
+pays for the query embedding and the vector search.
+
+A new index version is detected from the ``VERSION`` pointer the indexer
+writes (see ``version_dir``), or from the index files' size and modification
+time. The check runs at most every ``FAISS_INDEX_CHECK_INTERVAL`` seconds.
+Searches keep using the current index while its replacement loads; a failed
+load keeps the current index. With ``FAISS_INDEX_MMAP=true`` the vectors are
+memory-mapped instead of read into the heap, so worker processes share them
+through the page cache (falls back to a normal read for index types FAISS
+cannot map).
+
+Searches are hybrid by default (``search_mode``): a BM25 index built from the
+same chunks at load time is fused with the vector results by reciprocal rank,
+which helps bundle codes and exact policy terms. ``lexical`` needs no
+embedding call, and hybrid falls back to it while the embedding provider is
+failing or slow. ``similarity`` is the plain vector search.
 """
 
 import os
+import time
+import pickle
+import logging
+import threading
 from contextlib import contextmanager
-from typing import Generator
+from dataclasses import dataclass
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Generator, List, Optional, Tuple, get_args, get_type_hints
 
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
 from langchain_core.runnables import RunnableConfig
-from langchain_core.vectorstores import VectorStoreRetriever
+from langchain_core.vectorstores import VectorStore
 
 from app.core.chatbot.configuration import IndexConfiguration
+from app.core.chatbot.embedding_cache import EMBEDDING_CACHE, CachedEmbeddings
+from app.core.chatbot.lexical import BM25Index, reciprocal_rank_fusion
+from app.core.chatbot.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+FAISS_INDEX_PATH = os.getenv("FAISS_INDEX_PATH", "app/core/chatbot/kbs/store")
+FAISS_INDEX_MMAP = os.getenv("FAISS_INDEX_MMAP", "false") == "true"
+FAISS_INDEX_CHECK_INTERVAL = float(os.getenv("FAISS_INDEX_CHECK_INTERVAL", "30"))
+DEFAULT_SEARCH_K = 5
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RETRIEVAL_VECTOR_TIMEOUT = float(os.getenv("RETRIEVAL_VECTOR_TIMEOUT", "3"))
+RETRIEVAL_VECTOR_BACKOFF = float(os.getenv("RETRIEVAL_VECTOR_BACKOFF", "30"))
+RETRIEVAL_VECTOR_WORKERS = int(os.getenv("RETRIEVAL_VECTOR_WORKERS", "8"))
+
+metrics = get_metrics("retrieval")
 
 ## Encoder constructors
 
+_encoders: Dict[str, Embeddings] = {}
+_encoders_lock = threading.Lock()
+
 
 def make_text_encoder(model: str) -> Embeddings:
     """Connect to the configured text encoder."""
@@ -25,51 +74,280 @@ def make_text_encoder(model: str) -> Embeddings:
     match provider:
         case "openai":
             from langchain_openai import AzureOpenAIEmbeddings
+            from app.core.chatbot.llm_manager import LLMManager
 
-            return AzureOpenAIEmbeddings(model=model, deployment=os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"])
+            # Same keep-alive pool as the chat models
+            http_client, http_async_client = LLMManager._http_clients()
+            return AzureOpenAIEmbeddings(
+                model=model,
+                deployment=os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"],
+                http_client=http_client,
+                http_async_client=http_async_client,
+            )
         case _:
             raise ValueError(f"Unsupported embedding provider: {provider}")
 
 
+def get_text_encoder(model: str) -> Embeddings:
+    """Process-wide text encoder for a model, created on first use, with the query cache"""
+    encoder = _encoders.get(model)
+    if encoder is None:
+        with _encoders_lock:
+            encoder = _encoders.get(model)
+            if encoder is None:
+                encoder = make_text_encoder(model)
+                if EMBEDDING_CACHE:
+                    encoder = CachedEmbeddings(encoder, model)
+                _encoders[model] = encoder
+    return encoder
+
+
+## Resident indexes
+
+
+@dataclass
+class _LoadedIndex:
+    vstore: VectorStore
+    lexical: BM25Index
+    version: Tuple
+    checked_at: float
+
+
+def index_version(folder: Path) -> Tuple:
+    """Version of the index on disk: the VERSION pointer, or the index files' size and mtime"""
+    version_file = folder / "VERSION"
+    if version_file.exists():
+        return ("version", version_file.read_text().strip())
+    stats = [(folder / name).stat() for name in ("index.faiss", "index.pkl")]
+    return tuple((s.st_size, s.st_mtime_ns) for s in stats)
+
+
+def version_dir(folder: Path, version: Tuple) -> Path:
+    """Directory holding the files of an index version
+
+    The indexer writes every version to its own ``v{N}`` directory and then
+    replaces the ``VERSION`` pointer, so the vectors and the docstore of one
+    version are always read together. Without a pointer the files sit
+    directly in ``folder`` (an index saved by hand with ``save_local``).
+    """
+    if version and version[0] == "version":
+        return folder / f"v{version[1]}"
+    return folder
+
+
+def load_faiss(folder: Path, embedding_model: Embeddings, mmap: bool = FAISS_INDEX_MMAP) -> VectorStore:
+    """FAISS.load_local, optionally memory-mapping the vectors"""
+    from langchain_community.vectorstores import FAISS
+
+    if not mmap:
+        return FAISS.load_local(
+            folder_path=str(folder),
+            embeddings=embedding_model,
+            allow_dangerous_deserialization=True
+        )
+
+    import faiss
+
+    try:
+        index = faiss.read_index(str(folder / "index.faiss"), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError as e:
+        logger.warning(f"FAISS index at {folder} cannot be memory-mapped, reading it instead: {e}")
+        index = faiss.read_index(str(folder / "index.faiss"))
+    # Written by FAISS.save_local; only ever our own build output
+    with open(folder / "index.pkl", "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embedding_model, index, docstore, index_to_docstore_id)
+
+
+class RetrieverRegistry:
+    """Loads each vector store once and hot-swaps it when the index on disk changes"""
+
+    def __init__(self, check_interval: float = FAISS_INDEX_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._indexes: Dict[Tuple[str, str], _LoadedIndex] = {}
+        self._lock = threading.Lock()
+
+    def get_index(self, embedding_model_name: str, folder: str = FAISS_INDEX_PATH) -> _LoadedIndex:
+        """The vector store and lexical index of the current version"""
+        key = (os.path.abspath(folder), embedding_model_name)
+        loaded = self._indexes.get(key)
+        if loaded is not None and time.monotonic() - loaded.checked_at < self.check_interval:
+            metrics.incr("hits")
+            return loaded
+
+        # One thread checks and (re)loads; the others keep searching the current index
+        if loaded is not None and not self._lock.acquire(blocking=False):
+            metrics.incr("hits")
+            return loaded
+        if loaded is None:
+            self._lock.acquire()
+        try:
+            return self._refresh(key, Path(folder), embedding_model_name)
+        finally:
+            self._lock.release()
+
+    def get_vectorstore(self, embedding_model_name: str, folder: str = FAISS_INDEX_PATH) -> VectorStore:
+        return self.get_index(embedding_model_name, folder).vstore
+
+    def _refresh(self, key: Tuple[str, str], folder: Path, embedding_model_name: str) -> _LoadedIndex:
+        loaded = self._indexes.get(key)
+        try:
+            version = index_version(folder)
+        except OSError:
+            if loaded is None:
+                raise
+            logger.warning(f"FAISS index at {folder} is unreadable, keeping the loaded version")
+            version = loaded.version
+
+        if loaded is not None and loaded.version == version:
+            loaded.checked_at = time.monotonic()
+            return loaded
+
+        started = time.perf_counter()
+        try:
+            vstore = load_faiss(version_dir(folder, version), get_text_encoder(embedding_model_name))
+            lexical = BM25Index.from_docstore(vstore)
+        except Exception as e:
+            if loaded is None:
+                raise
+            logger.error(f"Reloading the FAISS index at {folder} failed, keeping the loaded version: {e}")
+            metrics.incr("reload_errors")
+            loaded.checked_at = time.monotonic()
+            return loaded
+
+        # Single reference assignment: searches see either the old or the new index
+        new = self._indexes[key] = _LoadedIndex(vstore, lexical, version, time.monotonic())
+        metrics.incr("loads")
+        metrics.observe("load_ms", (time.perf_counter() - started) * 1000)
+        logger.info(f"FAISS index loaded from {folder} (version {version}, {len(lexical)} chunks)")
+        return new
+
+    def current_version(self, embedding_model_name: str, folder: str = FAISS_INDEX_PATH) -> Tuple:
+        """Version of the index searches use now, loading or refreshing it when due"""
+        return self.get_index(embedding_model_name, folder).version
+
+    def invalidate(self) -> None:
+        """Force a version check on the next search"""
+        for loaded in list(self._indexes.values()):
+            loaded.checked_at = 0.0
+
+
+retriever_registry = RetrieverRegistry()
+
+
+## Hybrid search
+
+_vector_pool = ThreadPoolExecutor(max_workers=RETRIEVAL_VECTOR_WORKERS, thread_name_prefix="vector-search")
+# Until when vector search is skipped after the embedding provider failed or timed out
+_vector_backoff_until = 0.0
+
+
+def reset_vector_backoff() -> None:
+    """Allow vector search again right away (benchmarks, tests)"""
+    global _vector_backoff_until
+    _vector_backoff_until = 0.0
+
+
+def _doc_key(doc: Document) -> str:
+    return doc.id or doc.page_content
+
+
+class HybridRetriever(BaseRetriever):
+    """BM25 and vector search fused by reciprocal rank, or BM25 alone
+
+    In ``hybrid`` mode the vector search gets ``RETRIEVAL_VECTOR_TIMEOUT``
+    seconds. When the embedding call fails or times out, the lexical results
+    are returned and vector search is skipped for ``RETRIEVAL_VECTOR_BACKOFF``
+    seconds, so a slow provider does not stall every FAQ turn. A
+    ``vector_timeout`` of None waits for the vector search however long it takes.
+    """
+
+    vstore: Any
+    lexical: Any
+    mode: str = "hybrid"
+    k: int = DEFAULT_SEARCH_K
+    candidates: int = HYBRID_CANDIDATES
+    search_kwargs: Dict[str, Any] = {}
+    vector_timeout: Optional[float] = RETRIEVAL_VECTOR_TIMEOUT
+
+    def _vector_ranking(self, query: str) -> Optional[List[Tuple[str, Document]]]:
+        global _vector_backoff_until
+        if time.monotonic() < _vector_backoff_until:
+            metrics.incr("vector_skipped")
+            return None
+
+        started = time.perf_counter()
+        future = _vector_pool.submit(self.vstore.similarity_search, query, k=self.candidates, **self.search_kwargs)
+        try:
+            docs = future.result(timeout=self.vector_timeout)
+        except Exception as e:
+            # The call keeps running in the pool; a late embedding still lands in the query cache
+            logger.warning(f"Vector search unavailable, answering from the lexical index: {e!r}")
+            metrics.incr("vector_fallbacks")
+            _vector_backoff_until = time.monotonic() + RETRIEVAL_VECTOR_BACKOFF
+            return None
+        metrics.observe("vector_ms", (time.perf_counter() - started) * 1000)
+        return [(_doc_key(doc), doc) for doc in docs]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        metrics.incr(f"searches_{self.mode}")
+        started = time.perf_counter()
+        lexical = [(_doc_key(doc), doc) for _, doc, _ in self.lexical.search(query, self.candidates)]
+        metrics.observe("lexical_ms", (time.perf_counter() - started) * 1000)
+        if self.mode == "lexical":
+            return [doc for _, doc in lexical[:self.k]]
+
+        vector = self._vector_ranking(query)
+        if vector is None:
+            return [doc for _, doc in lexical[:self.k]]
+        return reciprocal_rank_fusion([vector, lexical], self.k)
+
+
 ## Retriever constructors
 
 @contextmanager
 def make_faiss_retriever(
-    configuration: IndexConfiguration, embedding_model: Embeddings
-) -> Generator[VectorStoreRetriever, None, None]:
+    configuration: IndexConfiguration
+) -> Generator[BaseRetriever, None, None]:
     """Configure this agent to connect to the pre-built FAISS vector store."""
-    from langchain_community.vectorstores import FAISS
-    
-    # Load pre-built FAISS index
-    vstore = FAISS.load_local(
-        folder_path="app/core/chatbot/kbs/store",
-        embeddings=embedding_model,
-        allow_dangerous_deserialization=True
-    )
-    
-    search_kwargs = configuration.search_kwargs
-    if "k" not in search_kwargs:
-        search_kwargs["k"] = 5
-        
-    yield vstore.as_retriever(
-        search_type="similarity",  # Explicitly set similarity search
-        search_kwargs=search_kwargs
-    )
+    # Resident index; the per-call kwargs must not leak into the shared configuration
+    loaded = retriever_registry.get_index(configuration.embedding_model)
+
+    search_kwargs = dict(configuration.search_kwargs)
+    k = search_kwargs.setdefault("k", DEFAULT_SEARCH_K)
+
+    match configuration.search_mode:
+        case "similarity":
+            yield loaded.vstore.as_retriever(
+                search_type="similarity",  # Explicitly set similarity search
+                search_kwargs=search_kwargs
+            )
+        case "hybrid" | "lexical":
+            search_kwargs.pop("k")
+            yield HybridRetriever(
+                vstore=loaded.vstore,
+                lexical=loaded.lexical,
+                mode=configuration.search_mode,
+                k=k,
+                candidates=max(k, HYBRID_CANDIDATES),
+                search_kwargs=search_kwargs
+            )
+        case _:
+            raise ValueError(f"Unsupported search_mode: {configuration.search_mode}")
 
 
 @contextmanager
-def make_retriever(config: RunnableConfig) -> Generator[VectorStoreRetriever, None, None]:
+def make_retriever(config: RunnableConfig) -> Generator[BaseRetriever, None, None]:
     """Create a retriever for the agent, based on the current configuration."""
     configuration = IndexConfiguration.from_runnable_config(config)
-    embedding_model = make_text_encoder(configuration.embedding_model)
     match configuration.retriever_provider:
         case "faiss":
-            with make_faiss_retriever(configuration, embedding_model) as retriever:
+            with make_faiss_retriever(configuration) as retriever:
                 yield retriever
 
         case _:
             raise ValueError(
                 "Unrecognized retriever_provider in configuration. "
-                f"Expected one of: {', '.join(Configuration.__annotations__['retriever_provider'].__args__)}\n"
+                f"Expected one of: {', '.join(get_args(get_type_hints(IndexConfiguration)['retriever_provider']))}\n"
                 f"Got: {configuration.retriever_provider}"
             )
@@ -0,0 +1,94 @@
+"""Cache of LLM routing decisions.
+
+Identical inputs in the same context ("hi", "check my flight", "yes" during a
+given workflow step) are routed from an in-process LRU with a TTL, optionally
+backed by Redis so every worker shares the decisions.
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+
+from app.core.chatbot.state import State
+from app.core.chatbot.utils.cache import LRUCache
+from app.core.chatbot.utils.metrics import get_metrics
+from app.core.chatbot.utils.redis_client import redis_manager
+
+logger = logging.getLogger(__name__)
+
+ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", "10000"))
+ROUTE_CACHE_TTL = int(os.getenv("ROUTE_CACHE_TTL", "3600"))
+ROUTE_CACHE_REDIS = os.getenv("ROUTE_CACHE_REDIS", "false") == "true"
+ROUTE_CACHE_PREFIX = "route:"
+
+metrics = get_metrics("route_cache")
+metrics.add_ratio("hit_rate", "hits", "lookups")
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = _PUNCTUATION_RE.sub(" ", (message or "").lower())
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+class RouteCache:
+    """LRU + TTL cache of routing decisions with an optional Redis tier"""
+
+    def __init__(self, maxsize: int = ROUTE_CACHE_SIZE, ttl: int = ROUTE_CACHE_TTL, use_redis: bool = ROUTE_CACHE_REDIS):
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self._local = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def make_key(self, message: str, state: State) -> str:
+        """Key on the normalized message, the active workflow/step and the language"""
+        workflow_name = state.get("current_workflow") or ""
+        workflow_state = state.get("workflow_data", {}).get(workflow_name, {}) if workflow_name else {}
+        parts = [
+            normalize_message(message),
+            workflow_name,
+            workflow_state.get("current_step") or "",
+            state.get("language") or "",
+        ]
+        return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        metrics.incr("lookups")
+        route = self._local.get(key)
+        if route is not None:
+            metrics.incr("hits")
+            metrics.incr("hits_local")
+            return route
+
+        # Skip the Redis tier while the circuit breaker is open
+        if self.use_redis and redis_manager.async_available:
+            try:
+                data = await redis_manager.aexecute(lambda client: client.get(ROUTE_CACHE_PREFIX + key))
+            except Exception as e:
+                logger.warning(f"Route cache Redis lookup failed: {e}")
+                metrics.incr("redis_errors")
+                data = None
+            if data:
+                route = json.loads(data)
+                self._local.set(key, route)
+                metrics.incr("hits")
+                metrics.incr("hits_redis")
+                return route
+
+        metrics.incr("misses")
+        return None
+
+    async def set(self, key: str, route: Dict[str, Any]) -> None:
+        self._local.set(key, route)
+        if self.use_redis and redis_manager.async_available:
+            try:
+                await redis_manager.aexecute(lambda client: client.set(ROUTE_CACHE_PREFIX + key, json.dumps(route), ex=self.ttl))
+            except Exception as e:
+                logger.warning(f"Route cache Redis write failed: {e}")
+                metrics.incr("redis_errors")
+        metrics.set_gauge("local_entries", len(self._local))
@@ -0,0 +1,268 @@
+"""Intent routing for the main chatbot graph.
+
+The default ``fused`` mode asks the LLM for a single structured decision with
+the English text, the intent, the workflow and any slot values it spotted. The
+``legacy`` mode keeps the previous translate-then-classify pair of free-text
+calls, used as a fallback and for latency comparison. Both run only when the
+local fast-path classifier (see ``fast_intent``) is not confident enough, and
+decisions for repeated inputs are served from ``route_cache``.
+
+Run ``python -m app.core.chatbot.router <messages.txt>`` to compare the
+latency of both modes over a file with one user message per line.
+"""
+
+import os
+import json
+import time
+import logging
+from typing import Any, Dict, List, Literal, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import HumanMessage, SystemMessage
+from langgraph.constants import TAG_NOSTREAM
+from pydantic import BaseModel, Field
+
+from app.core.chatbot.route_cache import RouteCache
+from app.core.chatbot.prompts import INTENT_CLASSIFICATION_PROMPT, ROUTING_PROMPT, TRANSLATION_PROMPT
+from app.core.chatbot.state import State
+from app.core.chatbot.utils.langid import needs_translation
+from app.core.chatbot.utils.metrics import get_metrics
+from app.core.chatbot.utils.prompt import get_formatted_prompt
+from app.core.chatbot.workflow_manager import workflow_manager
+
+logger = logging.getLogger(__name__)
+
+ROUTER_MODE = os.getenv("ROUTER_MODE", "fused")
+FAST_INTENT_ENABLED = os.getenv("FAST_INTENT_ENABLED", "true") == "true"
+ROUTE_CACHE_ENABLED = os.getenv("ROUTE_CACHE_ENABLED", "true") == "true"
+
+metrics = get_metrics("router")
+
+
+class Slot(BaseModel):
+    name: str = Field(description="Name of the value, e.g. claim_number or flight_date")
+    value: str = Field(description="The value exactly as given by the user")
+
+
+class RouteDecision(BaseModel):
+    """Routing decision for the latest user message"""
+
+    normalized_text: str = Field(description="The user message in English")
+    intent: Literal["faq", "human", "start_workflow", "agent"] = Field(description="The user's intent")
+    workflow: Optional[str] = Field(default=None, description="Workflow name when intent is start_workflow")
+    slots: List[Slot] = Field(default_factory=list, description="Values the user already provided")
+
+
+def last_human_message(state: State) -> Optional[str]:
+    """Content of the latest human message in the state"""
+    last_msg = next(
+        (msg for msg in reversed(state.get("messages", []))
+         if isinstance(msg, HumanMessage)),
+        None
+    )
+    if last_msg is None:
+        return None
+    return getattr(last_msg, "content", str(last_msg))
+
+
+def workflow_context(state: State) -> str:
+    """Describe the active workflow for the routing prompts"""
+    workflow_name = state.get("current_workflow")
+    workflow_state = state.get("workflow_data", {}).get(workflow_name, {})
+    current_step = workflow_state.get("current_step")
+    collected_data = workflow_state.get("collected_data", {}).copy()
+
+    return (
+        f"Current Workflow: {workflow_name}\n"
+        f"Current Step: {current_step}\n"
+        f"Collected Data: {json.dumps(collected_data, indent=2)}"
+    ) if current_step else "No active workflow"
+
+
+def _escape(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def _routing_context(state: State, message: str) -> Dict[str, Any]:
+    return {
+        "workflows": workflow_manager.workflow_descriptions,
+        "last_msg": _escape(message),
+        "workflow_context": _escape(workflow_context(state)),
+        "recent_messages": _escape("\n".join([
+            getattr(m, "content", str(m))
+            for m in state.get("messages", [])[-3:]
+        ])),
+    }
+
+
+def normalize_workflow_name(name: Optional[str]) -> Optional[str]:
+    """Map an LLM supplied workflow name onto a registered workflow, if any"""
+    if not name:
+        return None
+    name = name.strip().lower().split("/")[-1].replace("-", "_").replace(" ", "_")
+    return name if name in workflow_manager.workflow_names else None
+
+
+class IntentRouter:
+    """Decides which node handles the latest user message"""
+
+    def __init__(self, llm: BaseChatModel, mode: str = ROUTER_MODE, fast_classifier=None, cache: Optional[RouteCache] = None):
+        # Routing calls are internal, keep their tokens out of streamed replies
+        self.llm = llm.with_config(tags=[TAG_NOSTREAM])
+        self.mode = mode
+        self.structured_llm = llm.with_structured_output(RouteDecision).with_config(tags=[TAG_NOSTREAM])
+        self.fast_classifier = fast_classifier
+        self.cache = cache
+
+    async def route(self, state: State) -> Dict[str, Any]:
+        """
+        Route the latest user message.
+
+        Returns:
+            A dict with the target node, the English text used for routing and
+            any slot values spotted in the message.
+        """
+        message = last_human_message(state)
+        if not state.get("messages") or message is None:
+            return {"target": "welcome", "text": "", "slots": {}}
+
+        started = time.perf_counter()
+        cache_key = self.cache.make_key(message, state) if self.cache is not None else None
+        route = await self.cache.get(cache_key) if cache_key else None
+        if route is not None:
+            route = {**route, "source": "cache"}
+        else:
+            route = await self._classify(state, message)
+            if cache_key and route["source"] != "fast_rules":
+                await self.cache.set(cache_key, route)
+        metrics.observe(f"{route['source']}_latency_ms", (time.perf_counter() - started) * 1000)
+
+        logger.info(f"Routed to: {route['target']} ({route['source']})")
+        return route
+
+    async def _classify(self, state: State, message: str) -> Dict[str, Any]:
+        """Local fast path first, the LLM only when it is not confident"""
+        decision = None
+        if self.fast_classifier is not None:
+            decision = await self.fast_classifier.classify(message, state)
+
+        if decision is not None:
+            return {"target": decision.target, "text": message, "slots": decision.slots, "source": f"fast_{decision.tier}"}
+        if self.mode == "fused":
+            return await self.fused_route(state, message)
+        return await self.legacy_route(state, message)
+
+    async def fused_route(self, state: State, message: str) -> Dict[str, Any]:
+        """Translate, classify and pick the workflow with one structured LLM call"""
+        prompt = get_formatted_prompt(state, ROUTING_PROMPT, [], _routing_context(state, message))
+        try:
+            decision: RouteDecision = await self.structured_llm.ainvoke([SystemMessage(content=prompt)])
+        except Exception as e:
+            logger.warning(f"Structured routing failed, using legacy routing: {e}")
+            metrics.incr("fused_errors")
+            return await self.legacy_route(state, message)
+
+        slots = {slot.name: slot.value for slot in decision.slots if slot.value}
+        metrics.incr(f"intent_{decision.intent}")
+
+        if decision.intent == "start_workflow":
+            workflow_name = normalize_workflow_name(decision.workflow)
+            if workflow_name is None:
+                logger.warning(f"Router returned unknown workflow '{decision.workflow}', using legacy routing")
+                metrics.incr("fused_invalid_workflow")
+                return await self.legacy_route(state, message)
+            target = workflow_name
+        elif decision.intent == "faq":
+            target = "faq"
+        else:
+            target = "agent"
+
+        return {"target": target, "text": decision.normalized_text, "slots": slots, "source": "fused"}
+
+    async def legacy_route(self, state: State, message: str) -> Dict[str, Any]:
+        """Translate (when needed), then classify with free-text LLM calls"""
+        # Translate the message for classification purposes, unless it is
+        # already English or too short to need it (digits, PNRs, claim numbers)
+        if needs_translation(message):
+            translation_prompt = TRANSLATION_PROMPT.format(message=message)
+
+            translation_response = await self.llm.ainvoke([SystemMessage(content=translation_prompt)])
+            translated_content = translation_response.content.strip()
+        else:
+            translated_content = message.strip()
+
+        prompt = get_formatted_prompt(
+            state,
+            INTENT_CLASSIFICATION_PROMPT,
+            [],
+            _routing_context(state, translated_content)
+        )
+
+        response = await self.llm.ainvoke([SystemMessage(content=prompt)])
+        intention = response.content.strip().lower()
+        logger.info(f"Classified intention: {intention}")
+        logger.debug(f"Original message: {message}")
+        logger.debug(f"Translated message (for classification): {translated_content}")
+
+        target = "agent"
+        if "start_workflow" in intention:
+            target = normalize_workflow_name(intention) or "agent"
+        elif intention == "faq":
+            target = "faq"
+        if target == "agent" and intention not in ("agent", "human"):
+            metrics.incr("legacy_unparsed")
+
+        return {"target": target, "text": translated_content, "slots": {}, "source": "legacy"}
+
+
+async def compare_routing_latency(messages: List[str], runs: int = 1) -> Dict[str, Dict[str, float]]:
+    """
+    Measure fused vs. legacy routing latency over a list of user messages.
+
+    Returns:
+        Per-mode mean, p50 and p95 latency in milliseconds.
+    """
+    from app.core.chatbot.llm_manager import LLMManager
+
+    llm = LLMManager.from_settings({
+        "provider": os.environ["LLM_PROVIDER"],
+        "model": os.environ["LLM_MODEL"],
+        "config": {
+            "temperature": os.environ["LLM_TEMPERATURE"]
+        }
+    })
+
+    report = {}
+    for mode in ("legacy", "fused"):
+        router = IntentRouter(llm, mode=mode)
+        samples = []
+        for _ in range(runs):
+            for message in messages:
+                state = State(messages=[HumanMessage(content=message)], language="en-US")
+                started = time.perf_counter()
+                await router.route(state)
+                samples.append((time.perf_counter() - started) * 1000)
+        samples.sort()
+        report[mode] = {
+            "mean_ms": sum(samples) / len(samples),
+            "p50_ms": samples[len(samples) // 2],
+            "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        }
+    return report
+
+
+def main():
+    import sys
+    import asyncio
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        messages = [line.strip() for line in f if line.strip()]
+    report = asyncio.run(compare_routing_latency(messages))
+    for mode, stats in report.items():
+        print(f"{mode:>7}: " + ", ".join(f"{k}={v:.1f}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Process-lifetime runtime for the chatbot graph.
+
+The checkpointer connection pool, its index setup and the compiled LangGraph
+are expensive to create, so they are built once at application startup and
+shared by every ``ChatService`` instance for the lifetime of the process.
+
+``CHECKPOINTER`` selects the store: ``redis`` (default), ``sqlite`` (an
+embedded WAL database for single-node and CI deployments, see
+``checkpointers.sqlite``) or ``memory`` (process-local, for tests). The
+Redis-only features below (serializer, cache, compaction) apply to ``redis``.
+
+``CHECKPOINT_MODE`` selects how often checkpoints reach Redis: ``turn``
+(default) persists one checkpoint per namespace at the end of each turn (see
+``checkpointers.coalescing``), ``step`` persists after every superstep.
+``CHECKPOINT_SERDE=compact`` (default) compresses pending writes and channel
+blobs (see ``checkpointers.serde``); ``json`` keeps the saver's default.
+``CHECKPOINT_CACHE=true`` (default) keeps recent threads' latest checkpoints
+in process, invalidated across workers over pub/sub (see
+``checkpointers.caching``). ``CHECKPOINT_COMPACTION=true`` (default) applies
+the checkpoint retention policy in the background (see
+``checkpointers.compactor``).
+"""
+
+import asyncio
+import os
+import logging
+from contextlib import AsyncExitStack
+from typing import Optional
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.redis.aio import AsyncRedisSaver
+from langgraph.pregel import Pregel
+from redis.asyncio import Redis as AsyncRedis
+
+from app.core.chatbot.checkpointers import CachingSaver, CoalescingSaver, CompactAsyncRedisSaver
+from app.core.chatbot.checkpointers.compactor import run_compactor_loop
+from app.core.chatbot.graph import graph as build_graph
+from app.core.chatbot.llm_manager import LLMManager
+from app.core.chatbot.memory import chat_memory
+from app.core.chatbot.utils.redis_client import get_async_redis_client, close_async_redis_client
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINTER = os.getenv("CHECKPOINTER", "redis")
+CHECKPOINT_MODE = os.getenv("CHECKPOINT_MODE", "turn")
+CHECKPOINT_SERDE = os.getenv("CHECKPOINT_SERDE", "compact")
+CHECKPOINT_CACHE = os.getenv("CHECKPOINT_CACHE", "true") == "true"
+CHECKPOINT_COMPACTION = os.getenv("CHECKPOINT_COMPACTION", "true") == "true"
+
+
+class ChatRuntime:
+    """Owns the pooled checkpointer and the compiled graph"""
+
+    def __init__(self):
+        self._stack: Optional[AsyncExitStack] = None
+        self._redis: Optional[AsyncRedis] = None
+        self._checkpointer: Optional[BaseCheckpointSaver] = None
+        self._graph: Optional[Pregel] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def started(self) -> bool:
+        return self._graph is not None
+
+    @property
+    def redis(self) -> Optional[AsyncRedis]:
+        """Pooled async Redis client shared with the checkpointer"""
+        return self._redis
+
+    @property
+    def checkpointer(self) -> Optional[BaseCheckpointSaver]:
+        return self._checkpointer
+
+    async def startup(self) -> None:
+        """Create the checkpointer, run its setup and compile the graph once"""
+        async with self._lock:
+            if self._graph is not None:
+                return
+
+            stack = AsyncExitStack()
+            try:
+                if CHECKPOINTER == "redis":
+                    checkpointer = await self._redis_checkpointer(stack)
+                elif CHECKPOINTER == "sqlite":
+                    from app.core.chatbot.checkpointers.sqlite import SqliteWalSaver
+
+                    checkpointer = await stack.enter_async_context(SqliteWalSaver.from_path())
+                elif CHECKPOINTER == "memory":
+                    checkpointer = InMemorySaver()
+                else:
+                    raise ValueError(f"Unknown CHECKPOINTER: {CHECKPOINTER}")
+
+                if CHECKPOINT_MODE == "turn":
+                    checkpointer = CoalescingSaver(checkpointer)
+                    # Registered after the store so it runs before the store closes
+                    stack.push_async_callback(checkpointer.flush_all)
+                self._checkpointer = checkpointer
+
+                self._graph = await build_graph(checkpointer)
+            except Exception:
+                await stack.aclose()
+                self._redis = None
+                self._checkpointer = None
+                raise
+
+            self._stack = stack
+            logger.info(f"Chat runtime started ({CHECKPOINTER} checkpointer)")
+
+    async def shutdown(self) -> None:
+        """Release the checkpointer, its connection pool and the LLM clients"""
+        async with self._lock:
+            if self._stack is not None:
+                await self._stack.aclose()
+            await LLMManager.aclose()
+            self._stack = None
+            self._redis = None
+            self._checkpointer = None
+            self._graph = None
+            logger.info("Chat runtime stopped")
+
+    async def _redis_checkpointer(self, stack: AsyncExitStack) -> BaseCheckpointSaver:
+        """Redis saver with its serializer, cache and background maintenance"""
+        self._redis = get_async_redis_client()
+        stack.push_async_callback(close_async_redis_client)
+
+        if CHECKPOINT_SERDE == "compact":
+            checkpointer = CompactAsyncRedisSaver(redis_client=self._redis)
+        else:
+            checkpointer = AsyncRedisSaver(redis_client=self._redis)
+        await checkpointer.asetup()
+        if CHECKPOINT_CACHE:
+            checkpointer = CachingSaver(checkpointer, self._redis)
+            self._start_background_task(
+                stack, checkpointer.run_invalidation_listener(), "checkpoint-cache-invalidation"
+            )
+
+        self._start_background_task(stack, chat_memory.run_cleanup_loop(), "conversation-cleanup")
+        if CHECKPOINT_COMPACTION:
+            self._start_background_task(stack, run_compactor_loop(self._redis), "checkpoint-compaction")
+        return checkpointer
+
+    def _start_background_task(self, stack: AsyncExitStack, coro, name: str) -> None:
+        """Run a coroutine for the runtime's lifetime, cancelled at shutdown"""
+        task = asyncio.create_task(coro, name=name)
+        
+        async def cancel():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        
+        # Cancelled before the Redis client it uses is closed
+        stack.push_async_callback(cancel)
+
+    async def end_turn(self, thread_id: str) -> None:
+        """Persist checkpoints held back during a turn"""
+        flush = getattr(self._checkpointer, "flush", None)
+        if flush is not None:
+            await flush(thread_id)
+
+    async def get_graph(self) -> Pregel:
+        """Return the compiled graph, starting the runtime lazily if needed"""
+        if self._graph is None:
+            await self.startup()
+        return self._graph
+
+    async def swap_graph(self, new_graph: Optional[Pregel] = None) -> Pregel:
+        """Atomically replace the compiled graph.
+
+        If no graph is given, a new one is compiled against the existing
+        checkpointer. Requests that already hold a reference to the old graph
+        finish on it; new requests pick up the replacement.
+        """
+        if self._checkpointer is None:
+            await self.startup()
+        if new_graph is None:
+            new_graph = await build_graph(self._checkpointer)
+        async with self._lock:
+            self._graph = new_graph
+        logger.info("Chat graph swapped")
+        return new_graph
+
+
+# Create singleton instance
+chat_runtime = ChatRuntime()
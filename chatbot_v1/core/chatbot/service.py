@@ -1,17 +1,21 @@
-import os
-from typing import Dict, Optional, Any
-from langchain_core.messages import HumanMessage, SystemMessage
+from typing import AsyncIterator, Dict, Optional, Any, Tuple
+from langchain_core.messages import AIMessageChunk, HumanMessage, SystemMessage
 from pydantic import BaseModel, Field
 import logging
-from .graph import graph
+from .runtime import chat_runtime
+from .turns import TurnBusyError, turn_locks
 from langsmith import traceable
 from .configuration import ChatConfig
 from .state import State, Location
-from langgraph.checkpoint.redis.aio import AsyncRedisSaver
+from .utils.messages import ThinkTagFilter
 from uuid import uuid4
 
 logger = logging.getLogger(__name__)
 
+# Graph nodes whose LLM tokens are shown to the user ("agent" is also the
+# model node inside the ReAct agents used by the agent and faq nodes)
+STREAMED_NODES = {"agent", "faq", "welcome"}
+
 
 class LocationRequest(BaseModel):
     latitude: float
@@ -28,6 +32,40 @@ class ChatRequest(BaseModel):
 
 class ChatService:
 
+    def _prepare_turn(
+        self,
+        message: str,
+        conversation_id: Optional[str],
+        language: Optional[str],
+        location: Optional[Dict[str, Any]],
+        timezone: Optional[str]
+    ) -> Tuple[Dict[str, Any], Dict[str, Any], str]:
+        """Build the graph input and config for a turn, starting a conversation if needed"""
+        if not conversation_id:
+            conversation_id = str(uuid4())
+            
+            # Convert location dict to Pydantic model if needed
+            if location:
+                location = Location(**location)
+                
+            # Initialize new state properly as dict-like
+            state = State()
+            state["language"] = language
+            state["location"] = location
+            state["timezone"] = timezone
+            state["messages"] = []
+                            
+            if message and message.strip() != "":
+                # Add the new message to state using dict access
+                logger.info(f"Human message: {message}")
+                state["messages"] = [HumanMessage(content=message)]
+        else:
+            logger.info(f"Human message: {message}")
+            state = {"messages": [HumanMessage(content=message)]}
+        
+        config = ChatConfig(thread_id=conversation_id)
+        return state, config.model_dump(), conversation_id
+
     @traceable(name="process_message")
     async def process_message(
         self, 
@@ -40,70 +78,120 @@ class ChatService:
         """Process incoming chat messages with memory management"""
         error_message = "I can't process your request right now. Please try again later."
         try:
-            redis_url = os.getenv("REDIS_URL")
-            async with AsyncRedisSaver.from_conn_string(redis_url) as checkpointer:
-                await checkpointer.asetup()
-
-                # Initialize graph if not already initialized
-                ai_graph = await graph(checkpointer)
-                    
-                logger.info('=== NEW API CALL ===')
+            # Compiled graph and checkpointer are shared for the process lifetime
+            ai_graph = await chat_runtime.get_graph()
                 
-                result = None
-                if not conversation_id:
-                    conversation_id = str(uuid4())
-                    
-                    # Convert location dict to Pydantic model if needed
-                    if location:
-                        location = Location(**location)
-                        
-                    # Initialize new state properly as dict-like
-                    state = State()
-                    state["language"] = language
-                    state["location"] = location
-                    state["timezone"] = timezone
-                    state["messages"] = []
-                                    
-                    if message and message.strip() != "":
-                        # Add the new message to state using dict access
-                        logger.info(f"Human message: {message}")
-                        state["messages"] = [HumanMessage(content=message)]
-                    
-                    
-                    # Convert UUID to integer for thread_id
-                    config = ChatConfig(
-                        thread_id=conversation_id
-                    )
-                    
-                    # Invoke the graph with async execution
-                    try:
-                        result = await ai_graph.ainvoke(state, config.model_dump())
-                    except Exception as e:
-                        logger.error(f"AI Error: {e}")
-                        return {error_message, conversation_id}
-                else:                    
-                    try:
-                        config = ChatConfig(thread_id=conversation_id)
-                        logger.info(f"Human message: {message}")
-                        input = {"messages": [HumanMessage(content=message)]}
-                        result = await ai_graph.ainvoke(input, config.model_dump())
-                    except Exception as e:
-                        logger.error(f"AI Error: {e}")
-                        return {error_message, conversation_id}
-                
-                # Add safety check for empty messages
-                if not result.get("messages"):
-                    logger.error(f"AI Error: No response generated")
+            logger.info('=== NEW API CALL ===')
+            
+            input, config, conversation_id = self._prepare_turn(
+                message, conversation_id, language, location, timezone
+            )
+            
+            # One turn at a time per conversation
+            async with turn_locks.hold(conversation_id):
+                # Invoke the graph with async execution
+                try:
+                    result = await ai_graph.ainvoke(input, config)
+                except Exception as e:
+                    logger.error(f"AI Error: {e}")
                     return {error_message, conversation_id}
-                
-                # Extract AI response
-                last_message = result["messages"][-1]                
+                finally:
+                    await chat_runtime.end_turn(conversation_id)
+            
+            # Add safety check for empty messages
+            if not result.get("messages"):
+                logger.error("AI Error: No response generated")
+                return {error_message, conversation_id}
+            
+            # Extract AI response
+            last_message = result["messages"][-1]                
 
-                return (last_message.content, conversation_id)
-                    
+            return (last_message.content, conversation_id)
+                
+        except TurnBusyError:
+            # Surfaced to the routes as 409
+            raise
         except Exception as e:
             import traceback
             logger.error(f"Error processing message: {traceback.format_exc()}")
             logger.error(f"Error processing message: {e}")
             error_msg = str(e)
-            return {"error": error_msg}
\ No newline at end of file
+            return {"error": error_msg}
+
+    async def stream_message(
+        self,
+        message: str,
+        conversation_id: Optional[str] = None,
+        language: Optional[str] = "en-US",
+        location: Optional[Dict[str, Any]] = None,
+        timezone: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a message and stream the assistant's reply as it is generated.
+
+        Yields:
+            {"type": "token", "content": ...} for each user-facing text delta, then
+            {"type": "end", "conversation_id": ..., "response": ...} with the full reply,
+            or {"type": "error", "conversation_id": ..., "detail": ...}.
+        """
+        error_message = "I can't process your request right now. Please try again later."
+        ai_graph = await chat_runtime.get_graph()
+        logger.info('=== NEW STREAMING API CALL ===')
+        
+        input, config, conversation_id = self._prepare_turn(
+            message, conversation_id, language, location, timezone
+        )
+        
+        think_filter = ThinkTagFilter()
+        streamed = False
+        final_state = None
+        # One turn at a time per conversation; released when the stream ends or is closed
+        try:
+            async with turn_locks.hold(conversation_id):
+                try:
+                    async for mode, payload in ai_graph.astream(input, config, stream_mode=["messages", "values"]):
+                        if mode == "values":
+                            final_state = payload
+                            continue
+                        
+                        chunk, metadata = payload
+                        # Only token chunks of user-facing nodes; tool calls and full node outputs are skipped
+                        if (
+                            not isinstance(chunk, AIMessageChunk)
+                            or chunk.tool_call_chunks
+                            or metadata.get("langgraph_node") not in STREAMED_NODES
+                        ):
+                            continue
+                        
+                        text = think_filter.feed(chunk.content if isinstance(chunk.content, str) else "")
+                        if text:
+                            streamed = True
+                            yield {"type": "token", "content": text}
+                except Exception as e:
+                    logger.error(f"AI Error: {e}")
+                    yield {"type": "error", "conversation_id": conversation_id, "detail": error_message}
+                    return
+                finally:
+                    # Also runs when the client disconnects and the generator is closed
+                    await chat_runtime.end_turn(conversation_id)
+        except TurnBusyError as e:
+            logger.warning(str(e))
+            yield {"type": "error", "conversation_id": conversation_id, "detail": "Another message in this conversation is still being processed."}
+            return
+        
+        text = think_filter.flush()
+        if text:
+            streamed = True
+            yield {"type": "token", "content": text}
+        
+        messages = (final_state or {}).get("messages") or []
+        if not messages:
+            logger.error("AI Error: No response generated")
+            yield {"type": "error", "conversation_id": conversation_id, "detail": error_message}
+            return
+        
+        response = messages[-1].content
+        if not streamed and response:
+            # Nothing was token-streamed (e.g. a non-streaming provider), send it whole
+            yield {"type": "token", "content": response}
+        yield {"type": "end", "conversation_id": conversation_id, "response": response}
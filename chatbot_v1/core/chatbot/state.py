@@ -50,3 +50,11 @@ class State(AgentState):
     # workflow state
     current_workflow: Optional[str]
     workflow_data: Annotated[dict[str, Any], merge_workflow_data]
+    
+    # routing decision for the current turn (target node, English text, spotted slots)
+    route: Optional[Dict[str, Any]]
+
+    # rolling summary of the turns outside the history window (see history.py)
+    history_summary: Optional[str]
+    # id of the last message folded into history_summary
+    history_summary_cursor: Optional[str]
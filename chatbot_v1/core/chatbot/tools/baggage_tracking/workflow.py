@@ -24,6 +24,17 @@ class BaggageTrackingWorkflow(Workflow):
             "compensation_amount": 0.0
         }
         
+        # Fast-path routing hints
+        self.intent_patterns = [r"\b(?P<claim_number>[A-Z]{3}\d{6})\b"]
+        self.intent_keywords = ["baggage status", "lost luggage", "lost baggage", "baggage claim", "delayed baggage"]
+        self.intent_examples = [
+            "I lost my luggage",
+            "my bag did not arrive",
+            "what is the status of my baggage claim",
+            "track my baggage",
+            "I want compensation for my delayed bag",
+        ]
+        
         # Define workflow steps
         # self.add_step(WorkflowStep(
         #     name="collect_claim",
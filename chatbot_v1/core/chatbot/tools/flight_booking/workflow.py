@@ -60,6 +60,15 @@ class FlightBookingWorkflow(Workflow):
             "passengers": []
         }
         
+        # Fast-path routing hints
+        self.intent_keywords = ["book a flight", "book flight", "book a ticket", "buy a ticket", "reserve a flight"]
+        self.intent_examples = [
+            "I want to book a flight to Dubai",
+            "book me a ticket from Riyadh to Jeddah",
+            "I need two tickets to Cairo next week",
+            "can I reserve a seat on a flight tomorrow",
+        ]
+        
         # Define workflow steps
         self.add_step(WorkflowStep(
             name="search",
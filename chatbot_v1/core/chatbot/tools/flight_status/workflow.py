@@ -24,6 +24,17 @@ class FlightStatusWorkflow(Workflow):
             "flight_status": None
         }
         
+        # Fast-path routing hints
+        self.intent_patterns = [r"\bflight\s+status\b.*\b(?P<flight_number>XY\s?\d{1,4})\b"]
+        self.intent_keywords = ["flight status", "status of my flight", "is my flight delayed", "is my flight on time"]
+        self.intent_examples = [
+            "check my flight status",
+            "is flight XY61 on time",
+            "when does my flight from Riyadh to Jeddah depart",
+            "has my flight been delayed",
+            "what time does the flight land",
+        ]
+        
         self.add_step(WorkflowStep(
             name="search",
             description="Search for flight status using either route or flight number",
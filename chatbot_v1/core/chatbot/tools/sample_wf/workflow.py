@@ -22,6 +22,14 @@ class OrderMealsWorkflow(Workflow):
             "total_amount": 0
         }
         
+        # Fast-path routing hints
+        self.intent_keywords = ["order a meal", "order meals", "order food"]
+        self.intent_examples = [
+            "I want to order a meal",
+            "can I get food on my flight",
+            "order two chicken meals",
+        ]
+        
         # Define workflow steps
         self.add_step(WorkflowStep(
             name="collect_meal_order",
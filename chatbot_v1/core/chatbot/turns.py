@@ -0,0 +1,292 @@
+"""Per-conversation turn serialization and idempotent submissions.
+
+Two turns of the same conversation must not run at once: both would load
+the same checkpoint, and the second write would drop the first turn.
+``turn_locks.hold(conversation_id)`` serializes them with an asyncio lock
+per conversation. With ``TURN_LOCK_REDIS=true`` it also takes a Redis lease
+(``SET NX PX`` with a random token, renewed while the turn runs), so turns
+are serialized across workers and nodes. If Redis is unreachable the lease
+is skipped and only the local lock applies.
+
+Clients retry when a turn takes long. ``idempotent_requests.run(key, fn)``
+runs ``fn`` once per idempotency key: a retry arriving while the first
+submission is in flight waits for it, and a retry arriving afterwards gets
+the stored result, instead of running the LLM pipeline again. Results are
+kept for ``IDEMPOTENCY_TTL`` seconds, in process and (with the Redis lease
+enabled) in Redis for retries landing on another worker. Failures are not
+stored; a retry after a failure runs again.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+from uuid import uuid4
+
+from redis.exceptions import RedisError
+
+from app.core.chatbot.utils.cache import LRUCache
+from app.core.chatbot.utils.metrics import get_metrics
+from app.core.chatbot.utils.redis_client import get_async_redis_client
+
+logger = logging.getLogger(__name__)
+
+TURN_LOCK_REDIS = os.getenv("TURN_LOCK_REDIS", "false") == "true"
+TURN_LOCK_TIMEOUT = float(os.getenv("TURN_LOCK_TIMEOUT", "120"))
+TURN_LEASE_TTL = float(os.getenv("TURN_LEASE_TTL", "30"))
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "600"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "5000"))
+
+LEASE_PREFIX = "turn_lease:"
+IDEMPOTENCY_PREFIX = "idempotency:"
+_PENDING = "pending"
+
+# Only the holder may extend or release a lease
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+metrics = get_metrics("turns")
+metrics.add_ratio("idempotent_replay_rate", "idempotent_replays", "idempotent_requests")
+
+
+class TurnBusyError(Exception):
+    """Another turn of the conversation did not finish within the wait timeout"""
+
+
+async def _poll(check: Callable[[], Awaitable[bool]], deadline: float) -> bool:
+    """Call ``check`` with backoff until it returns True or the deadline passes"""
+    delay = 0.01
+    while not await check():
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.25)
+    return True
+
+
+class TurnLocks:
+    """One turn at a time per conversation"""
+
+    def __init__(self, use_redis: bool = TURN_LOCK_REDIS, timeout: float = TURN_LOCK_TIMEOUT, lease_ttl: float = TURN_LEASE_TTL):
+        self.use_redis = use_redis
+        self.timeout = timeout
+        self.lease_ttl = lease_ttl
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Holders and waiters per conversation; the lock is dropped when it reaches zero
+        self._users: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, conversation_id: str) -> AsyncIterator[None]:
+        """
+        Run the body as the only turn of the conversation.
+
+        Raises:
+            TurnBusyError: The previous turn did not finish within the timeout.
+        """
+        deadline = time.monotonic() + self.timeout
+        lock = self._locks.setdefault(conversation_id, asyncio.Lock())
+        self._users[conversation_id] = self._users.get(conversation_id, 0) + 1
+        if lock.locked():
+            metrics.incr("contended")
+        started = time.perf_counter()
+        try:
+            try:
+                await asyncio.wait_for(lock.acquire(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                metrics.incr("timeouts")
+                raise TurnBusyError(f"Conversation {conversation_id} is busy")
+            try:
+                if self.use_redis:
+                    async with self._lease(conversation_id, deadline):
+                        metrics.observe("wait_ms", (time.perf_counter() - started) * 1000)
+                        yield
+                else:
+                    metrics.observe("wait_ms", (time.perf_counter() - started) * 1000)
+                    yield
+            finally:
+                lock.release()
+        finally:
+            self._users[conversation_id] -= 1
+            if not self._users[conversation_id]:
+                del self._users[conversation_id]
+                del self._locks[conversation_id]
+            metrics.set_gauge("active_conversations", len(self._locks))
+
+    @asynccontextmanager
+    async def _lease(self, conversation_id: str, deadline: float) -> AsyncIterator[None]:
+        redis = get_async_redis_client()
+        key = f"{LEASE_PREFIX}{conversation_id}"
+        token = uuid4().hex
+        ttl_ms = int(self.lease_ttl * 1000)
+
+        async def try_acquire() -> bool:
+            return bool(await redis.set(key, token, nx=True, px=ttl_ms))
+
+        try:
+            acquired = await _poll(try_acquire, deadline)
+        except (RedisError, OSError) as e:
+            # Serializing within this worker is still better than failing the turn
+            logger.warning(f"Turn lease unavailable for {conversation_id}, using the local lock only: {e}")
+            metrics.incr("lease_errors")
+            acquired = None
+        if acquired is None:
+            yield
+            return
+        if not acquired:
+            metrics.incr("timeouts")
+            raise TurnBusyError(f"Conversation {conversation_id} is busy on another worker")
+
+        async def renew():
+            while True:
+                await asyncio.sleep(self.lease_ttl / 3)
+                try:
+                    await redis.eval(_RENEW_SCRIPT, 1, key, token, ttl_ms)
+                except (RedisError, OSError) as e:
+                    logger.warning(f"Turn lease renewal failed for {conversation_id}: {e}")
+
+        renewal = asyncio.create_task(renew())
+        try:
+            yield
+        finally:
+            renewal.cancel()
+            try:
+                await redis.eval(_RELEASE_SCRIPT, 1, key, token)
+            except (RedisError, OSError) as e:
+                # The lease expires on its own
+                logger.warning(f"Turn lease release failed for {conversation_id}: {e}")
+
+
+class IdempotentRequests:
+    """Runs each idempotency key once; retries share the first result"""
+
+    def __init__(self, ttl: int = IDEMPOTENCY_TTL, use_redis: bool = TURN_LOCK_REDIS, maxsize: int = IDEMPOTENCY_CACHE_SIZE):
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self._results = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def run(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        store_if: Optional[Callable[[Any], bool]] = None,
+        wait_timeout: float = TURN_LOCK_TIMEOUT
+    ) -> Any:
+        """
+        Return ``fn()``'s result, running it only for the first submission of ``key``.
+
+        Args:
+            key: Namespaced idempotency key (see ``idempotency_key``).
+            fn: The submission; its result must be JSON-serializable when Redis is used.
+            store_if: Results it rejects (error payloads) go to in-flight waiters but are not replayed later.
+        """
+        metrics.incr("idempotent_requests")
+        cached = self._results.get(key)
+        if cached is not None:
+            metrics.incr("idempotent_replays")
+            return cached
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            metrics.incr("idempotent_replays")
+            # A cancelled retry must not cancel the original submission
+            return await asyncio.shield(in_flight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await self._run_shared(key, fn, store_if, wait_timeout)
+            if store_if is None or store_if(result):
+                self._results.set(key, result)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters get the exception; mark it retrieved when there are none
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def _run_shared(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        store_if: Optional[Callable[[Any], bool]],
+        wait_timeout: float
+    ) -> Any:
+        if not self.use_redis:
+            return await fn()
+
+        redis = get_async_redis_client()
+        redis_key = f"{IDEMPOTENCY_PREFIX}{key}"
+        deadline = time.monotonic() + wait_timeout
+        stored: Dict[str, Any] = {}
+
+        async def claim_or_done() -> bool:
+            # Either this worker claims the key, or the other worker's result is there
+            if await redis.set(redis_key, _PENDING, nx=True, ex=int(wait_timeout) + 1):
+                stored["claimed"] = True
+                return True
+            value = await redis.get(redis_key)
+            if value is not None and value.decode("utf-8") != _PENDING:
+                stored["result"] = json.loads(value)["result"]
+                return True
+            return False
+
+        try:
+            if not await _poll(claim_or_done, deadline):
+                raise TurnBusyError(f"Submission {key} is still being processed")
+        except (RedisError, OSError) as e:
+            logger.warning(f"Idempotency store unavailable, running {key} locally: {e}")
+            metrics.incr("idempotency_errors")
+            return await fn()
+
+        if "result" in stored:
+            metrics.incr("idempotent_replays")
+            return stored["result"]
+
+        try:
+            result = await fn()
+        except BaseException:
+            try:
+                await redis.delete(redis_key)
+            except (RedisError, OSError):
+                pass
+            raise
+        try:
+            if store_if is None or store_if(result):
+                await redis.set(redis_key, json.dumps({"result": result}), ex=self.ttl)
+            else:
+                await redis.delete(redis_key)
+        except (RedisError, OSError) as e:
+            logger.warning(f"Could not store the result of {key}: {e}")
+        return result
+
+
+def idempotency_key(scope: str, key: Optional[str], conversation_id: Optional[str] = None) -> Optional[str]:
+    """Namespaced key for an ``Idempotency-Key`` header, or None without one"""
+    if not key:
+        return None
+    return f"{scope}:{conversation_id or '-'}:{key}"
+
+
+# Create singleton instances
+turn_locks = TurnLocks()
+idempotent_requests = IdempotentRequests()
@@ -0,0 +1,230 @@
+"""Compact binary encoding for conversation state.
+
+Values are written as a small header followed by the payload::
+
+    magic (2 bytes) | schema version (1) | format (1) | compression (1) | dict id (4, zstd-dict only)
+
+``format`` is msgpack (via ``ormsgpack``) or JSON (via ``orjson``, falling
+back to the standard library), and ``compression`` is none, zstd or zstd with
+a trained dictionary. Payloads below ``CODEC_MIN_COMPRESS_BYTES`` are stored
+uncompressed. Data without the magic prefix is decoded as plain JSON, so
+values written before the codec existed keep loading.
+
+Optional dependencies: ``ormsgpack``, ``orjson`` and ``zstandard``. Whatever
+is missing degrades to the next option (msgpack -> JSON, zstd -> none).
+Train a dictionary from representative payloads with::
+
+    python -m app.core.chatbot.utils.codec train <samples.jsonl> <out.dict>
+"""
+
+import os
+import json
+import struct
+import logging
+from typing import Any, Iterable, Optional
+
+try:
+    import ormsgpack
+except ImportError:
+    ormsgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"\xc1F"  # 0xc1 is never emitted by msgpack and cannot start UTF-8 JSON
+SCHEMA_VERSION = 1
+
+FORMAT_JSON = 1
+FORMAT_MSGPACK = 2
+COMPRESSION_NONE = 0
+COMPRESSION_ZSTD = 1
+COMPRESSION_ZSTD_DICT = 2
+
+_FORMATS = {"json": FORMAT_JSON, "msgpack": FORMAT_MSGPACK}
+_HEADER = struct.Struct(">2sBBB")
+_DICT_ID = struct.Struct(">I")
+
+CODEC_FORMAT = os.getenv("CODEC_FORMAT", "msgpack")
+CODEC_COMPRESSION = os.getenv("CODEC_COMPRESSION", "zstd")
+CODEC_ZSTD_LEVEL = int(os.getenv("CODEC_ZSTD_LEVEL", "3"))
+CODEC_ZSTD_DICT_PATH = os.getenv("CODEC_ZSTD_DICT_PATH")
+CODEC_MIN_COMPRESS_BYTES = int(os.getenv("CODEC_MIN_COMPRESS_BYTES", "256"))
+
+
+class CodecError(ValueError):
+    """Raised for payloads this codec cannot decode"""
+
+
+def _json_dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json_loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class Codec:
+    """Versioned msgpack/JSON encoding with optional zstd compression"""
+
+    def __init__(
+        self,
+        format: str = CODEC_FORMAT,
+        compression: str = CODEC_COMPRESSION,
+        level: int = CODEC_ZSTD_LEVEL,
+        dictionary: Optional[bytes] = None,
+        min_compress_bytes: int = CODEC_MIN_COMPRESS_BYTES
+    ):
+        if format == "msgpack" and ormsgpack is None:
+            logger.warning("ormsgpack is not installed, encoding as JSON")
+            format = "json"
+        if compression != "none" and zstandard is None:
+            logger.warning("zstandard is not installed, storing uncompressed")
+            compression = "none"
+
+        self.format = _FORMATS[format]
+        self.level = level
+        self.min_compress_bytes = min_compress_bytes
+        self._dict: Optional["zstandard.ZstdCompressionDict"] = None
+        self._compressor = None
+        self._decompressors = {}
+
+        if compression == "zstd":
+            if dictionary is not None:
+                self._dict = zstandard.ZstdCompressionDict(dictionary)
+                self._compressor = zstandard.ZstdCompressor(level=level, dict_data=self._dict)
+                self._decompressors[self._dict.dict_id()] = zstandard.ZstdDecompressor(dict_data=self._dict)
+            else:
+                self._compressor = zstandard.ZstdCompressor(level=level)
+            self._decompressors[0] = zstandard.ZstdDecompressor()
+
+    @property
+    def dict_id(self) -> int:
+        return self._dict.dict_id() if self._dict is not None else 0
+
+    def serialize(self, value: Any) -> bytes:
+        """Encode a value of plain types (dict, list, str, numbers, bool, None)"""
+        if self.format == FORMAT_MSGPACK:
+            return ormsgpack.packb(value)
+        return _json_dumps(value)
+
+    def deserialize(self, data: bytes, format: int) -> Any:
+        if format == FORMAT_MSGPACK:
+            if ormsgpack is None:
+                raise CodecError("msgpack payload but ormsgpack is not installed")
+            return ormsgpack.unpackb(data)
+        if format == FORMAT_JSON:
+            return _json_loads(data)
+        raise CodecError(f"Unknown payload format {format}")
+
+    def compress(self, payload: bytes, format: int = None) -> bytes:
+        """Prefix the header and compress the payload when it is worth it"""
+        format = self.format if format is None else format
+        if self._compressor is None or len(payload) < self.min_compress_bytes:
+            return _HEADER.pack(MAGIC, SCHEMA_VERSION, format, COMPRESSION_NONE) + payload
+        compressed = self._compressor.compress(payload)
+        if self._dict is not None:
+            return _HEADER.pack(MAGIC, SCHEMA_VERSION, format, COMPRESSION_ZSTD_DICT) \
+                + _DICT_ID.pack(self.dict_id) + compressed
+        return _HEADER.pack(MAGIC, SCHEMA_VERSION, format, COMPRESSION_ZSTD) + compressed
+
+    def decompress(self, data: bytes) -> "tuple[int, bytes]":
+        """
+        Strip the header and decompress.
+
+        Returns:
+            The payload format and the raw payload.
+        """
+        magic, version, format, compression = _HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise CodecError("Missing codec header")
+        if version > SCHEMA_VERSION:
+            raise CodecError(f"Unsupported codec schema version {version}")
+
+        body = memoryview(data)[_HEADER.size:]
+        if compression == COMPRESSION_NONE:
+            return format, bytes(body)
+        if zstandard is None:
+            raise CodecError("zstd payload but zstandard is not installed")
+        if compression == COMPRESSION_ZSTD:
+            decompressor = self._decompressors.get(0) or zstandard.ZstdDecompressor()
+            return format, decompressor.decompress(bytes(body))
+        if compression == COMPRESSION_ZSTD_DICT:
+            (dict_id,) = _DICT_ID.unpack_from(body)
+            decompressor = self._decompressors.get(dict_id)
+            if decompressor is None:
+                raise CodecError(f"Payload needs zstd dictionary {dict_id}, which is not loaded")
+            return format, decompressor.decompress(bytes(body[_DICT_ID.size:]))
+        raise CodecError(f"Unknown compression {compression}")
+
+    def encode(self, value: Any) -> bytes:
+        return self.compress(self.serialize(value))
+
+    def decode(self, data: Any) -> Any:
+        """Decode a value written by ``encode``, or legacy plain JSON"""
+        if isinstance(data, str):
+            return json.loads(data)
+        if not data.startswith(MAGIC):
+            return _json_loads(data)
+        format, payload = self.decompress(data)
+        return self.deserialize(payload, format)
+
+
+def train_dictionary(samples: Iterable[bytes], size: int = 16 * 1024) -> bytes:
+    """Train a zstd dictionary from sample payloads (serialized, uncompressed)"""
+    if zstandard is None:
+        raise RuntimeError("zstandard is required to train a dictionary")
+    return zstandard.train_dictionary(size, list(samples)).as_bytes()
+
+
+def load_dictionary(path: Optional[str] = CODEC_ZSTD_DICT_PATH) -> Optional[bytes]:
+    if not path:
+        return None
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError as e:
+        logger.warning(f"Could not load zstd dictionary {path}: {e}")
+        return None
+
+
+_default_codec: Optional[Codec] = None
+
+
+def get_codec() -> Codec:
+    """Process-wide codec configured from the environment"""
+    global _default_codec
+    if _default_codec is None:
+        _default_codec = Codec(dictionary=load_dictionary())
+    return _default_codec
+
+
+def main():
+    import sys
+
+    if len(sys.argv) != 4 or sys.argv[1] != "train":
+        print("usage: python -m app.core.chatbot.utils.codec train <samples.jsonl> <out.dict>")
+        sys.exit(1)
+    codec = Codec(compression="none")
+    with open(sys.argv[2], "r", encoding="utf-8") as f:
+        samples = [codec.serialize(json.loads(line)) for line in f if line.strip()]
+    dictionary = train_dictionary(samples)
+    with open(sys.argv[3], "wb") as f:
+        f.write(dictionary)
+    print(f"Trained {len(dictionary)} byte dictionary from {len(samples)} samples")
+
+
+if __name__ == "__main__":
+    main()
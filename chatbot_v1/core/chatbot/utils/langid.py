@@ -0,0 +1,174 @@
+"""Fast in-process language identification.
+
+Used to skip the translation LLM call when a message is already English or is
+too short to need translating (digits, PNRs, claim numbers, flight numbers).
+Non-Latin scripts are identified by their Unicode block; Latin-script languages
+are scored with stopword and diacritic profiles.
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from app.core.chatbot.utils.metrics import get_metrics
+
+# Minimum confidence required before a message is treated as English
+MIN_CONFIDENCE = float(os.getenv("LANGID_MIN_CONFIDENCE", "0.7"))
+
+metrics = get_metrics("langid")
+metrics.add_ratio("skip_rate", "skipped", "total")
+
+# Inputs made of digits, punctuation or a short code (PNR, claim or flight number, date)
+_TRIVIAL_RE = re.compile(r"^[\W\d_]*$")
+_CODE_RE = re.compile(r"^(?=.*\d)[A-Za-z0-9][A-Za-z0-9\-/:. ]{0,19}$")
+_WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+# Urdu letters that do not occur in Arabic
+_URDU_CHARS = set("ٹڈڑںےۓھہ")
+
+_STOPWORDS: Dict[str, set] = {
+    "en": set("""
+        the a an is are was be to of and or in on at for from with my your our me i you we it this that
+        what when where which who how why can could would should will do does did have has please
+        thanks thank hi hello hey yes no not want need know check book change cancel flight flights
+        status baggage bag bags luggage ticket booking seat meal price refund help about tell any
+    """.split()),
+    "fr": set("""
+        le la les un une des du de est et je tu vous nous mon ma mes pour avec dans sur pas que qui quel
+        quelle comment où quand bonjour merci oui non vol vols bagage bagages billet réservation s'il
+    """.split()),
+    "de": set("""
+        der die das ein eine ist und ich du sie wir mein meine nicht mit für auf wie wo wann was bitte
+        danke hallo ja nein flug flüge gepäck koffer ticket buchung kann möchte
+    """.split()),
+    "es": set("""
+        el la los las un una es y yo tú usted mi mis para con por en que qué cómo dónde cuándo hola
+        gracias sí no vuelo vuelos equipaje maleta billete reserva quiero puedo
+    """.split()),
+    "pt": set("""
+        o a os as um uma é e eu você meu minha para com por em que como onde quando olá obrigado
+        obrigada sim não voo voos bagagem mala bilhete reserva quero posso
+    """.split()),
+    "tr": set("""
+        bir ve bu ne ben sen benim için mi mı nasıl nerede ne zaman merhaba teşekkür teşekkürler evet
+        hayır uçuş uçuşum bagaj bilet rezervasyon istiyorum lütfen
+    """.split()),
+}
+
+# Letters that are characteristic of one Latin-script language
+_DIACRITICS: Dict[str, str] = {
+    "fr": "èêëœçàâî",
+    "de": "äöüß",
+    "es": "ñ¿¡áíóú",
+    "pt": "ãõçâêô",
+    "tr": "ığşİöüç",
+}
+
+
+@dataclass
+class LanguageGuess:
+    code: str
+    confidence: float
+    script: str
+
+
+def _script_counts(text: str) -> Dict[str, int]:
+    counts = {"latin": 0, "arabic": 0, "devanagari": 0, "cyrillic": 0}
+    for ch in text:
+        cp = ord(ch)
+        if ch.isascii() and ch.isalpha() or 0x00C0 <= cp <= 0x024F:
+            counts["latin"] += 1
+        elif 0x0600 <= cp <= 0x06FF or 0x0750 <= cp <= 0x077F or 0xFB50 <= cp <= 0xFEFF:
+            counts["arabic"] += 1
+        elif 0x0900 <= cp <= 0x097F:
+            counts["devanagari"] += 1
+        elif 0x0400 <= cp <= 0x04FF:
+            counts["cyrillic"] += 1
+    return counts
+
+
+def _detect_latin(text: str) -> LanguageGuess:
+    words = _WORD_RE.findall(text.lower())
+    hits = {lang: sum(1 for w in words if w in stopwords) for lang, stopwords in _STOPWORDS.items()}
+    scores = {lang: float(count) for lang, count in hits.items()}
+    for lang, chars in _DIACRITICS.items():
+        scores[lang] += 0.5 * sum(1 for ch in text if ch in chars)
+
+    total = sum(scores.values())
+    if not total:
+        return LanguageGuess(code="en", confidence=0.0, script="latin")
+
+    best = max(scores, key=scores.get)
+    share = scores[best] / total
+    # More matching words means more evidence: 1 word -> 0.5, 2 -> 0.75, 3 -> 0.875 ...
+    support = 1 - 0.5 ** max(hits[best], 1)
+    return LanguageGuess(code=best, confidence=round(share * support, 3), script="latin")
+
+
+def detect_language(text: str) -> LanguageGuess:
+    """
+    Identify the language of a message without calling an LLM.
+
+    Args:
+        text: The user message.
+
+    Returns:
+        The language code (keys of kbs/static/languages.json plus es, pt, ru)
+        with a confidence between 0 and 1.
+    """
+    counts = _script_counts(text or "")
+    letters = sum(counts.values())
+    if not letters:
+        return LanguageGuess(code="und", confidence=0.0, script="none")
+
+    script = max(counts, key=counts.get)
+    share = counts[script] / letters
+    if script == "arabic":
+        is_urdu = any(ch in _URDU_CHARS for ch in text)
+        return LanguageGuess(code="ur" if is_urdu else "ar", confidence=round(share, 3), script=script)
+    if script == "devanagari":
+        return LanguageGuess(code="hi", confidence=round(share, 3), script=script)
+    if script == "cyrillic":
+        return LanguageGuess(code="ru", confidence=round(share, 3), script=script)
+
+    guess = _detect_latin(text)
+    guess.confidence = round(guess.confidence * share, 3)
+    return guess
+
+
+def is_trivial_input(text: str) -> bool:
+    """Digits, punctuation and short codes such as PNRs or claim numbers"""
+    text = (text or "").strip()
+    return bool(_TRIVIAL_RE.match(text) or _CODE_RE.match(text))
+
+
+def needs_translation(text: str, min_confidence: Optional[float] = None) -> bool:
+    """
+    Decide whether a message has to be translated before intent classification.
+
+    Args:
+        text: The user message.
+        min_confidence: Confidence required to accept an English guess.
+
+    Returns:
+        False for trivial inputs and confidently English messages, True otherwise.
+    """
+    min_confidence = MIN_CONFIDENCE if min_confidence is None else min_confidence
+    metrics.incr("total")
+
+    if is_trivial_input(text):
+        metrics.incr("skipped")
+        metrics.incr("skipped_trivial")
+        return False
+
+    guess = detect_language(text)
+    metrics.observe("confidence", guess.confidence)
+    metrics.incr(f"detected_{guess.code}")
+    if guess.code == "en" and guess.confidence >= min_confidence:
+        metrics.incr("skipped")
+        metrics.incr("skipped_english")
+        return False
+
+    metrics.incr("translated")
+    return True
@@ -25,6 +25,68 @@ def remove_thinking_tags(content: str) -> str:
         return content
     return re.sub(r'<think>.*?</think>', '', content, flags=re.DOTALL).strip()
 
+class ThinkTagFilter:
+    """Incrementally removes <think>...</think> blocks from streamed text.
+
+    Tags may be split across chunks, so a possible partial tag at the end of a
+    chunk is held back until the next chunk arrives.
+    """
+
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self):
+        self._buffer = ""
+        self._in_think = False
+        self._started = False
+
+    def feed(self, text: str) -> str:
+        """Return the visible part of the text received so far"""
+        self._buffer += text or ""
+        visible = []
+        while self._buffer:
+            if self._in_think:
+                end = self._buffer.find(self.CLOSE_TAG)
+                if end == -1:
+                    # Keep only what could be the start of the closing tag
+                    self._buffer = self._buffer[-(len(self.CLOSE_TAG) - 1):]
+                    break
+                self._buffer = self._buffer[end + len(self.CLOSE_TAG):]
+                self._in_think = False
+            else:
+                start = self._buffer.find(self.OPEN_TAG)
+                if start != -1:
+                    visible.append(self._buffer[:start])
+                    self._buffer = self._buffer[start + len(self.OPEN_TAG):]
+                    self._in_think = True
+                    continue
+                hold = _partial_suffix(self._buffer, self.OPEN_TAG)
+                visible.append(self._buffer[:len(self._buffer) - hold])
+                self._buffer = self._buffer[len(self._buffer) - hold:]
+                break
+        return self._strip_leading("".join(visible))
+
+    def flush(self) -> str:
+        """Return any held back text once the stream has ended"""
+        text = "" if self._in_think else self._buffer
+        self._buffer = ""
+        return self._strip_leading(text)
+
+    def _strip_leading(self, text: str) -> str:
+        # Match remove_thinking_tags, which strips whitespace left by removed blocks
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
+
+
+def _partial_suffix(text: str, tag: str) -> int:
+    """Length of the longest suffix of text that is a prefix of tag"""
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if tag.startswith(text[-size:]):
+            return size
+    return 0
+
 def remove_failed_tool_call_attempt(state: AgentState):
     messages = state["messages"]
     # Remove all messages from the most recent
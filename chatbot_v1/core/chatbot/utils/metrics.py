@@ -0,0 +1,68 @@
+"""In-process counters and gauges exposed through the metrics endpoint."""
+
+import threading
+from typing import Dict, Tuple
+
+_registry: Dict[str, "Metrics"] = {}
+_registry_lock = threading.Lock()
+
+
+class Metrics:
+    """A named group of counters, gauges and ratios"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._values: Dict[str, float] = {}
+        self._ratios: Dict[str, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, key: str, value: float = 1) -> None:
+        """Increment a counter"""
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set_gauge(self, key: str, value: float) -> None:
+        """Set a gauge to its current value"""
+        with self._lock:
+            self._values[key] = value
+
+    def observe(self, key: str, value: float) -> None:
+        """Record a sample, keeping its count, sum and max"""
+        with self._lock:
+            self._values[f"{key}_count"] = self._values.get(f"{key}_count", 0) + 1
+            self._values[f"{key}_sum"] = self._values.get(f"{key}_sum", 0) + value
+            self._values[f"{key}_max"] = max(self._values.get(f"{key}_max", value), value)
+
+    def add_ratio(self, key: str, numerator: str, denominator: str) -> None:
+        """Report numerator / denominator as a derived value in snapshots"""
+        self._ratios[key] = (numerator, denominator)
+
+    def get(self, key: str) -> float:
+        return self._values.get(key, 0)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Current values, with averages and ratios derived"""
+        with self._lock:
+            values = dict(self._values)
+        for key in [k[:-len("_count")] for k in values if k.endswith("_count")]:
+            if f"{key}_sum" in values and values[f"{key}_count"]:
+                values[f"{key}_avg"] = values[f"{key}_sum"] / values[f"{key}_count"]
+        for key, (numerator, denominator) in self._ratios.items():
+            total = values.get(denominator, 0)
+            values[key] = values.get(numerator, 0) / total if total else 0.0
+        return values
+
+
+def get_metrics(name: str) -> Metrics:
+    """Get or create the metrics group with the given name"""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Metrics(name)
+        return _registry[name]
+
+
+def snapshot_all() -> Dict[str, Dict[str, float]]:
+    """Snapshot every registered metrics group"""
+    with _registry_lock:
+        groups = list(_registry.values())
+    return {group.name: group.snapshot() for group in groups}
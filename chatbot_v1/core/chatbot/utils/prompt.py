@@ -1,6 +1,7 @@
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from typing import List
+from typing import Callable, List
+from langchain_core.messages import BaseMessage, SystemMessage
 from langchain_core.tools import Tool
 from app.core.chatbot.utils import normalize_language_code
 from app.core.chatbot.state import State
@@ -68,7 +69,21 @@ def get_formatted_prompt(state: State, base_prompt: str, tools: list = None, ext
     
     return base_prompt.format(**vars)
 
-    
-    
-    
-    
\ No newline at end of file
+
+def make_dynamic_prompt(build_prompt: Callable[[State], str]) -> Callable[[State], List[BaseMessage]]:
+    """
+    Wraps a system prompt builder into a prompt callable for create_react_agent.
+
+    The agent can then be compiled once while the system prompt is still
+    rendered from the current state on every turn.
+
+    Args:
+        build_prompt: Function returning the system prompt for a state.
+
+    Returns:
+        A callable producing the system message followed by the state messages.
+    """
+    def prompt(state: State) -> List[BaseMessage]:
+        return [SystemMessage(content=build_prompt(state))] + list(state["messages"])
+
+    return prompt
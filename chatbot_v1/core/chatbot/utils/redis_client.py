@@ -2,83 +2,286 @@
 
 import os
 import json
+import time
+import logging
+import threading
 from redis import Redis
-from typing import Any, Optional, Dict
-from redis.exceptions import ConnectionError
+from redis.asyncio import Redis as AsyncRedis
+from typing import Awaitable, Callable, Optional, Dict, TypeVar
+from redis.exceptions import ConnectionError, RedisError
 
-# Redis client will be initialized on first use
-REDIS_CLIENT = None
+from app.core.chatbot.utils.cache import LRUCache
+from app.core.chatbot.utils.metrics import get_metrics
 
-def get_redis_client() -> Redis:
-    global REDIS_CLIENT
-    if not REDIS_CLIENT or not check_connection():
-        REDIS_CLIENT = Redis(
-            host=os.getenv("REDIS_HOST"),
-            port=int(os.getenv("REDIS_PORT")),
-            password=os.getenv("REDIS_PASSWORD"),
-            ssl=os.getenv("REDIS_SSL", "false") == "true",
-            socket_keepalive=True,
-            socket_timeout=10,
-            retry_on_timeout=True,
-            max_connections=50,
-            health_check_interval=30
-        )
+logger = logging.getLogger(__name__)
 
-        check_connection()
-        print("Redis client initialized successfully")
-    return REDIS_CLIENT
+T = TypeVar("T")
 
-def check_connection() -> bool:
-    try:
-        if not REDIS_CLIENT:
-            raise ConnectionError("Redis client not initialized")
-        REDIS_CLIENT.ping()
+HEALTH_CHECK_INTERVAL = float(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "5"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("REDIS_BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("REDIS_BREAKER_RESET_TIMEOUT", "30"))
+FALLBACK_CACHE_SIZE = int(os.getenv("REDIS_FALLBACK_CACHE_SIZE", "1000"))
+FALLBACK_CACHE_TTL = int(os.getenv("REDIS_FALLBACK_CACHE_TTL", "3600"))
+
+metrics = get_metrics("redis")
+metrics.add_ratio("fallback_hit_rate", "fallback_hits", "fallback_lookups")
+
+# Async client will be initialized on first use
+ASYNC_REDIS_CLIENT = None
+
+
+class RedisUnavailableError(ConnectionError):
+    """Raised without touching the network while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open after a cool-down"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    _STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+        name: str = "breaker"
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go to Redis; an open breaker turns half-open after the cool-down"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._set_state(self.HALF_OPEN)
+            return self.state != self.OPEN
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            if self.state != self.CLOSED:
+                logger.info(f"Redis {self.name} closed")
+                self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Redis {self.name} opened")
+                    metrics.incr(f"{self.name}_opened")
+                self._opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        metrics.set_gauge(f"{self.name}_state", self._STATE_GAUGE[state])
+
+
+class RedisConnectionManager:
+    """
+    Owns the sync Redis client and tracks Redis health off the request path.
+
+    A background thread pings Redis every ``REDIS_HEALTH_CHECK_INTERVAL``
+    seconds and feeds the circuit breaker, so callers never pay for a PING.
+    While the breaker is open, calls fail fast with ``RedisUnavailableError``
+    and cached data is served from a bounded LRU + TTL fallback.
+
+    The asyncio client (``REDIS_URL``) may point at another server, so it has
+    its own breaker, fed by the calls made through ``aexecute``; after the
+    cool-down the next call is the probe.
+    """
+
+    def __init__(self, health_check_interval: float = HEALTH_CHECK_INTERVAL):
+        self.health_check_interval = health_check_interval
+        self.breaker = CircuitBreaker()
+        self.async_breaker = CircuitBreaker(name="async_breaker")
+        self.fallback = LRUCache(maxsize=FALLBACK_CACHE_SIZE, ttl=FALLBACK_CACHE_TTL)
+        self._client: Optional[Redis] = None
+        self._client_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def client(self) -> Redis:
+        """The pooled client; creating it does not touch the network"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = Redis(
+                        host=os.getenv("REDIS_HOST"),
+                        port=int(os.getenv("REDIS_PORT")),
+                        password=os.getenv("REDIS_PASSWORD"),
+                        ssl=os.getenv("REDIS_SSL", "false") == "true",
+                        socket_keepalive=True,
+                        socket_timeout=10,
+                        socket_connect_timeout=5,
+                        retry_on_timeout=True,
+                        max_connections=50,
+                        health_check_interval=30
+                    )
+                    logger.info("Redis client initialized")
+        return self._client
+
+    @property
+    def available(self) -> bool:
+        """False while the breaker is open (Redis is assumed down)"""
+        return self.breaker.allow()
+
+    @property
+    def async_available(self) -> bool:
+        """False while the asyncio client's breaker is open"""
+        return self.async_breaker.allow()
+
+    def health_check(self) -> bool:
+        """Ping Redis once and update the breaker"""
+        try:
+            self.client.ping()
+        except (RedisError, OSError) as e:
+            logger.warning(f"Redis health check failed: {e}")
+            metrics.incr("health_check_failures")
+            self.breaker.record_failure()
+            return False
+        self.breaker.record_success()
         return True
-    except ConnectionError:
-        return False
 
-in_memory_cache: Dict[str, Any] = {}
+    def execute(self, operation: Callable[[Redis], T]) -> T:
+        """
+        Run an operation against Redis through the circuit breaker.
 
-def init_redis_client() -> Optional[Redis] | Dict[str, Any]:
-    """Lazy initialization of Redis client with error handling"""
-    global REDIS_CLIENT
-    if REDIS_CLIENT is None:
+        Raises:
+            RedisUnavailableError: The breaker is open; Redis was not contacted.
+        """
+        if not self.breaker.allow():
+            metrics.incr("fail_fast")
+            raise RedisUnavailableError("Redis circuit breaker is open")
         try:
-            REDIS_CLIENT = get_redis_client()
-        except Exception as e:
-            print(f"Redis connection failed. Error: {str(e)}")
-            REDIS_CLIENT = in_memory_cache
-    return REDIS_CLIENT
+            result = operation(self.client)
+        except (RedisError, OSError):
+            metrics.incr("errors")
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
 
-def load_json_to_redis(key: str, json_path: str) -> None:
-    """Load JSON file into Redis or in-memory cache."""
-    try:
-        exists = REDIS_CLIENT.exists(key)
-        if not exists:
-            with open(json_path, 'r') as f:
-                data = json.load(f)
-            REDIS_CLIENT.set(key, json.dumps(data))
+    async def aexecute(self, operation: Callable[[AsyncRedis], Awaitable[T]]) -> T:
+        """
+        Run an operation against the asyncio client through its circuit breaker.
+
+        Raises:
+            RedisUnavailableError: The breaker is open; Redis was not contacted.
+        """
+        if not self.async_breaker.allow():
+            metrics.incr("async_fail_fast")
+            raise RedisUnavailableError("Redis async circuit breaker is open")
+        try:
+            result = await operation(get_async_redis_client())
+        except (RedisError, OSError):
+            metrics.incr("async_errors")
+            self.async_breaker.record_failure()
+            raise
+        self.async_breaker.record_success()
+        return result
+
+    def start(self) -> None:
+        """Start the background health checks (idempotent)"""
+        if self._thread is not None and self._thread.is_alive():
             return
-    except Exception as e:
-        # print(f"Redis operation failed, using in-memory cache. Error: {str(e)}")
-        pass
-    
-    # Fallback to in-memory cache
+        self._stop.clear()
+        self.health_check()
+        self._thread = threading.Thread(target=self._run, name="redis-health-check", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.health_check_interval + 1)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.health_check_interval):
+            self.health_check()
+
+
+redis_manager = RedisConnectionManager()
+
+
+def get_redis_client() -> Redis:
+    """
+    Shared sync Redis client.
+
+    Raises:
+        RedisUnavailableError: Redis is known to be down (circuit breaker open).
+    """
+    if not redis_manager.available:
+        metrics.incr("fail_fast")
+        raise RedisUnavailableError("Redis circuit breaker is open")
+    return redis_manager.client
+
+def check_connection() -> bool:
+    return redis_manager.health_check()
+
+def get_async_redis_client() -> AsyncRedis:
+    """Pooled asyncio Redis client shared by the whole process"""
+    global ASYNC_REDIS_CLIENT
+    if ASYNC_REDIS_CLIENT is None:
+        ASYNC_REDIS_CLIENT = AsyncRedis.from_url(
+            os.getenv("REDIS_URL"),
+            max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "50")),
+            socket_keepalive=True,
+            socket_connect_timeout=5,
+            health_check_interval=30
+        )
+    return ASYNC_REDIS_CLIENT
+
+async def close_async_redis_client() -> None:
+    """Close the shared asyncio Redis client and its connection pool"""
+    global ASYNC_REDIS_CLIENT
+    if ASYNC_REDIS_CLIENT is not None:
+        await ASYNC_REDIS_CLIENT.aclose()
+        await ASYNC_REDIS_CLIENT.connection_pool.disconnect()
+        ASYNC_REDIS_CLIENT = None
+
+def init_redis_client() -> RedisConnectionManager:
+    """Start the background health checks and return the connection manager"""
+    redis_manager.start()
+    return redis_manager
+
+def load_json_to_redis(key: str, json_path: str) -> None:
+    """Load JSON file into Redis, or the local fallback cache while Redis is down."""
     with open(json_path, 'r') as f:
         data = json.load(f)
-    in_memory_cache[key] = data
+    redis_manager.fallback.set(key, data)
+    try:
+        # SET NX: the first worker to start loads the data
+        redis_manager.execute(lambda client: client.set(key, json.dumps(data), nx=True))
+    except (RedisError, OSError) as e:
+        logger.warning(f"Redis unavailable, {key} served from the local cache: {e}")
 
 def get_json_from_redis(key: str) -> Optional[dict]:
-    """Get JSON data from Redis or in-memory cache."""
+    """Get JSON data from Redis, or the local fallback cache while Redis is down."""
     try:
-        if REDIS_CLIENT is not None:
-            data = REDIS_CLIENT.get(key)
-            return json.loads(data) if data else None
-    except Exception as e:
-        # print(f"Redis operation failed, using in-memory cache. Error: {str(e)}")
+        data = redis_manager.execute(lambda client: client.get(key))
+        if data:
+            value = json.loads(data)
+            # Keep a local copy to serve while Redis is degraded
+            redis_manager.fallback.set(key, value)
+            return value
+    except (RedisError, OSError):
         pass
     
-    return in_memory_cache.get(key)
+    metrics.incr("fallback_lookups")
+    value = redis_manager.fallback.get(key)
+    if value is not None:
+        metrics.incr("fallback_hits")
+    return value
 
 # Constants for Redis keys
 LANGUAGES_KEY = "flynas:languages"
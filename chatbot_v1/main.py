@@ -7,7 +7,8 @@ from fastapi.staticfiles import StaticFiles
 from redis import Redis
 from app.api.main import api_router, ColorFormatter
 from app.api.routes import chat  # Import the chat module containing chat_service
-from app.core.chatbot.utils.redis_client import init_redis_client
+from app.core.chatbot.utils.redis_client import init_redis_client, redis_manager
+from app.core.chatbot.runtime import chat_runtime
 from contextlib import asynccontextmanager
 import logging
 import sys
@@ -35,7 +36,19 @@ for logger_name in ["uvicorn", "uvicorn.error", "uvicorn.access", "fastapi"]:
 os.environ["FORCE_COLOR"] = "1"
 os.environ["PYTHONUNBUFFERED"] = "1"
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the checkpointer and compile the graph once per process"""
+    init_redis_client()
+    await chat_runtime.startup()
+    try:
+        yield
+    finally:
+        await chat_runtime.shutdown()
+        redis_manager.stop()
+
 app = FastAPI(
+    lifespan=lifespan,
     title=os.environ["PROJECT_NAME"],
     version=os.environ["VERSION"],
     openapi_url=f"{os.environ['API_V1_STR']}/openapi.json",
@@ -28,7 +28,7 @@ load_dotenv()
 llm_config = LLMConfig(
     provider="azure", model="gpt-4o-mini", config={"temperature": 0.5}
 )
-llm = LLMManager.get_llm(llm_config)
+llm = LLMManager.get_shared(llm_config)
 
 # ============================================================================
 # WORKFLOW REGISTRY
@@ -150,18 +150,18 @@ async def process_workflow_node(state: AgentState) -> AgentState:
         if chat_state.active_workflow not in chat_state.workflow_state:
             chat_state.workflow_state[chat_state.active_workflow] = {
                 "current_step": "greeting",
-                "booking_state": BookingState().__dict__
+                "booking_state": BookingState().to_dict()
             }
         
         # Extract or initialize BookingState
         booking_state_dict = chat_state.workflow_state[chat_state.active_workflow].get("booking_state", {})
-        booking_state = BookingState(**booking_state_dict)
+        booking_state = BookingState.from_dict(booking_state_dict)
 
         # Process the message using the original flight booking logic
         booking_state, response = await asyncio.to_thread(workflow_module["process_message"], booking_state, user_input)
 
         # Update ChatState with the new BookingState
-        chat_state.workflow_state[chat_state.active_workflow]["booking_state"] = booking_state.__dict__
+        chat_state.workflow_state[chat_state.active_workflow]["booking_state"] = booking_state.to_dict()
         chat_state.workflow_state[chat_state.active_workflow]["current_step"] = booking_state.current_step
         
         state["response"] = response
@@ -11,5 +11,5 @@ llm_config = LLMConfig(
 intent_llm_config = LLMConfig(
     provider="azure", model="gpt-4o", config={"temperature": 0}
 )
-llm = LLMManager.get_llm(llm_config)
-intent_llm = LLMManager.get_llm(intent_llm_config)
+llm = LLMManager.get_shared(llm_config)
+intent_llm = LLMManager.get_shared(intent_llm_config)
@@ -4,11 +4,10 @@ from pydantic import BaseModel
 from typing import Dict, Any
 from chatbot_v2.models import ChatState  # Import from models.py
 from chatbot_v2.agent import process_user_input  # Import only process_user_input from agent.py
+from chatbot_v2.session_store import get_session_store
 
 app = FastAPI(title="Flynas Chatbot API")
 
-chat_states: Dict[str, ChatState] = {}
-
 class ChatRequest(BaseModel):
     conversation_id: str | None = None
     message: str
@@ -16,15 +15,16 @@ class ChatRequest(BaseModel):
 @app.post("/chat")
 async def chat_endpoint(request: ChatRequest) -> Dict[str, Any]:
     conversation_id = request.conversation_id or "default"
-    if conversation_id not in chat_states:
-        chat_states[conversation_id] = ChatState()
+    store = get_session_store()
+    state = await store.get(conversation_id)
+    if state is None:
+        state = ChatState(conversation_id=conversation_id)
         initial_response = "Hey there! How can I assist you today? 😊✈️"
-        chat_states[conversation_id].add_message("assistant", initial_response)
+        state.add_message("assistant", initial_response)
     else:
         initial_response = None
-    state = chat_states[conversation_id]
     response = await process_user_input(state, request.message)
-    chat_states[conversation_id] = state
+    await store.save(state)
     return {
         "conversation_id": conversation_id,
         "response": response,
@@ -43,10 +43,12 @@ async def websocket_endpoint(websocket: WebSocket):
             if not message:
                 await websocket.send_json({"error": "No message provided"})
                 continue
-            if conversation_id not in chat_states:
-                chat_states[conversation_id] = ChatState()
+            store = get_session_store()
+            state = await store.get(conversation_id)
+            if state is None:
+                state = ChatState(conversation_id=conversation_id)
                 initial_response = "Hey there! How can I assist you today? 😊✈️"
-                chat_states[conversation_id].add_message("assistant", initial_response)
+                state.add_message("assistant", initial_response)
                 await websocket.send_json({
                     "conversation_id": conversation_id,
                     "response": initial_response,
@@ -54,9 +56,8 @@ async def websocket_endpoint(websocket: WebSocket):
                 })
             else:
                 initial_response = None
-            state = chat_states[conversation_id]
             response = await process_user_input(state, message)
-            chat_states[conversation_id] = state
+            await store.save(state)
             await websocket.send_json({
                 "conversation_id": conversation_id,
                 "response": response,
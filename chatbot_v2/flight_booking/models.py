@@ -1,7 +1,11 @@
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field, fields
 from typing import Dict, List, Optional, Any
 import uuid
 from datetime import datetime, timedelta
+import os
+
+# Intent parsing reads the last 10 messages; keep a margin and drop the rest
+CONVERSATION_HISTORY_MAX_MESSAGES = int(os.getenv("BOOKING_HISTORY_MAX_MESSAGES", "50"))
 
 
 @dataclass
@@ -27,11 +31,31 @@ class BookingState:
     booking_reference: Optional[str] = None
     is_complete: bool = False
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain-data form, safe to serialize"""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "BookingState":
+        """Rebuild from ``to_dict`` output; unknown keys from other versions are ignored"""
+        known = {f.name for f in fields(cls)}
+        values = {k: v for k, v in data.items() if k in known}
+        values["passenger_details"] = [
+            p if isinstance(p, PassengerInfo) else PassengerInfo(**p)
+            for p in values.get("passenger_details") or []
+        ]
+        return cls(**values)
+
     def add_user_message(self, content: str) -> None:
-        self.conversation_history.append({"role": "user", "content": content, "timestamp": datetime.now().isoformat()})
+        self._add_message("user", content)
 
     def add_assistant_message(self, content: str) -> None:
-        self.conversation_history.append({"role": "assistant", "content": content, "timestamp": datetime.now().isoformat()})
+        self._add_message("assistant", content)
+
+    def _add_message(self, role: str, content: str) -> None:
+        self.conversation_history.append({"role": role, "content": content, "timestamp": datetime.now().isoformat()})
+        if len(self.conversation_history) > CONVERSATION_HISTORY_MAX_MESSAGES:
+            del self.conversation_history[:-CONVERSATION_HISTORY_MAX_MESSAGES]
 
     def get_selected_flight(self) -> Optional[Dict[str, Any]]:
         from flight_booking.data import FLIGHT_AVAILABILITY
@@ -9,7 +9,7 @@ load_dotenv()
 llm_config = LLMConfig(
     provider="azure", model="gpt-4o-mini", config={"temperature": 0.1}
 )
-llm = LLMManager.get_llm(llm_config)
+llm = LLMManager.get_shared(llm_config)
 DEPENDENCY_RULES = {
     "check_status_pnr": ["pnr"],
     "check_status_details": ["date", "origin", "destination"],
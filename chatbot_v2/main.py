@@ -3,6 +3,8 @@ from chatbot_v2.routes import chat_router, new_router  # Absolute import
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 from fastapi.staticfiles import StaticFiles
+from llm_manager import LLMManager
+from chatbot_v2.session_store import SESSION_STORE, close_session_store, get_session_store
 
 
 app = FastAPI(title="Flight Assistant API")
@@ -26,7 +28,15 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     """Initialize any necessary components on startup"""
-    pass
+    # Fails here, not on the first request, when the store cannot serve this deployment
+    get_session_store()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the shared LLM clients, their HTTP pools and the session store"""
+    await LLMManager.aclose()
+    await close_session_store()
 
 
 @app.get("/api/v1/")
@@ -35,5 +45,8 @@ async def root():
 
 
 if __name__ == "__main__":
+    import os
     import uvicorn
-    uvicorn.run("chatbot_v2.main:app", host="0.0.0.0", port=8000, reload=True, workers=4)
+    # In-process sessions are only visible to the worker that created them
+    workers = int(os.getenv("WEB_CONCURRENCY", "4")) if SESSION_STORE == "redis" else 1
+    uvicorn.run("chatbot_v2.main:app", host="0.0.0.0", port=8000, reload=True, workers=workers)
@@ -2,6 +2,10 @@ from dataclasses import dataclass, field
 from collections import deque
 from typing import Optional, Dict, Any
 import uuid
+import os
+
+# Routing only looks at the last few messages; older ones are dropped
+HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "50"))
 
 @dataclass
 class ChatState:
@@ -11,8 +15,34 @@ class ChatState:
     workflow_state: dict[str, Any] = field(default_factory=dict)
     dependency_queue: deque = field(default_factory=deque)
 
+    # Incremented by the session store on every save (optimistic concurrency)
+    version: int = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "conversation_id": self.conversation_id,
+            "history": self.history,
+            "active_workflow": self.active_workflow,
+            "workflow_state": self.workflow_state,
+            "dependency_queue": list(self.dependency_queue),
+            "version": self.version,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "ChatState":
+        return cls(
+            conversation_id=data["conversation_id"],
+            history=data.get("history", []),
+            active_workflow=data.get("active_workflow"),
+            workflow_state=data.get("workflow_state", {}),
+            dependency_queue=deque(data.get("dependency_queue", [])),
+            version=data.get("version", 0),
+        )
+
     def add_message(self, role: str, content: str):
         self.history.append({"role": role, "content": content})
+        if len(self.history) > HISTORY_MAX_MESSAGES:
+            del self.history[:-HISTORY_MAX_MESSAGES]
 
     def add_dependency(self, dependency: str):
         if dependency not in self.dependency_queue:
@@ -1,9 +1,11 @@
 # chatbot_v2/routes/chat.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException
 from pydantic import BaseModel, Field
 from typing import Optional
 from chatbot_v2.models import ChatState  
 from chatbot_v2.agent import process_user_input 
+from chatbot_v2.session_store import SessionConflictError, get_session_store
+from chatbot_v2.turns import TurnBusyError, idempotency_key, idempotent_requests, turn_locks
 import uuid
 import logging
 
@@ -22,28 +24,46 @@ class ChatMessageResponse(BaseModel):
     conversation_id: str
     response: str
 
-chat_states: dict[str, ChatState] = {}
-
 
 @router.post("/message", response_model=ChatMessageResponse)
-async def send_message(request: ChatMessageRequest) -> ChatMessageResponse:
-    """Send a message to the chat service and get a response."""
-    try:
-        # Use a unique ID if none provided
-        conversation_id = request.conversation_id or str(uuid.uuid4())
-        if conversation_id not in chat_states:
-            chat_states[conversation_id] = ChatState(conversation_id=conversation_id)
-            logger.info(f"New conversation started with ID: {conversation_id}")
-        else:
-            logger.info(f"Continuing conversation with ID: {conversation_id}")
+async def send_message(
+    request: ChatMessageRequest,
+    idempotency_key_header: Optional[str] = Header(None, alias="Idempotency-Key")
+) -> ChatMessageResponse:
+    """
+    Send a message to the chat service and get a response.
+    A retry with the same `Idempotency-Key` header returns the first submission's result.
+    """
+    # Use a unique ID if none provided
+    conversation_id = request.conversation_id or str(uuid.uuid4())
 
-        state = chat_states[conversation_id]
+    async def run_turn() -> dict:
+        # One turn at a time per conversation
+        async with turn_locks.hold(conversation_id):
+            store = get_session_store()
+            state = await store.get(conversation_id)
+            if state is None:
+                state = ChatState(conversation_id=conversation_id)
+                logger.info(f"New conversation started with ID: {conversation_id}")
+            else:
+                logger.info(f"Continuing conversation with ID: {conversation_id}")
 
-        # Process message using agent logic
-        response = await process_user_input(state, request.content)
-        logger.info(f"Response generated for {conversation_id}: {response}")
+            # Process message using agent logic
+            response = await process_user_input(state, request.content)
+            logger.info(f"Response generated for {conversation_id}: {response}")
+            await store.save(state)
 
-        return ChatMessageResponse(conversation_id=conversation_id, response=response)
+        return {"conversation_id": conversation_id, "response": response}
+
+    try:
+        key = idempotency_key("chat_message", idempotency_key_header, request.conversation_id)
+        result = await idempotent_requests.run(key, run_turn) if key else await run_turn()
+        return ChatMessageResponse(**result)
+    except (SessionConflictError, TurnBusyError) as e:
+        logger.warning(str(e))
+        raise HTTPException(
+            status_code=409, detail="This conversation was updated by another request. Please try again."
+        )
     except Exception as e:
         logger.error(f"Error in send_message: {str(e)}")
         raise HTTPException(
@@ -55,3 +75,9 @@ async def send_message(request: ChatMessageRequest) -> ChatMessageResponse:
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
+
+
+@router.get("/stats")
+async def session_stats():
+    """Session store gauges (live sessions, bytes, evictions)"""
+    return get_session_store().stats()
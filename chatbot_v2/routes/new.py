@@ -1,9 +1,11 @@
 # chatbot_v2/routes/new.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException
 from pydantic import BaseModel, Field
 from typing import Optional
 from chatbot_v2.models import ChatState 
 from chatbot_v2.agent import process_user_input  
+from chatbot_v2.session_store import SessionConflictError, get_session_store
+from chatbot_v2.turns import TurnBusyError, idempotency_key, idempotent_requests, turn_locks
 import uuid
 import logging
 
@@ -46,10 +48,6 @@ class ChatResponse(BaseModel):
     conversation_id: str
 
 
-# Global state storage (for simplicity; in production, use a database or cache)
-chat_states: dict[str, ChatState] = {}
-
-
 @router.post("/start", response_model=StartResponse)
 async def start_conversation(request: StartRequest):
     """
@@ -60,7 +58,6 @@ async def start_conversation(request: StartRequest):
     try:
         conversation_id = str(uuid.uuid4())
         state = ChatState(conversation_id=conversation_id)
-        chat_states[conversation_id] = state
         logger.info(f"New conversation started with ID: {conversation_id}")
 
         response = None
@@ -82,6 +79,7 @@ async def start_conversation(request: StartRequest):
         logger.debug(
             f"Metadata stored for {conversation_id}: language={request.language}, location={request.location}, timezone={request.timezone}"
         )
+        await get_session_store().save(state)
 
         return StartResponse(conversation_id=conversation_id, response=response)
     except Exception as e:
@@ -90,19 +88,41 @@ async def start_conversation(request: StartRequest):
 
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    """Process a message in an existing conversation"""
-    try:
-        if request.conversation_id not in chat_states:
-            logger.warning(f"Conversation not found: {request.conversation_id}")
-            raise HTTPException(status_code=404, detail="Conversation not found")
-
-        state = chat_states[request.conversation_id]
-        logger.info(f"Processing message for conversation {request.conversation_id}")
-        response = await process_user_input(state, request.message)
-        logger.info(f"Response generated for {request.conversation_id}: {response}")
+async def chat(
+    request: ChatRequest,
+    idempotency_key_header: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Process a message in an existing conversation
+    - A retry with the same `Idempotency-Key` header waits for and returns the first submission's result
+    """
+    async def run_turn() -> dict:
+        # One turn at a time per conversation
+        async with turn_locks.hold(request.conversation_id):
+            store = get_session_store()
+            state = await store.get(request.conversation_id)
+            if state is None:
+                logger.warning(f"Conversation not found: {request.conversation_id}")
+                raise HTTPException(status_code=404, detail="Conversation not found")
+
+            logger.info(f"Processing message for conversation {request.conversation_id}")
+            response = await process_user_input(state, request.message)
+            logger.info(f"Response generated for {request.conversation_id}: {response}")
+            await store.save(state)
+
+        return {"response": response, "conversation_id": request.conversation_id}
 
-        return ChatResponse(response=response, conversation_id=request.conversation_id)
+    try:
+        key = idempotency_key("new_chat", idempotency_key_header, request.conversation_id)
+        result = await idempotent_requests.run(key, run_turn) if key else await run_turn()
+        return ChatResponse(**result)
+    except HTTPException:
+        raise
+    except (SessionConflictError, TurnBusyError) as e:
+        logger.warning(str(e))
+        raise HTTPException(
+            status_code=409, detail="This conversation was updated by another request. Please try again."
+        )
     except Exception as e:
         logger.error(f"Error in chat: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to process message")
@@ -0,0 +1,390 @@
+"""Conversation state storage shared by the v2 routes.
+
+``SESSION_STORE`` selects the backend:
+
+* ``memory`` (default): ``ChatState`` objects in process. Only correct with
+  a single worker, so it refuses to start when ``WEB_CONCURRENCY`` (the
+  uvicorn worker count) is above 1. Sessions idle for ``SESSION_TTL`` are
+  dropped. Beyond ``SESSION_MAX_LIVE`` the least recently used sessions are
+  evicted, either discarded or, with ``SESSION_SPILL_DIR`` set, written to
+  disk and reloaded on their next request.
+* ``redis``: states in Redis (``REDIS_URL``), so any worker or node can serve
+  any conversation. Each state is a hash ``{rev, data}``. ``rev`` is the
+  revision counter and ``data`` the encoded state. A worker keeps the last
+  encoded state it read or wrote per conversation. A read fetches only
+  ``rev`` when that copy is current, and the full payload otherwise.
+
+Saves are optimistic. A state is loaded at revision N and saved only if Redis
+still holds revision N, otherwise ``SessionConflictError`` is raised, so two
+workers handling the same conversation can never silently overwrite each
+other's turn.
+
+Encoded states start with a 4-byte header: magic, schema version, flags.
+The payload is msgpack when ``ormsgpack`` is installed (JSON otherwise),
+and zlib-compressed above ``SESSION_COMPRESS_MIN_BYTES``. The header records
+both choices, so workers with different settings read each other's data.
+"""
+
+import os
+import json
+import time
+import zlib
+import asyncio
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from chatbot_v2.models import ChatState
+
+try:
+    import ormsgpack
+except ImportError:  # pragma: no cover - optional dependency
+    ormsgpack = None
+
+logger = logging.getLogger(__name__)
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(60 * 60 * 24)))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1000"))
+SESSION_COMPRESS_MIN_BYTES = int(os.getenv("SESSION_COMPRESS_MIN_BYTES", "512"))
+SESSION_MAX_LIVE = int(os.getenv("SESSION_MAX_LIVE", "10000"))
+SESSION_SPILL_DIR = os.getenv("SESSION_SPILL_DIR")
+# How often spilled sessions are checked for expiry
+SPILL_SWEEP_INTERVAL = 300
+SESSION_KEY_PREFIX = "chat_session:"
+# Worker processes serving the app; uvicorn reads the same variable
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+MAGIC = b"\xc2S"
+SCHEMA_VERSION = 1
+FLAG_MSGPACK = 0x01
+FLAG_ZLIB = 0x02
+
+
+class SessionConflictError(Exception):
+    """The state was changed by another request since it was loaded"""
+
+
+# Serialization
+
+def encode_state(state: ChatState) -> bytes:
+    data = state.to_dict()
+    # The revision lives next to the payload, not in it
+    data.pop("version", None)
+    flags = 0
+    if ormsgpack is not None:
+        payload = ormsgpack.packb(data)
+        flags |= FLAG_MSGPACK
+    else:
+        payload = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(payload) >= SESSION_COMPRESS_MIN_BYTES:
+        payload = zlib.compress(payload, 6)
+        flags |= FLAG_ZLIB
+    return MAGIC + bytes([SCHEMA_VERSION, flags]) + payload
+
+
+def decode_state(data: bytes, version: int = 0) -> ChatState:
+    if data[:2] != MAGIC:
+        raise ValueError("Not an encoded chat state")
+    schema, flags = data[2], data[3]
+    if schema > SCHEMA_VERSION:
+        raise ValueError(f"Chat state schema {schema} is newer than this worker ({SCHEMA_VERSION})")
+    payload = data[4:]
+    if flags & FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+    if flags & FLAG_MSGPACK:
+        if ormsgpack is None:
+            raise ValueError("Chat state is msgpack-encoded but ormsgpack is not installed")
+        values = ormsgpack.unpackb(payload)
+    else:
+        values = json.loads(payload)
+    values["version"] = version
+    return ChatState.from_dict(values)
+
+
+def estimate_size(state: ChatState) -> int:
+    """Rough size of a state: the characters of its history and workflow data, no encoding"""
+    size = sum(len(key) + len(str(value)) for message in state.history for key, value in message.items())
+    if state.workflow_state or state.dependency_queue:
+        size += len(str(state.workflow_state)) + len(str(list(state.dependency_queue)))
+    return size
+
+
+# Stores
+
+class SessionStore(ABC):
+    """Loads and saves ``ChatState`` by conversation id"""
+
+    @abstractmethod
+    async def get(self, conversation_id: str) -> Optional[ChatState]:
+        """Return the conversation's state, or None if it does not exist"""
+
+    @abstractmethod
+    async def save(self, state: ChatState) -> None:
+        """
+        Persist a state loaded with ``get`` (or newly created).
+
+        Raises:
+            SessionConflictError: The conversation was saved by someone else since it was loaded.
+        """
+
+    @abstractmethod
+    async def delete(self, conversation_id: str) -> None:
+        """Forget a conversation"""
+
+    async def aclose(self) -> None:
+        """Release connections"""
+
+    def stats(self) -> Dict[str, int]:
+        """Gauges and counters for the stats endpoint"""
+        return {}
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store; requests share the live ``ChatState`` objects"""
+
+    def __init__(
+        self,
+        max_live: int = SESSION_MAX_LIVE,
+        idle_ttl: int = SESSION_TTL,
+        spill_dir: Optional[str] = SESSION_SPILL_DIR
+    ):
+        self.max_live = max_live
+        self.idle_ttl = idle_ttl
+        self.spill_dir = spill_dir
+        # conversation_id -> (last access, state, estimated size), least recently used first
+        self._states: "OrderedDict[str, Tuple[float, ChatState, int]]" = OrderedDict()
+        self._live_bytes = 0
+        self._last_spill_sweep = time.monotonic()
+        self._counters = {"evicted": 0, "expired": 0, "spilled": 0, "restored": 0}
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def _put(self, state: ChatState, size: int) -> None:
+        previous = self._states.pop(state.conversation_id, None)
+        if previous is not None:
+            self._live_bytes -= previous[2]
+        self._states[state.conversation_id] = (time.monotonic(), state, size)
+        self._live_bytes += size
+
+    def _pop(self, conversation_id: str) -> Optional[ChatState]:
+        entry = self._states.pop(conversation_id, None)
+        if entry is None:
+            return None
+        self._live_bytes -= entry[2]
+        return entry[1]
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._states:
+            conversation_id, (last_access, _, _) = next(iter(self._states.items()))
+            if last_access >= cutoff:
+                break
+            self._pop(conversation_id)
+            self._counters["expired"] += 1
+
+    async def _evict(self) -> None:
+        while len(self._states) > self.max_live:
+            conversation_id = next(iter(self._states))
+            state = self._pop(conversation_id)
+            self._counters["evicted"] += 1
+            if self.spill_dir:
+                await asyncio.to_thread(self._write_spilled, state)
+                self._counters["spilled"] += 1
+
+    # Spill tier
+
+    def _spill_path(self, conversation_id: str) -> str:
+        # Conversation ids come from clients; never use them as file names
+        name = hashlib.sha256(conversation_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.spill_dir, f"{name}.session")
+
+    def _write_spilled(self, state: ChatState) -> None:
+        path = self._spill_path(state.conversation_id)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(state.version.to_bytes(8, "big") + encode_state(state))
+        os.replace(f"{path}.tmp", path)
+
+    def _read_spilled(self, conversation_id: str) -> Optional[ChatState]:
+        path = self._spill_path(conversation_id)
+        try:
+            if time.time() - os.path.getmtime(path) > self.idle_ttl:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                data = f.read()
+            os.remove(path)
+        except FileNotFoundError:
+            return None
+        return decode_state(data[8:], int.from_bytes(data[:8], "big"))
+
+    def _sweep_spilled(self) -> int:
+        cutoff = time.time() - self.idle_ttl
+        removed = 0
+        with os.scandir(self.spill_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".session") and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+        return removed
+
+    # SessionStore
+
+    async def get(self, conversation_id: str) -> Optional[ChatState]:
+        self._expire()
+        entry = self._states.get(conversation_id)
+        if entry is not None:
+            self._states.move_to_end(conversation_id)
+            self._states[conversation_id] = (time.monotonic(), entry[1], entry[2])
+            return entry[1]
+        if not self.spill_dir:
+            return None
+
+        state = await asyncio.to_thread(self._read_spilled, conversation_id)
+        if state is not None:
+            self._counters["restored"] += 1
+            self._put(state, estimate_size(state))
+            await self._evict()
+        return state
+
+    async def save(self, state: ChatState) -> None:
+        state.version += 1
+        self._put(state, estimate_size(state))
+        self._expire()
+        await self._evict()
+        if self.spill_dir and time.monotonic() - self._last_spill_sweep > SPILL_SWEEP_INTERVAL:
+            self._last_spill_sweep = time.monotonic()
+            self._counters["expired"] += await asyncio.to_thread(self._sweep_spilled)
+
+    async def delete(self, conversation_id: str) -> None:
+        self._pop(conversation_id)
+        if self.spill_dir:
+            try:
+                await asyncio.to_thread(os.remove, self._spill_path(conversation_id))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        # live_bytes is the estimate_size total, not the encoded size
+        stats = {"live_sessions": len(self._states), "live_bytes": self._live_bytes, **self._counters}
+        if self.spill_dir:
+            stats["spilled_sessions"] = sum(1 for name in os.listdir(self.spill_dir) if name.endswith(".session"))
+        return stats
+
+
+# KEYS[1] = session key; ARGV = expected revision, payload, ttl
+_SAVE_SCRIPT = """
+local rev = tonumber(redis.call('HGET', KEYS[1], 'rev') or '0')
+if rev ~= tonumber(ARGV[1]) then
+    return -1
+end
+redis.call('HSET', KEYS[1], 'rev', rev + 1, 'data', ARGV[2])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+return rev + 1
+"""
+
+
+class RedisSessionStore(SessionStore):
+    """Redis-backed store with a local cache of recently used encoded states"""
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        ttl: int = SESSION_TTL,
+        cache_size: int = SESSION_CACHE_SIZE
+    ):
+        from redis.asyncio import Redis
+
+        self.redis = Redis.from_url(
+            redis_url or os.environ["REDIS_URL"],
+            max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "50")),
+            socket_keepalive=True,
+            health_check_interval=30
+        )
+        self.ttl = ttl
+        self.cache_size = cache_size
+        # conversation_id -> (rev, encoded state)
+        self._cache: "OrderedDict[str, Tuple[int, bytes]]" = OrderedDict()
+        self._save_script = self.redis.register_script(_SAVE_SCRIPT)
+
+    def _key(self, conversation_id: str) -> str:
+        return f"{SESSION_KEY_PREFIX}{conversation_id}"
+
+    def _remember(self, conversation_id: str, rev: int, data: bytes) -> None:
+        self._cache[conversation_id] = (rev, data)
+        self._cache.move_to_end(conversation_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def get(self, conversation_id: str) -> Optional[ChatState]:
+        key = self._key(conversation_id)
+        cached = self._cache.get(conversation_id)
+        if cached is not None:
+            rev = await self.redis.hget(key, "rev")
+            if rev is None:
+                self._cache.pop(conversation_id, None)
+                return None
+            if int(rev) == cached[0]:
+                self._cache.move_to_end(conversation_id)
+                return decode_state(cached[1], cached[0])
+
+        rev, data = await self.redis.hmget(key, "rev", "data")
+        if rev is None or data is None:
+            self._cache.pop(conversation_id, None)
+            return None
+        self._remember(conversation_id, int(rev), data)
+        return decode_state(data, int(rev))
+
+    async def save(self, state: ChatState) -> None:
+        data = encode_state(state)
+        rev = await self._save_script(keys=[self._key(state.conversation_id)], args=[state.version, data, self.ttl])
+        if rev == -1:
+            self._cache.pop(state.conversation_id, None)
+            raise SessionConflictError(f"Conversation {state.conversation_id} was updated concurrently")
+        state.version = int(rev)
+        self._remember(state.conversation_id, state.version, data)
+
+    async def delete(self, conversation_id: str) -> None:
+        self._cache.pop(conversation_id, None)
+        await self.redis.delete(self._key(conversation_id))
+
+    async def aclose(self) -> None:
+        await self.redis.aclose()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "cached_sessions": len(self._cache),
+            "cached_bytes": sum(len(data) for _, data in self._cache.values()),
+        }
+
+
+_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """The process-wide store selected by ``SESSION_STORE``"""
+    global _store
+    if _store is None:
+        if SESSION_STORE == "redis":
+            _store = RedisSessionStore()
+        elif SESSION_STORE == "memory":
+            if WEB_CONCURRENCY > 1:
+                # Each worker would only see its own sessions: /new/chat on one, 404 on the next
+                raise RuntimeError(
+                    f"SESSION_STORE=memory cannot serve {WEB_CONCURRENCY} workers; "
+                    "set SESSION_STORE=redis or run a single worker"
+                )
+            _store = InMemorySessionStore()
+        else:
+            raise ValueError(f"Unknown SESSION_STORE: {SESSION_STORE}")
+        logger.info(f"Session store: {SESSION_STORE}")
+    return _store
+
+
+async def close_session_store() -> None:
+    global _store
+    if _store is not None:
+        await _store.aclose()
+        _store = None
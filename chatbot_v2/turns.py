@@ -0,0 +1,275 @@
+"""Per-conversation turn serialization and idempotent submissions for v2.
+
+Routes mutate the conversation's ``ChatState`` while the LLM runs, so two
+requests for the same conversation must not overlap. ``turn_locks.hold``
+serializes them with an asyncio lock per conversation. When the session
+store is Redis it also takes a Redis lease (``SET NX PX`` with a random
+token, renewed while the turn runs), so turns are serialized across workers.
+This way a Redis-store save no longer loses to a concurrent turn with a
+``SessionConflictError``.
+
+``idempotent_requests.run(key, fn)`` runs a submission once per
+``Idempotency-Key``. A retry waits for the in-flight run, or gets its stored
+result for ``IDEMPOTENCY_TTL`` seconds (shared through Redis with the Redis
+store). Failures are not stored.
+
+This mirrors ``app.core.chatbot.turns`` of chatbot_v1 but cannot import it.
+The v1 module lives in the ``app`` package and pulls in v1's metrics, LRU
+cache and process-wide Redis client (``REDIS_URL``, ``TURN_LOCK_REDIS``).
+The v2 service ships and runs without that package, leases through the
+session store's own Redis connection, and needs no Redis at all with the
+in-memory store. Keep the lease scripts and key prefixes of the two in step.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+from uuid import uuid4
+
+from chatbot_v2.session_store import RedisSessionStore, get_session_store
+
+try:
+    from redis.exceptions import RedisError
+    _REDIS_ERRORS = (RedisError, OSError)
+except ImportError:  # pragma: no cover - only needed with the Redis store
+    _REDIS_ERRORS = (OSError,)
+
+logger = logging.getLogger(__name__)
+
+TURN_LOCK_TIMEOUT = float(os.getenv("TURN_LOCK_TIMEOUT", "120"))
+TURN_LEASE_TTL = float(os.getenv("TURN_LEASE_TTL", "30"))
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "600"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "5000"))
+
+LEASE_PREFIX = "turn_lease:"
+IDEMPOTENCY_PREFIX = "idempotency:"
+_PENDING = "pending"
+
+# Only the holder may extend or release a lease
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class TurnBusyError(Exception):
+    """Another turn of the conversation did not finish within the wait timeout"""
+
+
+def _shared_redis():
+    """The session store's Redis client, or None with the in-memory store"""
+    store = get_session_store()
+    return store.redis if isinstance(store, RedisSessionStore) else None
+
+
+async def _poll(check: Callable[[], Awaitable[bool]], deadline: float) -> bool:
+    """Call ``check`` with backoff until it returns True or the deadline passes"""
+    delay = 0.01
+    while not await check():
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.25)
+    return True
+
+
+class TurnLocks:
+    """One turn at a time per conversation"""
+
+    def __init__(self, timeout: float = TURN_LOCK_TIMEOUT, lease_ttl: float = TURN_LEASE_TTL):
+        self.timeout = timeout
+        self.lease_ttl = lease_ttl
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Holders and waiters per conversation; the lock is dropped when it reaches zero
+        self._users: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, conversation_id: str) -> AsyncIterator[None]:
+        """
+        Run the body as the only turn of the conversation.
+
+        Raises:
+            TurnBusyError: The previous turn did not finish within the timeout.
+        """
+        deadline = time.monotonic() + self.timeout
+        lock = self._locks.setdefault(conversation_id, asyncio.Lock())
+        self._users[conversation_id] = self._users.get(conversation_id, 0) + 1
+        try:
+            try:
+                await asyncio.wait_for(lock.acquire(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                raise TurnBusyError(f"Conversation {conversation_id} is busy")
+            try:
+                async with self._lease(conversation_id, deadline):
+                    yield
+            finally:
+                lock.release()
+        finally:
+            self._users[conversation_id] -= 1
+            if not self._users[conversation_id]:
+                del self._users[conversation_id]
+                del self._locks[conversation_id]
+
+    @asynccontextmanager
+    async def _lease(self, conversation_id: str, deadline: float) -> AsyncIterator[None]:
+        redis = _shared_redis()
+        if redis is None:
+            yield
+            return
+
+        key = f"{LEASE_PREFIX}{conversation_id}"
+        token = uuid4().hex
+        ttl_ms = int(self.lease_ttl * 1000)
+
+        async def try_acquire() -> bool:
+            return bool(await redis.set(key, token, nx=True, px=ttl_ms))
+
+        try:
+            acquired = await _poll(try_acquire, deadline)
+        except _REDIS_ERRORS as e:
+            # Serializing within this worker is still better than failing the turn
+            logger.warning(f"Turn lease unavailable for {conversation_id}, using the local lock only: {e}")
+            acquired = None
+        if acquired is None:
+            yield
+            return
+        if not acquired:
+            raise TurnBusyError(f"Conversation {conversation_id} is busy on another worker")
+
+        async def renew():
+            while True:
+                await asyncio.sleep(self.lease_ttl / 3)
+                try:
+                    await redis.eval(_RENEW_SCRIPT, 1, key, token, ttl_ms)
+                except _REDIS_ERRORS as e:
+                    logger.warning(f"Turn lease renewal failed for {conversation_id}: {e}")
+
+        renewal = asyncio.create_task(renew())
+        try:
+            yield
+        finally:
+            renewal.cancel()
+            try:
+                await redis.eval(_RELEASE_SCRIPT, 1, key, token)
+            except _REDIS_ERRORS as e:
+                # The lease expires on its own
+                logger.warning(f"Turn lease release failed for {conversation_id}: {e}")
+
+
+class IdempotentRequests:
+    """Runs each idempotency key once; retries share the first result"""
+
+    def __init__(self, ttl: int = IDEMPOTENCY_TTL, maxsize: int = IDEMPOTENCY_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # key -> (stored at, result), oldest first
+        self._results: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    def _cached(self, key: str) -> Optional[Tuple[float, Any]]:
+        cutoff = time.monotonic() - self.ttl
+        while self._results and next(iter(self._results.values()))[0] < cutoff:
+            self._results.popitem(last=False)
+        return self._results.get(key)
+
+    def _store(self, key: str, result: Any) -> None:
+        self._results[key] = (time.monotonic(), result)
+        while len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]], wait_timeout: float = TURN_LOCK_TIMEOUT) -> Any:
+        """Return ``fn()``'s result (JSON-serializable), running it only for the first submission of ``key``"""
+        cached = self._cached(key)
+        if cached is not None:
+            return cached[1]
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            # A cancelled retry must not cancel the original submission
+            return await asyncio.shield(in_flight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await self._run_shared(key, fn, wait_timeout)
+            self._store(key, result)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters get the exception; mark it retrieved when there are none
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def _run_shared(self, key: str, fn: Callable[[], Awaitable[Any]], wait_timeout: float) -> Any:
+        redis = _shared_redis()
+        if redis is None:
+            return await fn()
+
+        redis_key = f"{IDEMPOTENCY_PREFIX}{key}"
+        stored: Dict[str, Any] = {}
+
+        async def claim_or_done() -> bool:
+            # Either this worker claims the key, or the other worker's result is there
+            if await redis.set(redis_key, _PENDING, nx=True, ex=int(wait_timeout) + 1):
+                stored["claimed"] = True
+                return True
+            value = await redis.get(redis_key)
+            if value is not None and value.decode("utf-8") != _PENDING:
+                stored["result"] = json.loads(value)["result"]
+                return True
+            return False
+
+        try:
+            if not await _poll(claim_or_done, time.monotonic() + wait_timeout):
+                raise TurnBusyError(f"Submission {key} is still being processed")
+        except _REDIS_ERRORS as e:
+            logger.warning(f"Idempotency store unavailable, running {key} locally: {e}")
+            return await fn()
+
+        if "result" in stored:
+            return stored["result"]
+
+        try:
+            result = await fn()
+        except BaseException:
+            try:
+                await redis.delete(redis_key)
+            except _REDIS_ERRORS:
+                pass
+            raise
+        try:
+            await redis.set(redis_key, json.dumps({"result": result}), ex=self.ttl)
+        except _REDIS_ERRORS as e:
+            logger.warning(f"Could not store the result of {key}: {e}")
+        return result
+
+
+def idempotency_key(scope: str, key: Optional[str], conversation_id: Optional[str] = None) -> Optional[str]:
+    """Namespaced key for an ``Idempotency-Key`` header, or None without one"""
+    if not key:
+        return None
+    return f"v2:{scope}:{conversation_id or '-'}:{key}"
+
+
+# Create singleton instances
+turn_locks = TurnLocks()
+idempotent_requests = IdempotentRequests()